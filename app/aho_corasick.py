@@ -0,0 +1,105 @@
+"""Autómata Aho-Corasick para detectar muchas frases en una sola pasada."""
+from collections import deque
+
+
+def _is_word_char(ch: str) -> bool:
+    return ch.isalnum() or ch == "_"
+
+
+class AhoCorasick:
+    """
+    Autómata multi-patrón. Cada patrón lleva un payload arbitrario; un mismo
+    patrón puede registrarse varias veces con payloads distintos.
+
+    Uso:
+        ac = AhoCorasick()
+        ac.add("popayan", ("municipio", "popayan"))
+        ac.build()
+        for start, end, payload in ac.iter_matches("tecnologo en popayan"):
+            ...
+    """
+
+    __slots__ = ("_goto", "_fail", "_out", "_built", "_size")
+
+    def __init__(self):
+        self._goto: list[dict] = [{}]
+        self._fail: list[int] = [0]
+        self._out: list[list[tuple[int, object]]] = [[]]
+        self._built = False
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def add(self, pattern: str, payload=None) -> None:
+        if not pattern:
+            return
+        if self._built:
+            raise RuntimeError("No se pueden agregar patrones después de build()")
+        state = 0
+        for ch in pattern:
+            nxt = self._goto[state].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[state][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+            state = nxt
+        self._out[state].append((len(pattern), pattern if payload is None else payload))
+        self._size += 1
+
+    def build(self) -> "AhoCorasick":
+        """Calcula los enlaces de fallo (BFS) y propaga las salidas."""
+        queue = deque()
+        for nxt in self._goto[0].values():
+            self._fail[nxt] = 0
+            queue.append(nxt)
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self._goto[state].items():
+                queue.append(nxt)
+                f = self._fail[state]
+                while f and ch not in self._goto[f]:
+                    f = self._fail[f]
+                self._fail[nxt] = self._goto[f].get(ch, 0)
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+        self._built = True
+        return self
+
+    def iter_matches(self, text: str, whole_words: bool = True):
+        """
+        Recorre 'text' una sola vez y produce (inicio, fin, payload) por cada
+        patrón encontrado. Con whole_words=True solo acepta coincidencias con
+        límites de palabra en ambos extremos (equivalente a \\b...\\b).
+        """
+        if not self._built:
+            self.build()
+        goto, fail, out = self._goto, self._fail, self._out
+        n = len(text)
+        state = 0
+        for i, ch in enumerate(text):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            if not out[state]:
+                continue
+            end = i + 1
+            for length, payload in out[state]:
+                start = end - length
+                if whole_words and not (
+                    _boundary(text, start, n) and _boundary(text, end, n)
+                ):
+                    continue
+                yield start, end, payload
+
+    def find_all(self, text: str, whole_words: bool = True) -> list:
+        """Devuelve los payloads de todas las coincidencias (en orden de aparición)."""
+        return [payload for _s, _e, payload in self.iter_matches(text, whole_words=whole_words)]
+
+
+def _boundary(text: str, pos: int, n: int) -> bool:
+    """True si hay límite de palabra (\\b) en la posición 'pos' de 'text'."""
+    before = pos > 0 and _is_word_char(text[pos - 1])
+    after = pos < n and _is_word_char(text[pos])
+    return before != after
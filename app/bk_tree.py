@@ -0,0 +1,106 @@
+"""
+BK-tree: índice métrico para buscar palabras a distancia de edición acotada.
+
+Cada nodo guarda sus hijos por distancia al nodo. Al buscar 'word' con radio r
+solo se visitan los hijos con distancia en [d - r, d + r] (desigualdad
+triangular), así que una búsqueda con radio 1-2 recorre una fracción pequeña del
+árbol. Usa Levenshtein (sin transposiciones) porque el árbol requiere una
+métrica que cumpla la desigualdad triangular.
+"""
+
+
+def levenshtein(a: str, b: str, limit: int | None = None) -> int:
+    """
+    Distancia de Levenshtein. Con 'limit' corta en cuanto la distancia supera ese
+    valor y devuelve limit + 1 (exacta si es <= limit).
+    """
+    if len(a) < len(b):
+        a, b = b, a
+    if limit is not None and len(a) - len(b) > limit:
+        return limit + 1
+    # Prefijo y sufijo comunes no cambian la distancia
+    start = 0
+    while start < len(b) and a[start] == b[start]:
+        start += 1
+    end_a, end_b = len(a), len(b)
+    while end_b > start and a[end_a - 1] == b[end_b - 1]:
+        end_a -= 1
+        end_b -= 1
+    a, b = a[start:end_a], b[start:end_b]
+    if not b:
+        d = len(a)
+        return d if limit is None or d <= limit else limit + 1
+
+    prev = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        cur = [i]
+        left = row_min = i
+        for j, cb in enumerate(b):
+            d = prev[j] + (ca != cb)
+            up = prev[j + 1] + 1
+            if up < d:
+                d = up
+            if left + 1 < d:
+                d = left + 1
+            cur.append(d)
+            left = d
+            if d < row_min:
+                row_min = d
+        if limit is not None and row_min > limit:
+            return limit + 1
+        prev = cur
+    return prev[-1] if limit is None or prev[-1] <= limit else limit + 1
+
+
+class BKTree:
+    """Palabras con payloads (un mismo término puede tener varios)."""
+
+    __slots__ = ("_root", "_size")
+
+    def __init__(self):
+        # nodo: [palabra, payloads, {distancia: nodo hijo}]
+        self._root = None
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def add(self, word: str, payload=None) -> None:
+        if not word:
+            return
+        if self._root is None:
+            self._root = [word, {payload}, {}]
+            self._size = 1
+            return
+        node = self._root
+        while True:
+            d = levenshtein(word, node[0])
+            if d == 0:
+                node[1].add(payload)
+                return
+            child = node[2].get(d)
+            if child is None:
+                node[2][d] = [word, {payload}, {}]
+                self._size += 1
+                return
+            node = child
+
+    def search(self, word: str, max_distance: int) -> list[tuple[int, str, set]]:
+        """[(distancia, palabra, payloads)] a distancia <= max_distance, ordenado por distancia."""
+        out = []
+        if self._root is None:
+            return out
+        stack = [self._root]
+        while stack:
+            node = stack.pop()
+            # Basta la distancia exacta hasta la arista más larga + el radio:
+            # por encima de eso ningún hijo queda dentro de [d - r, d + r].
+            d = levenshtein(word, node[0], max(node[2], default=0) + max_distance)
+            if d <= max_distance:
+                out.append((d, node[0], node[1]))
+            lo, hi = d - max_distance, d + max_distance
+            for dist, child in node[2].items():
+                if lo <= dist <= hi:
+                    stack.append(child)
+        out.sort(key=lambda x: (x[0], x[1]))
+        return out
@@ -0,0 +1,96 @@
+"""
+Ranking temático BM25F (TOPIC_RANKER=bm25f).
+
+A diferencia del puntaje clásico (pesos fijos por campo), cada token pesa según
+su rareza en el catálogo (IDF) y su frecuencia en título, palabras clave y
+descripción, normalizada por la longitud de cada campo. Como nada de eso depende
+de la consulta, la contribución de cada (token, programa) se calcula una vez al
+cargar el catálogo y se guarda en postings: una consulta solo suma los postings
+de sus tokens.
+"""
+import math
+from array import array
+from bisect import bisect_left
+from collections import Counter, defaultdict
+
+# Peso y normalización por longitud de cada campo (mismo orden de importancia
+# que el puntaje clásico: título > palabras clave > descripción).
+FIELD_WEIGHTS = {"title": 2.5, "kw": 2.2, "desc": 1.0}
+FIELD_B = {"title": 0.3, "kw": 0.5, "desc": 0.75}
+K1 = 1.2
+# Puntos enteros por unidad BM25F: deja los puntajes en el rango del clásico
+# (tope de 120 en _score_code, bonos de nivel/ubicación de 2-5 puntos).
+SCALE = 20
+
+
+class BM25FIndex:
+    """Postings token -> (ids de programa, contribución BM25F) precalculados."""
+
+    __slots__ = ("codes", "pids", "postings", "idf", "avg_len")
+
+    def __init__(self, docs):
+        """'docs': iterable de (code, {"title": [tokens], "kw": [...], "desc": [...]})."""
+        codes = []
+        doc_tfs = []
+        lengths = {f: [] for f in FIELD_WEIGHTS}
+        df = Counter()
+        for code, fields in docs:
+            codes.append(code)
+            tf = defaultdict(dict)
+            for f in FIELD_WEIGHTS:
+                toks = fields.get(f) or ()
+                lengths[f].append(len(toks))
+                for tok, n in Counter(toks).items():
+                    tf[tok][f] = n
+            df.update(tf.keys())
+            doc_tfs.append(tf)
+
+        n_docs = len(codes)
+        self.codes = tuple(codes)
+        self.pids = {code: pid for pid, code in enumerate(codes)}
+        self.avg_len = {f: (sum(v) / n_docs if n_docs else 0.0) or 1.0 for f, v in lengths.items()}
+        self.idf = {tok: math.log(1 + (n_docs - n + 0.5) / (n + 0.5)) for tok, n in df.items()}
+
+        postings = defaultdict(lambda: (array("I"), array("f")))
+        for pid, tf in enumerate(doc_tfs):
+            for tok, per_field in tf.items():
+                pseudo_tf = 0.0
+                for f, n in per_field.items():
+                    b = FIELD_B[f]
+                    norm = 1 - b + b * lengths[f][pid] / self.avg_len[f]
+                    pseudo_tf += FIELD_WEIGHTS[f] * n / norm
+                ids, weights = postings[tok]
+                ids.append(pid)
+                weights.append(self.idf[tok] * pseudo_tf / (K1 + pseudo_tf))
+        self.postings = dict(postings)
+
+    def scores(self, tokens) -> dict[str, float]:
+        """{code: puntaje BM25F} de los programas que contienen algún token."""
+        acc = defaultdict(float)
+        for tok in tokens:
+            hit = self.postings.get(tok)
+            if hit is None:
+                continue
+            for pid, w in zip(*hit):
+                acc[pid] += w
+        return {self.codes[pid]: sc for pid, sc in acc.items()}
+
+    def score(self, code: str, tokens) -> float:
+        """Puntaje BM25F de un programa (búsqueda binaria en cada posting)."""
+        pid = self.pids.get(code)
+        if pid is None:
+            return 0.0
+        total = 0.0
+        for tok in tokens:
+            hit = self.postings.get(tok)
+            if hit is None:
+                continue
+            ids, weights = hit
+            i = bisect_left(ids, pid)
+            if i < len(ids) and ids[i] == pid:
+                total += weights[i]
+        return total
+
+    @staticmethod
+    def points(score: float) -> int:
+        return int(round(score * SCALE))
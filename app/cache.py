@@ -0,0 +1,82 @@
+"""Cachés en memoria compartidos por el motor de búsqueda."""
+import threading
+import time
+from collections import OrderedDict
+
+MISSING = object()
+
+
+class LRUCache:
+    """
+    Caché LRU acotada y segura entre hilos, con contadores de aciertos/fallos.
+
+    - ttl (segundos, opcional): las entradas vencidas cuentan como fallo.
+    - generation (opcional): etiqueta de versión de los datos; una entrada
+      guardada con otra generación nunca se sirve.
+
+    Uso:
+        cache = LRUCache(maxsize=1024, name="intent")
+        value = cache.get(key)
+        if value is MISSING:
+            value = compute()
+            cache.put(key, value)
+    """
+
+    def __init__(self, maxsize: int = 1024, name: str = "", ttl: float | None = None):
+        self.maxsize = max(0, int(maxsize))
+        self.name = name
+        self.ttl = ttl if ttl and ttl > 0 else None
+        self.hits = 0
+        self.misses = 0
+        self._data: OrderedDict = OrderedDict()  # key -> (value, expira_en, generation)
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key, default=MISSING, generation=None):
+        with self._lock:
+            try:
+                value, expires_at, gen = self._data[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            if gen != generation or (expires_at is not None and expires_at <= time.monotonic()):
+                del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value, generation=None) -> None:
+        if not self.maxsize:
+            return
+        expires_at = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            self._data[key] = (value, expires_at, generation)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def invalidate(self, key) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        """Invalida todas las entradas (los contadores se conservan)."""
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "name": self.name,
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            }
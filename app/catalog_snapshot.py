@@ -0,0 +1,56 @@
+"""Snapshot binario de los índices del catálogo (arranque rápido sin reconstruir)."""
+import hashlib
+import logging
+import os
+import pickle
+
+log = logging.getLogger(__name__)
+
+MAGIC = b"SENACAT\0"
+# Subir cuando cambie la forma de los índices derivados: invalida snapshots viejos.
+SNAPSHOT_VERSION = 5
+
+
+def content_hash(paths) -> str:
+    """SHA-256 del contenido de 'paths' (en orden), incluyendo la versión del snapshot."""
+    h = hashlib.sha256(f"v{SNAPSHOT_VERSION}".encode())
+    for pth in paths:
+        h.update(b"\0" + os.path.basename(pth).encode("utf-8") + b"\0")
+        try:
+            with open(pth, "rb") as fh:
+                for chunk in iter(lambda: fh.read(1 << 16), b""):
+                    h.update(chunk)
+        except OSError:
+            h.update(b"<missing>")
+    return h.hexdigest()
+
+
+def write_snapshot(path: str, key: str, state: dict) -> None:
+    """Escribe el snapshot de forma atómica (archivo temporal + os.replace)."""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp = f"{path}.tmp{os.getpid()}"
+    with open(tmp, "wb") as fh:
+        fh.write(MAGIC)
+        fh.write(SNAPSHOT_VERSION.to_bytes(4, "big"))
+        fh.write(key.encode("ascii").ljust(64, b"\0"))
+        pickle.dump(state, fh, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp, path)
+
+
+def read_snapshot(path: str, key: str) -> dict | None:
+    """Devuelve el estado guardado si versión y hash coinciden; None en cualquier otro caso."""
+    try:
+        with open(path, "rb") as fh:
+            if fh.read(len(MAGIC)) != MAGIC:
+                return None
+            if int.from_bytes(fh.read(4), "big") != SNAPSHOT_VERSION:
+                return None
+            if fh.read(64).rstrip(b"\0").decode("ascii") != key:
+                log.info("Snapshot %s desactualizado; se reconstruyen los índices", path)
+                return None
+            return pickle.load(fh)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        log.warning("No se pudo leer el snapshot %s: %s", path, e)
+        return None
@@ -1,7 +1,20 @@
 import math
-import os, json, re, unicodedata, logging
+import os, sys, json, re, unicodedata, logging, glob, hashlib, threading, time
+from array import array
 from collections import defaultdict
+from collections.abc import Mapping, Sequence, Set as AbstractSet
+from functools import lru_cache
 from pathlib import Path
+from types import MappingProxyType
+
+from app.aho_corasick import AhoCorasick
+from app.bk_tree import BKTree
+from app.cache import MISSING, LRUCache
+from app.catalog_snapshot import content_hash, read_snapshot
+from app.mmap_catalog import open_mmap_catalog
+from app.records import Program
+from app.symspell import SymSpell, edit_distance
+from app.topic_matrix import TextColumn
 
 log = logging.getLogger(__name__)
 if not logging.getLogger().handlers:
@@ -86,23 +99,28 @@ PROGRAMAS_PATH_CANDIDATES = [
     "programas_enriquecido.json",
 ]
 
-PROGRAMAS = []
-DATA_FORMAT = "unknown"  # "normalized_v2" | "normalized" | "raw"
-for pth in PROGRAMAS_PATH_CANDIDATES:
-    if os.path.exists(pth):
-        with open(pth, "r", encoding="utf-8") as fh:
-            PROGRAMAS = json.load(fh)
-        if pth.endswith("programas_normalizado_v2.json"):
-            DATA_FORMAT = "normalized_v2"
-        elif pth.endswith("programas_normalizado.json"):
-            DATA_FORMAT = "normalized"
-        else:
-            DATA_FORMAT = "raw"
-        break
 
-if not PROGRAMAS:
-    PROGRAMAS = []  # evita crash si no encuentra archivo
-    DATA_FORMAT = "raw"
+def _programas_path() -> str | None:
+    """Primer archivo de programas existente según la prioridad de PROGRAMAS_PATH_CANDIDATES."""
+    for pth in PROGRAMAS_PATH_CANDIDATES:
+        if os.path.exists(pth):
+            return pth
+    return None
+
+
+def _load_programas(pth: str | None) -> tuple[list, str]:
+    """Devuelve (programas, DATA_FORMAT) con DATA_FORMAT "normalized_v2" | "normalized" | "raw"."""
+    if not pth:
+        return [], "raw"  # evita crash si no encuentra archivo
+    with open(pth, "r", encoding="utf-8") as fh:
+        programas = json.load(fh)
+    if not programas:
+        return [], "raw"
+    if pth.endswith("programas_normalizado_v2.json"):
+        return programas, "normalized_v2"
+    if pth.endswith("programas_normalizado.json"):
+        return programas, "normalized"
+    return programas, "raw"
 
 # ========================= NORMALIZACIÓN =========================
 
@@ -126,7 +144,7 @@ def _to_text(x) -> str:
         return x
     if isinstance(x, (list, tuple, set)):
         return " ".join(_to_text(i) for i in x)
-    if isinstance(x, dict):
+    if isinstance(x, Mapping):
         return " ".join(_to_text(v) for v in x.values())
     return str(x)
 
@@ -134,11 +152,127 @@ def _tokens(s: str):
     return [t for t in re.split(r"[^\w]+", _norm(s)) if t]
 
 
-def _topic_tokens_from_text(text: str) -> set[str]:
+def _topic_tokens_from_text(text: str, exclude: set[str] = frozenset()) -> set[str]:
+    """Tokens temáticos (sin palabras vacías ni 'exclude'), corregidos y con sinónimos."""
     base_tokens = {
-        t for t in _tokens(text) if t and t not in TOPIC_STOPWORDS and t not in LEVEL_STOPWORDS
+        t for t in _tokens(text)
+        if t and t not in TOPIC_STOPWORDS and t not in LEVEL_STOPWORDS and t not in exclude
     }
-    return _expand_topic_tokens(base_tokens)
+    return _expand_topic_tokens(_correct_topic_tokens(base_tokens))
+
+
+def _correct_topic_tokens(tokens: set[str]) -> set[str]:
+    """
+    Corrige tokens temáticos mal escritos ("metalmecanika") a la palabra más
+    cercana del vocabulario de títulos/palabras clave/sinónimos (TOPIC_SPELLER).
+    Solo tokens desconocidos de 5+ letras, a distancia 1 (2 desde 9 letras);
+    nunca tokens de ubicación ni correcciones hacia palabras vacías o de nivel.
+    """
+    speller = get_catalog().state.get("TOPIC_SPELLER")
+    if speller is None:
+        return tokens
+    location_tokens = get_catalog()["LOCATION_TOKENS"]
+    out = set()
+    for tok in tokens:
+        if (
+            len(tok) >= 5
+            and not tok.isdigit()
+            and tok not in speller
+            and tok not in location_tokens
+            and tok not in DESC_TOKENS
+        ):
+            fixed = speller.lookup(tok, 2 if len(tok) >= 9 else 1)
+            if fixed and fixed not in TOPIC_STOPWORDS and fixed not in LEVEL_STOPWORDS:
+                tok = fixed
+        out.add(tok)
+    return out
+
+
+# Ubicaciones con typos: largo mínimo del texto y ventanas de hasta N palabras
+FUZZY_LOCATION_MIN_LEN = 4
+FUZZY_LOCATION_MAX_WORDS = 4
+
+
+def _fuzzy_location_distance(text: str) -> int:
+    return 2 if len(text) >= 7 else 1
+
+
+def _fuzzy_location_kind(tok: str) -> str:
+    """
+    Clasifica un token para las ventanas de ubicación difusa: "stop" (palabra
+    vacía), "loc" (ya es parte de una ubicación conocida), "topic" (número, nivel
+    o vocabulario temático bien escrito: nunca es ubicación) o "free" (posible typo).
+    """
+    if tok in TOPIC_STOPWORDS:
+        return "stop"
+    state = get_catalog().state
+    if tok in state["LOCATION_TOKENS"]:
+        return "loc"
+    speller = state.get("TOPIC_SPELLER")
+    if tok.isdigit() or tok in LEVEL_STOPWORDS or tok in DESC_TOKENS or (speller is not None and tok in speller):
+        return "topic"
+    return "free"
+
+
+def _topic_typo_distance(tok: str) -> int | None:
+    """Distancia a la corrección temática de 'tok' (TOPIC_SPELLER), None si no hay."""
+    speller = get_catalog().state.get("TOPIC_SPELLER")
+    if speller is None or len(tok) < 5:
+        return None
+    if tok in speller:
+        return 0
+    fixed = speller.lookup(tok, 2 if len(tok) >= 9 else 1)
+    return edit_distance(tok, fixed, 2) if fixed else None
+
+
+def _fuzzy_location_matches(text: str) -> list[tuple[str, set]]:
+    """
+    [(texto, {(tipo, llave), ...})] de ventanas de 1..FUZZY_LOCATION_MAX_WORDS
+    palabras a distancia 1 (2 desde 7 letras) de una sola ubicación conocida
+    (LOCATION_FUZZY). Cada ventana incluye al menos un token desconocido, no
+    empieza ni termina en palabra vacía y no contiene vocabulario temático; una
+    palabra suelta solo cuenta si está más cerca de la ubicación que de cualquier
+    término temático. Se prueban de la más larga a la más corta y cada palabra se
+    usa una sola vez.
+    """
+    trees = get_catalog().state.get("LOCATION_FUZZY")
+    if not trees:
+        return []
+    toks = _tokens(text)
+    kinds = [_fuzzy_location_kind(t) for t in toks]
+    if "free" not in kinds:
+        return []
+    taken = [False] * len(toks)
+    out = []
+    for size in range(min(FUZZY_LOCATION_MAX_WORDS, len(toks)), 0, -1):
+        tree = trees.get(size)
+        if tree is None:
+            continue
+        for i in range(len(toks) - size + 1):
+            span = kinds[i:i + size]
+            if any(taken[i:i + size]) or "free" not in span or "topic" in span:
+                continue
+            if span[0] == "stop" or span[-1] == "stop":
+                continue
+            phrase = " ".join(toks[i:i + size])
+            if len(phrase) < FUZZY_LOCATION_MIN_LEN:
+                continue
+            hits = tree.search(phrase, _fuzzy_location_distance(phrase))
+            if not hits:
+                continue
+            best = hits[0][0]
+            closest = [(w, p) for d, w, p in hits if d == best]
+            payloads = set().union(*(p for _w, p in closest))
+            if len(closest) > 1 and len(payloads) > 1:
+                continue  # ambiguo: no adivinamos
+            if size == 1:
+                topic_dist = _topic_typo_distance(phrase)
+                if topic_dist is not None and topic_dist <= best:
+                    continue
+            out.append((phrase, payloads))
+            for j in range(i, i + size):
+                taken[j] = True
+    return out
 
 
 def _intent_topic_tokens(intent: dict) -> set[str]:
@@ -232,16 +366,63 @@ _BUILTIN_TOPIC_SYNONYMS = {
 }
 
 
-def _match_general_info_entry(text: str):
-    if not GENERAL_INFO:
-        return None
+class GeneralInfoIndex:
+    """
+    Motor de información general (sena_info.json) construido una sola vez:
+      - autómata con todos los tags normalizados (una pasada por consulta)
+      - índice invertido tag -> entradas y id -> entrada
+    Ante varias coincidencias gana el tag más largo (más específico), luego la
+    entrada con más tags distintos y por último el orden del archivo.
+    El resultado se memoriza por texto normalizado para que las rutas que
+    consultan la misma pregunta en un request compartan el cálculo.
+    """
+
+    __slots__ = ("entries", "by_id", "by_tag", "_matcher", "_lookup")
+
+    def __init__(self, entries: list[dict], memo_size: int = 512):
+        self.entries = list(entries or [])
+        self.by_id = {}
+        self.by_tag = defaultdict(list)  # tag normalizado -> [posición de la entrada, ...]
+        self._matcher = AhoCorasick()
+        for pos, entry in enumerate(self.entries):
+            if entry.get("id"):
+                self.by_id.setdefault(entry["id"], entry)
+            for tag in entry.get("tags", []) or []:
+                tag_norm = _norm(tag)
+                if not tag_norm or pos in self.by_tag[tag_norm]:
+                    continue
+                if not self.by_tag[tag_norm]:
+                    self._matcher.add(tag_norm, tag_norm)
+                self.by_tag[tag_norm].append(pos)
+        self._matcher.build()
+        self._lookup = lru_cache(maxsize=memo_size)(self._match_norm)
+
+    def _match_norm(self, text_norm: str) -> dict | None:
+        best = {}  # posición -> (largo del tag más largo, # tags distintos)
+        seen = set()
+        for tag in self._matcher.find_all(text_norm, whole_words=False):
+            if tag in seen:
+                continue
+            seen.add(tag)
+            for pos in self.by_tag[tag]:
+                longest, count = best.get(pos, (0, 0))
+                best[pos] = (max(longest, len(tag)), count + 1)
+        if not best:
+            return None
+        pos = min(best, key=lambda p: (-best[p][0], -best[p][1], p))
+        return self.entries[pos]
+
+    def match(self, text: str) -> dict | None:
+        if not self.entries or not text:
+            return None
+        return self._lookup(_norm(text))
 
-    text_norm = _norm_basic_no_accents(text)
-    for entry in GENERAL_INFO:
-        for tag_norm in entry.get("tags_norm", []):
-            if tag_norm and tag_norm in text_norm:
-                return entry
-    return None
+
+GENERAL_INFO_INDEX = GeneralInfoIndex(GENERAL_INFO)
+
+
+def _match_general_info_entry(text: str):
+    return GENERAL_INFO_INDEX.match(text)
 
 
 def _match_general_info_answer(text: str) -> str | None:
@@ -342,16 +523,23 @@ NIVEL_PLURAL_LABEL = {
     "operario": "Operarios",
 }
 
-# Alias y sinónimos desde configuración externa
-_SEDE_ALIASES_V2_RAW, ALIAS_MUNICIPIO, ALIAS_SEDE = _load_location_aliases()
-SEDE_ALIASES_V2 = _SEDE_ALIASES_V2_RAW
-_TOPIC_SYNONYMS = _load_topic_synonyms()
-
-# reverse lookup: variante -> canon (lo usa el parser)
-SEDE_ALIAS_TO_CANON = {}
-for canon, variants in SEDE_ALIASES_V2.items():
-    for v in variants:
-        SEDE_ALIAS_TO_CANON[_norm(v)] = _norm(canon)
+def _load_config() -> dict:
+    """Alias y sinónimos desde configuración externa (ya normalizados)."""
+    sede_aliases_v2, alias_municipio, alias_sede = _load_location_aliases()
+
+    # reverse lookup: variante -> canon (lo usa el parser)
+    sede_alias_to_canon = {}
+    for canon, variants in sede_aliases_v2.items():
+        for v in variants:
+            sede_alias_to_canon[_norm(v)] = _norm(canon)
+
+    return {
+        "SEDE_ALIASES_V2": sede_aliases_v2,
+        "ALIAS_MUNICIPIO": alias_municipio,
+        "ALIAS_SEDE": alias_sede,
+        "_TOPIC_SYNONYMS": _load_topic_synonyms(),
+        "SEDE_ALIAS_TO_CANON": sede_alias_to_canon,
+    }
 
 
 # Expandir tokens de tema (sinónimos básicos; puedes añadir más)
@@ -402,15 +590,260 @@ def _fields_for_title(p):
     return _norm(p.get("programa") or p.get("nombre") or "")
 
 # ========================= ÍNDICES =========================
-from collections import defaultdict
+# Los datos y sus índices viven en un Catalog (ver get_catalog), construido de forma
+# perezosa en el primer uso. Los nombres de módulo de abajo son vistas de solo lectura
+# que siempre apuntan al catálogo vigente.
+class _CatalogMapping(Mapping):
+    """Vista dict de un índice del catálogo (p. ej. BY_CODE)."""
+
+    __slots__ = ("_name",)
+
+    def __init__(self, name: str):
+        self._name = name
+
+    def _target(self):
+        return get_catalog().state[self._name]
+
+    def __getitem__(self, key):
+        return get_catalog().state[self._name][key]
+
+    def get(self, key, default=None):
+        return get_catalog().state[self._name].get(key, default)
+
+    def __contains__(self, key) -> bool:
+        return key in get_catalog().state[self._name]
+
+    def __iter__(self):
+        return iter(self._target())
+
+    def __len__(self) -> int:
+        return len(self._target())
+
+    def keys(self):
+        return self._target().keys()
+
+    def items(self):
+        return self._target().items()
+
+    def values(self):
+        return self._target().values()
+
+    def __repr__(self) -> str:
+        return f"<catalog {self._name}: {len(self)} keys>"
+
+
+class _CatalogSet(AbstractSet):
+    """Vista set de un índice del catálogo (p. ej. KNOWN_MUNICIPIOS)."""
+
+    __slots__ = ("_name",)
+
+    def __init__(self, name: str):
+        self._name = name
+
+    def __contains__(self, key) -> bool:
+        return key in get_catalog().state[self._name]
+
+    def __iter__(self):
+        return iter(get_catalog().state[self._name])
+
+    def __len__(self) -> int:
+        return len(get_catalog().state[self._name])
+
+    def isdisjoint(self, other) -> bool:
+        return get_catalog().state[self._name].isdisjoint(other)
+
+    def __repr__(self) -> str:
+        return f"<catalog {self._name}: {len(self)} items>"
+
+
+class _CatalogSequence(Sequence):
+    """Vista list de los programas cargados (PROGRAMAS)."""
+
+    __slots__ = ("_name",)
+
+    def __init__(self, name: str):
+        self._name = name
+
+    def __getitem__(self, i):
+        return get_catalog().state[self._name][i]
+
+    def __iter__(self):
+        return iter(get_catalog().state[self._name])
 
-# Estructuras comunes (se rellenan según el formato de datos detectado)
-BY_CODE = {}                          # v2: "228118" -> programa base (con ofertas)
-BY_MUNICIPIO = defaultdict(list)      # v2: "popayan" / "popayan - vrd el sendero" -> [(code, ordinal), ...]
-BY_SEDE = defaultdict(list)           # v2: "calle 5" / "alto cauca" / "la casona" -> [(code, ordinal), ...]
-NG_TITLE = defaultdict(list)          # v2: n-gram (programa_norm + palabras_clave) -> [code, ...]
+    def __len__(self) -> int:
+        return len(get_catalog().state[self._name])
+
+    def __repr__(self) -> str:
+        return f"<catalog {self._name}: {len(self)} items>"
+
+
+PROGRAMAS = _CatalogSequence("PROGRAMAS")
+SEDE_ALIASES_V2 = _CatalogMapping("SEDE_ALIASES_V2")
+ALIAS_MUNICIPIO = _CatalogMapping("ALIAS_MUNICIPIO")
+ALIAS_SEDE = _CatalogMapping("ALIAS_SEDE")
+_TOPIC_SYNONYMS = _CatalogMapping("_TOPIC_SYNONYMS")
+SEDE_ALIAS_TO_CANON = _CatalogMapping("SEDE_ALIAS_TO_CANON")
+BY_CODE = _CatalogMapping("BY_CODE")                    # v2: "228118" -> programa base (con ofertas)
+OFFER_BY_KEY = _CatalogMapping("OFFER_BY_KEY")          # v2: ("228118", 2) -> oferta
+OFFER_COUNT = _CatalogMapping("OFFER_COUNT")            # v2: "228118" -> nº de ordinales únicos
+OFFER_KEYS = _CatalogSequence("OFFER_KEYS")             # v2: id de oferta -> ("228118", 2)
+PROGRAM_CODES = _CatalogSequence("PROGRAM_CODES")       # v2: id de programa -> "228118"
+BY_MUNICIPIO = _CatalogMapping("BY_MUNICIPIO")          # v2: "popayan" / "popayan - vrd el sendero" -> array(ids de oferta)
+BY_SEDE = _CatalogMapping("BY_SEDE")                    # v2: "calle 5" / "alto cauca" / "la casona" -> array(ids de oferta)
+NG_TITLE = _CatalogMapping("NG_TITLE")                  # v2: n-gram (programa_norm + palabras_clave) -> array(ids de programa)
+NG_SEDE = _CatalogMapping("NG_SEDE")                    # formatos previos: n-gram de sede -> [programa, ...]
+PROGRAM_FEATURES = _CatalogMapping("PROGRAM_FEATURES")  # v2: "228118" -> ProgramFeatures (campos ya normalizados)
+TITLE_TOKENS = _CatalogMapping("TITLE_TOKENS")          # v2: token -> array(ids de programa)
+TITLE_PHRASES = _CatalogMapping("TITLE_PHRASES")        # v2: frase (programa_norm/keyword completo) -> array(ids de programa)
+DESC_TOKENS = _CatalogMapping("DESC_TOKENS")            # v2: token (perfil/competencias/descripción) -> array(ids de programa)
+KNOWN_MUNICIPIOS = _CatalogSet("KNOWN_MUNICIPIOS")
+KNOWN_SEDES = _CatalogSet("KNOWN_SEDES")
+MUNICIPIO_CONTAINMENT = _CatalogMapping("MUNICIPIO_CONTAINMENT")  # v2: llave -> array(ids de oferta) de las llaves que la contienen o contiene
+SEDE_CONTAINMENT = _CatalogMapping("SEDE_CONTAINMENT")            # v2: ídem para sedes
+PROGRAMAS_BY_CODE = _CatalogMapping("PROGRAMAS_BY_CODE")
+
+# Valores escalares/objetos del catálogo: se resuelven con __getattr__ del módulo
+_CATALOG_ATTRS = ("DATA_FORMAT", "LOCATION_MATCHER")
+
+
+def __getattr__(name: str):
+    if name in _CATALOG_ATTRS:
+        return get_catalog().state[name]
+    if name == "CATALOG_GENERATION":
+        return get_catalog().generation
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def _is_v2() -> bool:
+    return get_catalog().is_v2
+
+def _program_title(prog) -> str:
+    return _norm(_to_text(prog.get("programa") or prog.get("programa_norm") or ""))
+
+
+def _program_description(prog) -> str:
+    """Perfil + competencias + descripción normalizados (campo 'desc' del puntaje temático)."""
+    return _norm(
+        _to_text(
+            [
+                prog.get("perfil") or prog.get("perfil_egresado") or "",
+                prog.get("competencias") or "",
+                prog.get("descripcion") or prog.get("descripción") or "",
+            ]
+        )
+    )
+
+
+def _interned_tokens(text: str) -> frozenset:
+    return frozenset(sys.intern(t) for t in _tokens(text))
+
+
+class ProgramFeatures:
+    """Campos normalizados de un programa v2, calculados una sola vez al indexar."""
+
+    __slots__ = (
+        "title",
+        "title_tokens",
+        "kw_tokens",
+        "kw_phrases",
+        "desc_tokens",
+        "municipio_keys",
+        "sede_keys",
+    )
+
+    def __init__(self, prog: dict):
+        self.title = _program_title(prog)
+        self.title_tokens = _interned_tokens(self.title)
+
+        kw = prog.get("palabras_clave") or []
+        self.kw_phrases = tuple(_norm(k or "") for k in kw)
+        self.kw_tokens = _interned_tokens(_to_text(kw))
+
+        self.desc_tokens = _interned_tokens(_program_description(prog))
+
+        # Claves de ubicación tal como vienen en las ofertas (para el bonus de _score_code)
+        ofertas = prog.get("ofertas") or []
+        self.municipio_keys = frozenset(
+            k for of in ofertas for k in (of.get("municipio_norm"), of.get("municipio_base_norm")) if k
+        )
+        self.sede_keys = frozenset(of.get("sede_norm") for of in ofertas if of.get("sede_norm"))
+
+    def to_dict(self) -> dict:
+        """Forma serializable (JSON) de los features, para el catálogo mmap."""
+        return {
+            name: value if isinstance(value, str) else sorted(value) if isinstance(value, frozenset) else list(value)
+            for name in self.__slots__
+            for value in (getattr(self, name),)
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "ProgramFeatures":
+        feat = cls.__new__(cls)
+        feat.title = data["title"]
+        feat.kw_phrases = tuple(data["kw_phrases"])
+        for name in ("title_tokens", "kw_tokens", "desc_tokens", "municipio_keys", "sede_keys"):
+            setattr(feat, name, frozenset(sys.intern(t) for t in data[name]))
+        return feat
 
 # --- Helpers genéricos ---
+
+
+def _id_postings() -> array:
+    return array("I")
+
+
+def _compact_postings(bucket: dict, dedup: bool = True) -> dict:
+    """llave -> array("I") de ids (ordenados y sin repetidos si dedup); llaves internadas."""
+    return {
+        sys.intern(k): array("I", sorted(set(ids)) if dedup else ids)
+        for k, ids in bucket.items()
+    }
+
+
+def _containment_postings(bucket: dict) -> dict:
+    """
+    Para cada llave del índice, fusiona los postings de todas las llaves que la
+    contienen o que están contenidas en ella (se calcula una vez al cargar).
+
+    Si 'a' está contenida en 'b', todos los trigramas de 'a' están en 'b': cada
+    llave se compara solo con las que comparten su trigrama más raro, en lugar
+    de contra todas (las de menos de 3 caracteres sí se comparan con todas).
+    """
+    keys = list(bucket.keys())
+    by_gram = defaultdict(list)
+    grams = []
+    for key in keys:
+        g = {key[i:i + 3] for i in range(len(key) - 2)}
+        grams.append(g)
+        for gram in g:
+            by_gram[gram].append(key)
+    related = {key: {key} for key in keys}
+    for key, g in zip(keys, grams):
+        candidates = by_gram[min(g, key=lambda gram: len(by_gram[gram]))] if g else keys
+        for k in candidates:
+            if k != key and key in k:
+                related[key].add(k)
+                related[k].add(key)
+    out = {}
+    for key in keys:
+        merged = set()
+        for k in related[key]:
+            merged.update(bucket[k])
+        out[sys.intern(key)] = array("I", sorted(merged))
+    return out
+
+
+def _location_pairs(key: str, bucket: dict, containment: dict) -> set:
+    """Postings (code, ordinal) para una llave de ubicación; escanea solo si es desconocida."""
+    ids = containment.get(key)
+    if ids is None:
+        ids = set()
+        for k, vals in bucket.items():
+            if key in k or k in key:
+                ids.update(vals)
+    offer_keys = get_catalog()["OFFER_KEYS"]
+    return {offer_keys[i] for i in ids}
+
 def _grams(s: str) -> set:
     s = _norm(s)
     out = set()
@@ -432,7 +865,7 @@ def _topic_match_codes(intent: dict) -> set:
     - Coincidencia por frase ("contains") usando TITLE_PHRASES
     - Coincidencia por tokens con umbral mínimo
     """
-    if DATA_FORMAT != "normalized_v2":
+    if not _is_v2():
         # Fallback: usa NG_TITLE existente
         grams = set()
         for t in (intent.get("tema_tokens") or []):
@@ -445,9 +878,9 @@ def _topic_match_codes(intent: dict) -> set:
 
     tokens = _intent_topic_tokens(intent)
     tail   = _norm(intent.get("tail_text") or "")
-    scores = _topic_scores_v2(tokens, tail) if DATA_FORMAT == "normalized_v2" else []
+    scores = _topic_scores_v2(tokens, tail) if _is_v2() else []
 
-    if DATA_FORMAT != "normalized_v2":
+    if not _is_v2():
         # Fallback: usa NG_TITLE existente
         grams = set()
         for t in tokens:
@@ -461,31 +894,19 @@ def _topic_match_codes(intent: dict) -> set:
     return {code for code, _ in scores}
 
 
-def _topic_match_score_v2(prog: dict, tema_tokens: set[str], tema_phrase: str) -> int:
+def _topic_match_score_v2(feat: ProgramFeatures, tema_tokens: set[str], tema_phrase: str) -> int:
     """
     Calcula un puntaje de match temático SOLO usando el programa base (v2).
     Aplica pesos explícitos por campo para priorizar título/área/keywords
-    sobre descripciones, y normaliza acentos para evitar falsos negativos.
+    sobre descripciones. Lee los campos ya normalizados de PROGRAM_FEATURES.
     """
     if not (tema_tokens or tema_phrase):
         return 0
 
-    titulo = _norm(_to_text(prog.get("programa") or prog.get("programa_norm") or ""))
-    titulo_toks = set(_tokens(titulo))
-    kw = prog.get("palabras_clave") or []
-    kw_norm = _norm(_to_text(kw))
-    kw_toks = set(_tokens(kw_norm))
-
-    descripcion = _norm(
-        _to_text(
-            [
-                prog.get("perfil") or prog.get("perfil_egresado") or "",
-                prog.get("competencias") or "",
-                prog.get("descripcion") or prog.get("descripción") or "",
-            ]
-        )
-    )
-    desc_toks = set(_tokens(descripcion))
+    titulo = feat.title
+    titulo_toks = feat.title_tokens
+    kw_toks = feat.kw_tokens
+    desc_toks = feat.desc_tokens
 
     score = 0
 
@@ -493,7 +914,7 @@ def _topic_match_score_v2(prog: dict, tema_tokens: set[str], tema_phrase: str) -
     if tema_phrase:
         if tema_phrase in titulo:
             score += 80
-        if any(tema_phrase in _norm(k or "") for k in kw):
+        if any(tema_phrase in k for k in feat.kw_phrases):
             score += 60
 
     # 2) Cobertura ponderada por campo
@@ -519,71 +940,193 @@ def _topic_match_score_v2(prog: dict, tema_tokens: set[str], tema_phrase: str) -
 def _topic_scores_v2(tema_tokens: set[str], tema_phrase: str) -> list[tuple[str,int]]:
     """
     Devuelve [(code, score)] ordenado por score descendente para DATA_FORMAT == 'normalized_v2'.
-    Aplica un umbral para filtrar ruido.
+    Solo puntúa los programas recuperados desde los índices invertidos y
+    aplica un umbral para filtrar ruido. Con TOPIC_SCORER=sparse el puntaje sale
+    de la matriz dispersa del catálogo (mismo resultado, sin recorrer programas);
+    con TOPIC_RANKER=bm25f se usa el ranking BM25F en lugar del puntaje clásico.
     """
-    results = []
-    for code, prog in BY_CODE.items():
-        sc = _topic_match_score_v2(prog, tema_tokens, tema_phrase)
-        if sc >= 15:
-            results.append((code, sc))
+    state = get_catalog().state
+    ranker, matrix = state.get("TOPIC_BM25F"), state.get("TOPIC_MATRIX")
+    if ranker is not None:
+        # BM25F: solo tokens temáticos (la frase no suma); basta cualquier coincidencia
+        results = [
+            (code, pts) for code, sc in ranker.scores(tema_tokens).items()
+            for pts in (ranker.points(sc),) if pts > 0
+        ]
+    elif matrix is not None:
+        results = matrix.scores(tema_tokens, tema_phrase, _topic_candidate_keys(tema_tokens, tema_phrase), min_score=15)
+    else:
+        results = []
+        for code in _topic_candidate_codes(tema_tokens, tema_phrase):
+            sc = _topic_match_score_v2(PROGRAM_FEATURES[code], tema_tokens, tema_phrase)
+            if sc >= 15:
+                results.append((code, sc))
     results.sort(key=lambda x: (-x[1], BY_CODE[x[0]]["programa_norm"]))
     return results
 
-TITLE_TOKENS = defaultdict(set)   # token -> {code,...}
-TITLE_PHRASES = defaultdict(set)  # frase (programa_norm/keyword completo) -> {code,...}
+
+def _topic_candidate_keys(tema_tokens: set[str], tema_phrase: str) -> set[str]:
+    keys = set(tema_tokens or ())
+    if tema_phrase:
+        keys.update(_tokens(tema_phrase))
+    return keys
+
+
+def _topic_phrase_text(state: dict) -> TextColumn:
+    """
+    Título + palabras clave de cada programa (fila = id de programa), tal como los
+    compara _topic_match_score_v2. Se arma en el primer uso y queda en el estado.
+    """
+    text = state.get("TOPIC_PHRASE_TEXT")
+    if text is None:
+        features = state["PROGRAM_FEATURES"]
+        text = TextColumn(
+            ["\n".join((features[code].title, *features[code].kw_phrases)) for code in state["PROGRAM_CODES"]]
+        )
+        state["TOPIC_PHRASE_TEXT"] = text
+    return text
+
+
+def _topic_candidate_codes(tema_tokens: set[str], tema_phrase: str) -> set[str]:
+    """
+    Recupera los códigos que comparten al menos un token temático (ya expandido)
+    con el título, las palabras clave o la descripción, usando los postings, más
+    los que contienen la frase en el título o una palabra clave (p. ej. "sistem"
+    dentro de "sistemas"), que _topic_match_score_v2 también puntúa.
+    """
+    ids = set()
+    for tok in _topic_candidate_keys(tema_tokens, tema_phrase):
+        ids.update(TITLE_TOKENS.get(tok, ()))
+        ids.update(DESC_TOKENS.get(tok, ()))
+    state = get_catalog().state
+    if tema_phrase:
+        ids.update(_topic_phrase_text(state).rows_containing(tema_phrase))
+    program_codes = state["PROGRAM_CODES"]
+    return {program_codes[i] for i in ids}
+
 
 # ========================= RUTA v2 (programas_normalizado_v2.json) =========================
-if DATA_FORMAT == "normalized_v2":
-    # Limpia / reinicia índices v2
-    BY_CODE.clear()
-    BY_MUNICIPIO.clear()
-    BY_SEDE.clear()
-    NG_TITLE.clear()
-    TITLE_TOKENS.clear()
-    TITLE_PHRASES.clear()
+def _program_fingerprint(prog) -> str:
+    """Huella del contenido de un programa v2 (JSON canónico)."""
+    data = prog.to_dict() if isinstance(prog, Program) else prog
+    raw = json.dumps(data, ensure_ascii=False, sort_keys=True, default=list)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def diff_program_hashes(old: Mapping, new: Mapping) -> dict:
+    """Códigos agregados, modificados y eliminados entre dos PROGRAM_HASHES."""
+    return {
+        "added": sorted(c for c in new if c not in old),
+        "changed": sorted(c for c in new if c in old and old[c] != new[c]),
+        "removed": sorted(c for c in old if c not in new),
+    }
+
+
+# Llaves que devuelve _build_v2_indexes: un snapshot v2 al que le falte alguna es de
+# una versión anterior del código y se descarta (se reconstruye).
+V2_INDEX_KEYS = frozenset({
+    "PROGRAMAS", "BY_CODE", "OFFER_BY_KEY", "OFFER_COUNT", "OFFER_KEYS", "PROGRAM_CODES",
+    "BY_MUNICIPIO", "BY_SEDE", "NG_TITLE", "NG_SEDE", "PROGRAM_FEATURES", "PROGRAM_HASHES",
+    "TITLE_TOKENS", "TITLE_PHRASES", "DESC_TOKENS", "KNOWN_MUNICIPIOS", "KNOWN_SEDES",
+    "MUNICIPIO_CONTAINMENT", "SEDE_CONTAINMENT", "LOCATION_MATCHER", "LOCATION_FUZZY",
+    "PROGRAMAS_BY_CODE", "TOPIC_SPELLER", "LOCATION_TOKENS",
+})
+
+
+def _build_v2_indexes(programas: list, cfg: dict, previous: dict | None = None) -> dict:
+    """
+    Construye todos los índices derivados para DATA_FORMAT == "normalized_v2".
+
+    Programas y ofertas quedan como registros Program/Offer (con __slots__ y
+    strings internados). Los postings son arrays de ids enteros: id de oferta
+    (posición en OFFER_KEYS) para ubicaciones e id de programa (posición en
+    PROGRAM_CODES) para título/descripción.
+
+    Con 'previous' (estado de la construcción anterior) los programas cuya huella
+    no cambió reutilizan su registro y sus ProgramFeatures; solo se normalizan y
+    tokenizan los agregados o modificados. Los postings se rearman siempre porque
+    los ids son posicionales.
+    """
+    sede_aliases_v2 = cfg["SEDE_ALIASES_V2"]
+    sede_alias_to_canon = cfg["SEDE_ALIAS_TO_CANON"]
+
+    prev_hashes = (previous or {}).get("PROGRAM_HASHES") or {}
+    prev_by_code = (previous or {}).get("BY_CODE") or {}
+    prev_features = (previous or {}).get("PROGRAM_FEATURES") or {}
+    program_hashes = {}
+    reused_features = {}
+    records = []
+    for p in programas:
+        code = str(p.get("codigo") or "").strip()
+        fp = _program_fingerprint(p)
+        if code:
+            program_hashes[code] = fp
+        old = prev_by_code.get(code) if prev_hashes.get(code) == fp else None
+        feat = prev_features.get(code) if old is not None else None
+        if isinstance(old, Program) and isinstance(feat, ProgramFeatures):
+            records.append(old)
+            reused_features[code] = feat
+        else:
+            records.append(p if isinstance(p, Program) else Program(p))
+    by_code = {}
+    offer_by_key = {}
+    offer_count = {}
+    offer_ids = {}                        # (code, ordinal) -> id de oferta
+    program_ids = {}                      # code -> id de programa
+    by_municipio = defaultdict(_id_postings)
+    by_sede = defaultdict(_id_postings)
+    ng_title = defaultdict(set)
+    program_features = {}
+    title_tokens = defaultdict(set)
+    title_phrases = defaultdict(set)
+    desc_tokens = defaultdict(set)
 
     # --- helper interno: añade claves de sede/centro a BY_SEDE
-    def _index_sede_keys(oferta, code, ord_n):
+    def _index_sede_keys(oferta, oid):
         # Tomamos sede_norm y centro_norm (algunas filas lo traen solo en 'centro_norm')
         raw_keys = [oferta.get("sede_norm"), oferta.get("centro_norm")]
         for raw in raw_keys:
             if not raw:
                 continue
             k = _norm(raw)
-            BY_SEDE[k].append((code, ord_n))
+            by_sede[k].append(oid)
         # Si hay un canon definido para esta clave, también indexa bajo canon y sus alias
         for raw in raw_keys:
             if not raw:
                 continue
             k = _norm(raw)
-            canon = SEDE_ALIAS_TO_CANON.get(k)
+            canon = sede_alias_to_canon.get(k)
             if canon:
-                BY_SEDE[canon].append((code, ord_n))
+                by_sede[canon].append(oid)
                 # Indexa además todas las variantes declaradas para ese canon
-                for v in SEDE_ALIASES_V2.get(canon, set()):
-                    BY_SEDE[_norm(v)].append((code, ord_n))
+                for v in sede_aliases_v2.get(canon, set()):
+                    by_sede[_norm(v)].append(oid)
 
     # Indexación principal
-    for prog in PROGRAMAS:
-        code = str(prog.get("codigo") or "").strip()
+    for prog in records:
+        code = sys.intern(str(prog.get("codigo") or "").strip())
         if not code:
             continue
 
         # 1) Código -> programa base
-        BY_CODE[code] = prog
+        by_code[code] = prog
+        pid = program_ids.setdefault(code, len(program_ids))
 
-        # 2) Ubicaciones (se indexa por cada oferta)
-        ofertas = prog.get("ofertas") or []
+        # 2) Ubicaciones (se indexa por cada oferta) + lookup directo (code, ordinal)
+        ofertas = prog.get("ofertas") or ()
         for of in ofertas:
-            ord_n = of.get("ordinal", 1)
+            offer_by_key.setdefault((code, of.get("ordinal")), of)
+        offer_count[code] = len({of.get("ordinal") for of in ofertas if of.get("ordinal")})
+        for of in ofertas:
+            oid = offer_ids.setdefault((code, of.get("ordinal", 1)), len(offer_ids))
 
             # Municipio: usar tanto el municipio_norm como el municipio_base_norm
             for key in (of.get("municipio_norm"), of.get("municipio_base_norm")):
                 if key:
-                    BY_MUNICIPIO[_norm(key)].append((code, ord_n))
+                    by_municipio[_norm(key)].append(oid)
 
             # Sede/centro + alias
-            _index_sede_keys(of, code, ord_n)
+            _index_sede_keys(of, oid)
 
         # 3) Título/tema:
         #    - NG_TITLE (n-gramas) para compatibilidad
@@ -591,180 +1134,640 @@ if DATA_FORMAT == "normalized_v2":
         #    - TITLE_TOKENS (tokens) para matching por cobertura
         name_norm = _norm(prog.get("programa_norm") or prog.get("programa") or "")
         if name_norm:
-            TITLE_PHRASES[name_norm].add(code)
+            title_phrases[name_norm].add(pid)
             for g in _grams(name_norm):
-                NG_TITLE[g].append(code)
+                ng_title[g].add(pid)
             for tok in _tokens(name_norm):
-                TITLE_TOKENS[tok].add(code)
+                title_tokens[tok].add(pid)
 
         for kw in (prog.get("palabras_clave") or []):
             kw_norm = _norm(kw or "")
             if not kw_norm:
                 continue
-            TITLE_PHRASES[kw_norm].add(code)
+            title_phrases[kw_norm].add(pid)
             for g in _grams(kw_norm):
-                NG_TITLE[g].append(code)
+                ng_title[g].add(pid)
             for tok in _tokens(kw_norm):
-                TITLE_TOKENS[tok].add(code)
-
-    # 4) Expansión de alias de sedes (por si algún canon no se tocó arriba)
-    if "SEDE_ALIASES_V2" in globals():
-        for canon, variants in SEDE_ALIASES_V2.items():
-            canon_key = _norm(canon)
-            pairs = BY_SEDE.get(canon_key, [])
-            if pairs:
-                for v in variants:
-                    BY_SEDE[_norm(v)].extend(pairs)
+                title_tokens[tok].add(pid)
+
+        # 4) Registro de features normalizados + DESC_TOKENS (perfil/competencias/descripción)
+        feat = reused_features.get(code) or ProgramFeatures(prog)
+        program_features[code] = feat
+        for tok in feat.desc_tokens:
+            desc_tokens[tok].add(pid)
+
+    # 5) Expansión de alias de sedes (por si algún canon no se tocó arriba)
+    for canon, variants in sede_aliases_v2.items():
+        canon_key = _norm(canon)
+        ids = by_sede.get(canon_key)
+        if ids:
+            for v in variants:
+                by_sede[_norm(v)].extend(ids)
+
+    # 6) Llaves conocidas (después de expandir alias)
+    known_municipios = set(by_municipio.keys())
+    known_sedes = set(by_sede.keys())
+
+    return {
+        "PROGRAMAS": tuple(records),
+        "BY_CODE": by_code,
+        "OFFER_BY_KEY": offer_by_key,
+        "OFFER_COUNT": offer_count,
+        "OFFER_KEYS": tuple(offer_ids),
+        "PROGRAM_CODES": tuple(program_ids),
+        "BY_MUNICIPIO": _compact_postings(by_municipio, dedup=False),
+        "BY_SEDE": _compact_postings(by_sede, dedup=False),
+        "NG_TITLE": _compact_postings(ng_title),
+        "NG_SEDE": {},
+        "PROGRAM_FEATURES": program_features,
+        "PROGRAM_HASHES": program_hashes,
+        "TITLE_TOKENS": _compact_postings(title_tokens),
+        "TITLE_PHRASES": _compact_postings(title_phrases),
+        "DESC_TOKENS": _compact_postings(desc_tokens),
+        "KNOWN_MUNICIPIOS": known_municipios,
+        "KNOWN_SEDES": known_sedes,
+        # Postings fusionados por contención de llaves ("popayan" <-> "popayan - vrd el sendero")
+        "MUNICIPIO_CONTAINMENT": _containment_postings(by_municipio),
+        "SEDE_CONTAINMENT": _containment_postings(by_sede),
+        # 7) Detector de ubicaciones (un solo autómata con municipios, sedes y alias)
+        "LOCATION_MATCHER": _build_location_matcher(known_municipios, known_sedes, cfg),
+        "LOCATION_FUZZY": _build_location_fuzzy(known_municipios, known_sedes, cfg),
+        "PROGRAMAS_BY_CODE": {},
+        # 8) Corrección de typos en temas (diccionario de borrados)
+        **_build_spelling_state(title_tokens, known_municipios, known_sedes, cfg),
+    }
 
-    # 5) Llaves conocidas (después de expandir alias)
-    KNOWN_MUNICIPIOS = set(BY_MUNICIPIO.keys())
-    KNOWN_SEDES = set(BY_SEDE.keys())
 
-# ========================= Fallback: formatos anteriores =========================
-else:
-    # Mantiene tu lógica previa (para programas_enriquecido.json o normalizado v1),
-    # usando los helpers que ya tienes definidos: _code_of, _loc_fields, _fields_for_title, etc.
-    BY_CODE = defaultdict(list)         # codigo -> [variant,...]
-    BY_MUNICIPIO = defaultdict(list)    # municipio_norm -> [p,...]
-    BY_SEDE = defaultdict(list)         # sede_norm -> [p,...]
-    NG_SEDE = defaultdict(list)         # ngram sede -> [p,...]
-    NG_TITLE = defaultdict(list)        # ngram titulo -> [p,...]
-
-    # ---- Alias (evita genéricos como "santander") ----
-    ALIAS_MUNICIPIO = {
-        "popayan": {"popayan", "popa", "ppyn"},
-        "popayan - vrd. el sendero": {"popayan - vrd. el sendero", "popayan - vereda el sendero", "vereda el sendero", "vrd. el sendero", "el sendero"},
-        "santander de quilichao": {"santander de quilichao", "quilichao", "qilichao"},
-        "guapi": {"guapi", "guapy", "guap"},
-        "la sierra": {"la sierra", "sierra", "siera"},
-        "mercaderes": {"mercaderes", "mercaderez"},
-        "morales": {"morales", "moralez", "morale"},
-        "puerto tejada": {"puerto tejada"},
-        "silvia": {"silvia", "silv", "slv"},
-        "timbio": {"timbio", "tmbio", "timbi"},
-        "timbiqui": {"timbiqui"},
-    }
-    ALIAS_SEDE = {
-        "la casona": {"la casona", "sede la casona", "casona"},
-        "sena sede calle 5 con cra 14 esquina barrio valencia": {
-            "calle 5", "sena sede calle 5", "sede calle 5", "barrio valencia", "ctpi barrio valencia"
-        },
-        "sede alto cauca": {"alto cauca", "sede alto cauca", "sede norte", "ctpi norte"},
-        "sede la samaria": {"sede la samaria", "la samaria", "samaria"},
+def _build_spelling_state(title_tokens, known_municipios, known_sedes, cfg: dict) -> dict:
+    """
+    TOPIC_SPELLER: diccionario de borrados sobre tokens de título/palabras clave
+    (frecuencia = programas que los usan) y de sinónimos. Incluye las palabras
+    vacías y de nivel para que un typo nunca se "corrija" hacia otra palabra.
+    LOCATION_TOKENS: tokens de municipios, sedes y alias, que no se corrigen.
+    """
+    words = {tok: len(ids) for tok, ids in title_tokens.items()}
+    for canon, variants in cfg["_TOPIC_SYNONYMS"].items():
+        for tok in _tokens(" ".join([canon, *variants])):
+            words.setdefault(tok, 1)
+    for canon, variants in _BUILTIN_TOPIC_SYNONYMS.items():
+        for tok in _tokens(" ".join([canon, *variants])):
+            words.setdefault(tok, 1)
+    for tok in TOPIC_STOPWORDS | LEVEL_STOPWORDS:
+        words[tok] = max(words.get(tok, 0), 1 << 20)
+
+    location_tokens = set()
+    for key in (*known_municipios, *known_sedes):
+        location_tokens.update(_tokens(key))
+    for mapping in (cfg["ALIAS_MUNICIPIO"], cfg["ALIAS_SEDE"], cfg["SEDE_ALIASES_V2"]):
+        for canon, variants in mapping.items():
+            location_tokens.update(_tokens(" ".join([canon, *variants])))
+    return {
+        "TOPIC_SPELLER": SymSpell(words, max_distance=2),
+        "LOCATION_TOKENS": frozenset(sys.intern(t) for t in location_tokens),
     }
 
-    def _alias_lookup(bucket: dict, q_norm: str) -> set:
-        for canon, variants in bucket.items():
-            if q_norm in variants:
-                return variants
-        return {q_norm}
 
-    def _ngrams_for_text(s: str) -> set:
-        s = _norm(s)
-        toks = [t for t in _tokens(s) if t]
-        grams = set()
-        for t in toks:
-            n = len(t)
-            for k in (3, 4, 5, 6):
-                if n >= k:
-                    for i in range(0, n - k + 1):
-                        grams.add(t[i:i+k])
-                else:
-                    grams.add(t)
-        return grams
-
-    # --- Index keys para municipios: forma completa + base (antes de "-") ---
-    def _mun_index_keys(mun_raw: str) -> set:
-        if not mun_raw:
-            return set()
-        m = _norm(mun_raw)
-        keys = set()
-        if m:
-            keys.add(m)
-        base = re.split(r"\s*[-–]\s*", m)[0].strip()
-        if base:
-            keys.add(base)
-        m_exp = m.replace("vrd.", "vereda").replace("vrd", "vereda")
-        if m_exp != m:
-            keys.add(m_exp)
-            base2 = re.split(r"\s*[-–]\s*", m_exp)[0].strip()
-            if base2:
-                keys.add(base2)
-        return {k for k in keys if k}
-
-    # --- Ordinal real de una variante dentro de su código ---
-    def _ordinal_for_variant(code: str, p_obj) -> int:
-        lst = BY_CODE.get(str(code).strip(), [])
-        for i, pi in enumerate(lst, start=1):
-            if pi is p_obj:
-                return i
-        return 1
+def _location_entries(known_municipios, known_sedes, cfg: dict):
+    """(patrón, (tipo, llave canónica)) de municipios, sedes y alias cuyo canon esté indexado."""
+    for k in known_municipios:
+        yield k, ("municipio", k)
+    for canon, variants in cfg["ALIAS_MUNICIPIO"].items():
+        if canon in known_municipios:
+            for v in variants:
+                yield v, ("municipio", canon)
+    for k in known_sedes:
+        yield k, ("sede", k)
+    for v, canon in cfg["SEDE_ALIAS_TO_CANON"].items():
+        yield v, ("sede", canon)
+    for canon, variants in cfg["ALIAS_SEDE"].items():
+        if canon in known_sedes:
+            for v in variants:
+                yield v, ("sede", canon)
+
+
+def _build_location_matcher(known_municipios, known_sedes, cfg: dict) -> AhoCorasick:
+    """Autómata v2 con municipios, sedes y alias cuyo canon esté indexado."""
+    matcher = AhoCorasick()
+    for pattern, payload in _location_entries(known_municipios, known_sedes, cfg):
+        matcher.add(pattern, payload)
+    return matcher.build()
+
+
+def _build_location_fuzzy(known_municipios, known_sedes, cfg: dict) -> dict[int, BKTree]:
+    """
+    BK-trees con las mismas llaves y alias que LOCATION_MATCHER, para tolerar
+    typos. Uno por número de palabras: una ventana de la consulta solo se compara
+    con llaves de su mismo largo en palabras.
+    """
+    trees: dict[int, BKTree] = {}
+    for pattern, payload in _location_entries(known_municipios, known_sedes, cfg):
+        words = _tokens(pattern)  # misma forma que las ventanas de la consulta
+        pattern = " ".join(words)
+        if len(pattern) >= FUZZY_LOCATION_MIN_LEN and len(words) <= FUZZY_LOCATION_MAX_WORDS:
+            trees.setdefault(len(words), BKTree()).add(pattern, payload)
+    return trees
 
-    # ---- Construcción de índices principales (formato previo) ----
-    if not BY_CODE:
-        for p in PROGRAMAS:
-            code = _code_of(p)
-            if not code:
-                continue
-            BY_CODE[code].append(p)
 
-            mun, sede, _hr = _loc_fields(p)
+# ========================= Fallback: formatos anteriores =========================
+# ---- Alias (evita genéricos como "santander") ----
+_LEGACY_ALIAS_MUNICIPIO = {
+    "popayan": {"popayan", "popa", "ppyn"},
+    "popayan - vrd. el sendero": {"popayan - vrd. el sendero", "popayan - vereda el sendero", "vereda el sendero", "vrd. el sendero", "el sendero"},
+    "santander de quilichao": {"santander de quilichao", "quilichao", "qilichao"},
+    "guapi": {"guapi", "guapy", "guap"},
+    "la sierra": {"la sierra", "sierra", "siera"},
+    "mercaderes": {"mercaderes", "mercaderez"},
+    "morales": {"morales", "moralez", "morale"},
+    "puerto tejada": {"puerto tejada"},
+    "silvia": {"silvia", "silv", "slv"},
+    "timbio": {"timbio", "tmbio", "timbi"},
+    "timbiqui": {"timbiqui"},
+}
+_LEGACY_ALIAS_SEDE = {
+    "la casona": {"la casona", "sede la casona", "casona"},
+    "sena sede calle 5 con cra 14 esquina barrio valencia": {
+        "calle 5", "sena sede calle 5", "sede calle 5", "barrio valencia", "ctpi barrio valencia"
+    },
+    "sede alto cauca": {"alto cauca", "sede alto cauca", "sede norte", "ctpi norte"},
+    "sede la samaria": {"sede la samaria", "la samaria", "samaria"},
+}
 
-            # municipio: indexa por forma completa y base (incluye "popayan - vrd. el sendero" bajo "popayan")
-            if mun:
-                for key in _mun_index_keys(mun):
-                    BY_MUNICIPIO[key].append(p)
 
-            # sede
-            if sede:
-                sede_n = _norm(sede)
-                BY_SEDE[sede_n].append(p)
-                for g in _ngrams_for_text(sede_n):
-                    NG_SEDE[g].append(p)
+def _alias_lookup(bucket: dict, q_norm: str) -> set:
+    for canon, variants in bucket.items():
+        if q_norm in variants:
+            return variants
+    return {q_norm}
 
-            # título / contenido para temas
-            title = _fields_for_title(p)
-            if title:
-                for g in _ngrams_for_text(title):
-                    NG_TITLE[g].append(p)
 
-    # ---- Conjuntos de llaves conocidas (ahora sí pobladas) ----
-    KNOWN_MUNICIPIOS = set(BY_MUNICIPIO.keys())
-    KNOWN_SEDES = set(BY_SEDE.keys())
+def _ngrams_for_text(s: str) -> set:
+    s = _norm(s)
+    toks = [t for t in _tokens(s) if t]
+    grams = set()
+    for t in toks:
+        n = len(t)
+        for k in (3, 4, 5, 6):
+            if n >= k:
+                for i in range(0, n - k + 1):
+                    grams.add(t[i:i+k])
+            else:
+                grams.add(t)
+    return grams
 
-    # ---- Vista normalizada por código (programa + ofertas) (formato previo) ----
-    PROGRAMAS_BY_CODE = {}
-    for p in PROGRAMAS:
+
+# --- Index keys para municipios: forma completa + base (antes de "-") ---
+def _mun_index_keys(mun_raw: str) -> set:
+    if not mun_raw:
+        return set()
+    m = _norm(mun_raw)
+    keys = set()
+    if m:
+        keys.add(m)
+    base = re.split(r"\s*[-–]\s*", m)[0].strip()
+    if base:
+        keys.add(base)
+    m_exp = m.replace("vrd.", "vereda").replace("vrd", "vereda")
+    if m_exp != m:
+        keys.add(m_exp)
+        base2 = re.split(r"\s*[-–]\s*", m_exp)[0].strip()
+        if base2:
+            keys.add(base2)
+    return {k for k in keys if k}
+
+
+def _build_legacy_indexes(programas: list) -> dict:
+    """
+    Mantiene la lógica previa (para programas_enriquecido.json o normalizado v1),
+    usando los helpers _code_of, _loc_fields, _fields_for_title, etc.
+    """
+    by_code = defaultdict(list)         # codigo -> [variant,...]
+    by_municipio = defaultdict(list)    # municipio_norm -> [p,...]
+    by_sede = defaultdict(list)         # sede_norm -> [p,...]
+    ng_sede = defaultdict(list)         # ngram sede -> [p,...]
+    ng_title = defaultdict(list)        # ngram titulo -> [p,...]
+
+    # ---- Construcción de índices principales (formato previo) ----
+    for p in programas:
         code = _code_of(p)
         if not code:
             continue
-        base = PROGRAMAS_BY_CODE.setdefault(code, {
-            "code": code,
-            "nivel": p.get("nivel"),
-            "programa": p.get("programa") or p.get("nombre") or "",
-            "perfil": p.get("perfil") or p.get("perfil_egresado") or "",
-            "competencias": p.get("competencias") or "",
-            "certificacion": p.get("certificacion") or p.get("certificación") or "",
-            "ofertas": [],
-        })
-        mun, sede, hor = _loc_fields(p)
-        base["ofertas"].append({
-            "ordinal": _ordinal_for_variant(code, p),
-            "municipio": mun,
-            "sede": sede,
-            "horario": hor,
-        })
+        by_code[code].append(p)
+
+        mun, sede, _hr = _loc_fields(p)
+
+        # municipio: indexa por forma completa y base (incluye "popayan - vrd. el sendero" bajo "popayan")
+        if mun:
+            for key in _mun_index_keys(mun):
+                by_municipio[key].append(p)
+
+        # sede
+        if sede:
+            sede_n = _norm(sede)
+            by_sede[sede_n].append(p)
+            for g in _ngrams_for_text(sede_n):
+                ng_sede[g].append(p)
+
+        # título / contenido para temas
+        title = _fields_for_title(p)
+        if title:
+            for g in _ngrams_for_text(title):
+                ng_title[g].append(p)
+
+    # ---- Detector de ubicaciones (equivale a los \b...\b por llave/alias) ----
+    matcher = AhoCorasick()
+    for k in by_municipio.keys():
+        matcher.add(k, ("municipio", k))
+    for canon, variants in _LEGACY_ALIAS_MUNICIPIO.items():
+        indexed = [vv for vv in variants if vv in by_municipio]
+        for v in variants:
+            for vv in indexed:
+                matcher.add(v, ("municipio", vv))
+    for k in by_sede.keys():
+        matcher.add(k, ("sede", k))
+    for canon, variants in _LEGACY_ALIAS_SEDE.items():
+        for v in variants:
+            matcher.add(v, ("sede", _norm(v)))
+    matcher.build()
+
+    # ---- Vista normalizada por código (programa + ofertas) (formato previo) ----
+    programas_by_code = {}
+    for code, variants in by_code.items():
+        for ordinal, p in enumerate(variants, start=1):
+            base = programas_by_code.setdefault(code, {
+                "code": code,
+                "nivel": p.get("nivel"),
+                "programa": p.get("programa") or p.get("nombre") or "",
+                "perfil": p.get("perfil") or p.get("perfil_egresado") or "",
+                "competencias": p.get("competencias") or "",
+                "certificacion": p.get("certificacion") or p.get("certificación") or "",
+                "ofertas": [],
+            })
+            mun, sede, hor = _loc_fields(p)
+            base["ofertas"].append({
+                "ordinal": ordinal,
+                "municipio": mun,
+                "sede": sede,
+                "horario": hor,
+            })
+
+    return {
+        "ALIAS_MUNICIPIO": _LEGACY_ALIAS_MUNICIPIO,
+        "ALIAS_SEDE": _LEGACY_ALIAS_SEDE,
+        "BY_CODE": by_code,
+        "OFFER_BY_KEY": {},
+        "OFFER_COUNT": {},
+        "OFFER_KEYS": (),
+        "PROGRAM_CODES": (),
+        "BY_MUNICIPIO": by_municipio,
+        "BY_SEDE": by_sede,
+        "NG_TITLE": ng_title,
+        "NG_SEDE": ng_sede,
+        "PROGRAM_FEATURES": {},
+        "TITLE_TOKENS": defaultdict(set),
+        "TITLE_PHRASES": defaultdict(set),
+        "DESC_TOKENS": defaultdict(set),
+        # ---- Conjuntos de llaves conocidas (ahora sí pobladas) ----
+        "KNOWN_MUNICIPIOS": set(by_municipio.keys()),
+        "KNOWN_SEDES": set(by_sede.keys()),
+        "MUNICIPIO_CONTAINMENT": {},
+        "SEDE_CONTAINMENT": {},
+        "LOCATION_MATCHER": matcher,
+        "PROGRAMAS_BY_CODE": programas_by_code,
+    }
+
+
+# ========================= SNAPSHOT / INSTALACIÓN DEL CATÁLOGO =========================
+# Snapshot binario generado por scripts/build_catalog_snapshot.py (vacío = deshabilitado)
+CATALOG_SNAPSHOT_PATH = os.getenv(
+    "CATALOG_SNAPSHOT_PATH", _here("..", "storage_simple", "catalog_snapshot.bin")
+)
+# Catálogo mmap generado por scripts/build_catalog_mmap.py (vacío = deshabilitado).
+# Tiene prioridad sobre el snapshot: los workers comparten una sola copia en memoria.
+CATALOG_MMAP_PATH = os.getenv("CATALOG_MMAP_PATH", _here("..", "storage_simple", "catalog.mmap"))
+# Motor del puntaje temático v2: "classic" (sets por programa) o "sparse"
+# (matriz dispersa, requiere numpy + scipy; mismo resultado).
+TOPIC_SCORER = os.getenv("TOPIC_SCORER", "classic").strip().lower()
+# Ranking temático v2: "classic" (pesos fijos por campo) o "bm25f" (IDF + longitud
+# de campo, precalculado en postings). Con bm25f se ignora TOPIC_SCORER.
+TOPIC_RANKER = os.getenv("TOPIC_RANKER", "classic").strip().lower()
+
+
+def _catalog_source_paths(programas_path: str | None) -> list[str]:
+    """Archivos de los que dependen los índices: programas + app/config/*.{json,yaml,yml}."""
+    paths = [programas_path] if programas_path else []
+    for pattern in ("*.json", "*.yaml", "*.yml"):
+        paths.extend(sorted(glob.glob(os.path.join(CONFIG_DIR, pattern))))
+    return paths
+
+
+def catalog_content_key(programas_path: str | None = None) -> str:
+    """Hash de contenido (programas + configuración) que identifica un snapshot válido."""
+    return content_hash(_catalog_source_paths(programas_path or _programas_path()))
+
+
+def _attach_topic_scorers(state: dict) -> None:
+    """
+    Agrega al estado v2 los motores temáticos opcionales: TOPIC_BM25F si
+    TOPIC_RANKER=bm25f, o TOPIC_MATRIX si TOPIC_SCORER=sparse y numpy/scipy están
+    disponibles.
+    """
+    if state["DATA_FORMAT"] != "normalized_v2":
+        return
+    if TOPIC_RANKER == "bm25f":
+        from app.bm25f import BM25FIndex
+
+        state["TOPIC_BM25F"] = BM25FIndex(
+            (
+                code,
+                {
+                    "title": _tokens(_program_title(prog)),
+                    "kw": _tokens(_to_text(prog.get("palabras_clave") or [])),
+                    "desc": _tokens(_program_description(prog)),
+                },
+            )
+            for code, prog in state["BY_CODE"].items()
+        )
+        return
+    if TOPIC_SCORER != "sparse":
+        return
+    from app import topic_matrix
+
+    if not topic_matrix.available():
+        log.warning("TOPIC_SCORER=sparse requiere numpy y scipy; se usa el puntaje clásico")
+        return
+    state["TOPIC_MATRIX"] = topic_matrix.TopicMatrix(
+        state["PROGRAM_CODES"], state["PROGRAM_FEATURES"], state["TITLE_TOKENS"], state["DESC_TOKENS"]
+    )
+
+
+def mmap_catalog_state(key: str) -> dict | None:
+    """Estado v2 respaldado por el archivo mmap si su hash coincide; None si no aplica."""
+    if not CATALOG_MMAP_PATH:
+        return None
+    mm = open_mmap_catalog(CATALOG_MMAP_PATH, key)
+    if mm is None:
+        return None
+    state = {"DATA_FORMAT": "normalized_v2", **_load_config()}
+    state.update(mm.indexes(ProgramFeatures.from_dict))
+    state["LOCATION_MATCHER"] = _build_location_matcher(
+        state["KNOWN_MUNICIPIOS"], state["KNOWN_SEDES"], state
+    )
+    state["LOCATION_FUZZY"] = _build_location_fuzzy(state["KNOWN_MUNICIPIOS"], state["KNOWN_SEDES"], state)
+    state.update(_build_spelling_state(state["TITLE_TOKENS"], state["KNOWN_MUNICIPIOS"], state["KNOWN_SEDES"], state))
+    return state
+
+
+def build_catalog_state(previous: dict | None = None) -> dict:
+    """
+    Carga programas y configuración y reconstruye todos los índices derivados.
+    'previous' (estado anterior) permite reutilizar los programas sin cambios.
+    """
+    pth = _programas_path()
+    programas, data_format = _load_programas(pth)
+    state = {"PROGRAMAS": programas, "DATA_FORMAT": data_format, **_load_config()}
+    if data_format == "normalized_v2":
+        state.update(_build_v2_indexes(programas, state, previous))
+    else:
+        state.update(_build_legacy_indexes(programas))
+    return state
+
+
+class Catalog:
+    """
+    Programas + configuración de alias/sinónimos + todos los índices derivados.
+
+    'state' es un dict con las llaves de las vistas del módulo (BY_CODE, KNOWN_SEDES,
+    LOCATION_MATCHER, ...). Se obtiene con get_catalog(); no construir a mano salvo
+    en scripts y pruebas.
+    """
+
+    __slots__ = ("state", "content_key", "source", "load_seconds", "generation")
+
+    def __init__(self, state: dict, content_key: str = "", source: str = "build", load_seconds: float = 0.0):
+        self.state = state
+        self.content_key = content_key
+        self.source = source
+        self.load_seconds = load_seconds
+        # Generación de los datos indexados: las cachés y la paginación guardada la
+        # comparan para no servir resultados calculados sobre un catálogo anterior.
+        self.generation = 1
+
+    def __getitem__(self, name: str):
+        return self.state[name]
+
+    @property
+    def data_format(self) -> str:
+        return self.state["DATA_FORMAT"]
+
+    @property
+    def is_v2(self) -> bool:
+        return self.state["DATA_FORMAT"] == "normalized_v2"
+
+    @classmethod
+    def load(cls, previous: dict | None = None) -> "Catalog":
+        """
+        Usa el snapshot compilado si su hash coincide con los archivos actuales; si no,
+        reconstruye (reutilizando de 'previous' los programas sin cambios).
+        """
+        t0 = time.perf_counter()
+        key = catalog_content_key()
+        state, source = mmap_catalog_state(key), "mmap"
+        if state is None and CATALOG_SNAPSHOT_PATH:
+            state = read_snapshot(CATALOG_SNAPSHOT_PATH, key)
+            source = "snapshot"
+            if state is not None and state.get("DATA_FORMAT") == "normalized_v2":
+                missing = V2_INDEX_KEYS.difference(state)
+                if missing:
+                    log.warning("Snapshot %s incompleto (faltan %s); se reconstruye", CATALOG_SNAPSHOT_PATH, sorted(missing))
+                    state = None
+        if state is None:
+            state, source = build_catalog_state(previous), "build"
+        _attach_topic_scorers(state)
+        catalog = cls(state, key, source, time.perf_counter() - t0)
+        log.info(
+            "Catálogo %s cargado (%s, %d programas) en %.0f ms",
+            catalog.data_format, source, len(state["BY_CODE"]), catalog.load_seconds * 1000,
+        )
+        return catalog
+
+    def stats(self) -> dict:
+        return {
+            "data_format": self.data_format,
+            "generation": self.generation,
+            "source": self.source,
+            "programas": len(self.state["BY_CODE"]),
+            "content_key": self.content_key,
+            "load_ms": round(self.load_seconds * 1000, 1),
+        }
+
+
+_CATALOG: Catalog | None = None
+_CATALOG_LOCK = threading.Lock()
+
+
+def get_catalog() -> Catalog:
+    """Catálogo vigente; se construye una sola vez (bajo lock) en el primer uso."""
+    global _CATALOG
+    catalog = _CATALOG
+    if catalog is None:
+        with _CATALOG_LOCK:
+            if _CATALOG is None:
+                _CATALOG = Catalog.load()
+            catalog = _CATALOG
+    return catalog
+
+
+def catalog_generation() -> int:
+    return get_catalog().generation
+
+
+# ========================= RECARGA EN CALIENTE =========================
+CATALOG_WATCH_INTERVAL = float(os.getenv("CATALOG_WATCH_INTERVAL", "0"))  # segundos; 0 = sin watcher
+_RELOAD_LOCK = threading.Lock()
+_WATCHER: threading.Thread | None = None
+_WATCHER_STOP = threading.Event()
+
+
+def reload_catalog(force: bool = False) -> bool:
+    """
+    Reconstruye programas + alias/sinónimos e intercambia el catálogo de forma atómica.
+
+    La construcción ocurre fuera de _CATALOG_LOCK: mientras tanto las consultas siguen
+    usando el catálogo anterior. Sin 'force' no hace nada si el hash de contenido no
+    cambió. Devuelve True si hubo intercambio; si la nueva configuración es inválida
+    la excepción se propaga y el catálogo vigente se conserva.
+    """
+    global _CATALOG
+    with _RELOAD_LOCK:
+        current = get_catalog()
+        if not force and catalog_content_key() == current.content_key:
+            return False
+        fresh = Catalog.load(previous=current.state)
+        with _CATALOG_LOCK:
+            fresh.generation = _CATALOG.generation + 1
+            _CATALOG = fresh
+    clear_caches()
+    old_hashes, new_hashes = current.state.get("PROGRAM_HASHES"), fresh.state.get("PROGRAM_HASHES")
+    if old_hashes is None or new_hashes is None:
+        # mmap/legacy no guardan huellas por programa
+        log.info("Catálogo recargado: generación %d", fresh.generation)
+    else:
+        diff = diff_program_hashes(old_hashes, new_hashes)
+        log.info(
+            "Catálogo recargado: generación %d (%d nuevos, %d modificados, %d eliminados)",
+            fresh.generation, len(diff["added"]), len(diff["changed"]), len(diff["removed"]),
+        )
+    return True
+
+
+def _source_signature() -> tuple:
+    """(ruta, mtime, tamaño) de los archivos de origen; barato de comparar en cada sondeo."""
+    sig = []
+    for pth in _catalog_source_paths(_programas_path()):
+        try:
+            st = os.stat(pth)
+            sig.append((pth, st.st_mtime_ns, st.st_size))
+        except OSError:
+            sig.append((pth, None, None))
+    return tuple(sig)
+
+
+def _watch_catalog(interval: float, last: tuple) -> None:
+    while not _WATCHER_STOP.wait(interval):
+        sig = _source_signature()
+        if sig == last:
+            continue
+        last = sig
+        try:
+            reload_catalog()
+        except Exception as e:
+            log.error("No se pudo recargar el catálogo; se mantiene la generación %d: %s",
+                      catalog_generation(), e)
+
+
+def start_catalog_watcher(interval: float | None = None) -> threading.Thread | None:
+    """Arranca (una vez) el hilo que vigila mtime de programas y app/config/* y recarga."""
+    global _WATCHER
+    interval = CATALOG_WATCH_INTERVAL if interval is None else interval
+    if interval <= 0:
+        return None
+    with _RELOAD_LOCK:
+        if _WATCHER is None or not _WATCHER.is_alive():
+            _WATCHER_STOP.clear()
+            _WATCHER = threading.Thread(
+                target=_watch_catalog,
+                args=(interval, _source_signature()),
+                name="catalog-watcher",
+                daemon=True,
+            )
+            _WATCHER.start()
+    return _WATCHER
+
+
+def stop_catalog_watcher() -> None:
+    global _WATCHER
+    _WATCHER_STOP.set()
+    if _WATCHER is not None:
+        _WATCHER.join(timeout=5)
+    _WATCHER = None
+
 # ========================= PARSER DE INTENCIÓN =========================
-def _parse_intent(q: str) -> dict:
+INTENT_CACHE = LRUCache(maxsize=int(os.getenv("INTENT_CACHE_SIZE", "2048")), name="intent")
+SEARCH_CACHE = LRUCache(
+    maxsize=int(os.getenv("SEARCH_CACHE_SIZE", "1024")),
+    ttl=float(os.getenv("SEARCH_CACHE_TTL", "900")),
+    name="search",
+)
+RENDER_CACHE = LRUCache(maxsize=int(os.getenv("RENDER_CACHE_SIZE", "4096")), name="render")
+_CACHES = [INTENT_CACHE, SEARCH_CACHE, RENDER_CACHE]
+
+
+def clear_caches() -> None:
+    """Invalida las cachés derivadas del catálogo y de la configuración de alias."""
+    for cache in _CACHES:
+        cache.clear()
+
+
+def cache_stats() -> list[dict]:
+    return [cache.stats() for cache in _CACHES]
+
+
+def _freeze_intent(data: dict) -> MappingProxyType:
+    """Copia inmutable de una intención (sets -> frozenset, listas -> tuplas)."""
+    frozen = {}
+    for k, v in data.items():
+        if isinstance(v, dict):
+            v = _freeze_intent(v)
+        elif isinstance(v, (set, frozenset)):
+            v = frozenset(v)
+        elif isinstance(v, list):
+            v = tuple(v)
+        frozen[k] = v
+    return MappingProxyType(frozen)
+
+
+def _parse_intent(q: str) -> MappingProxyType:
+    """
+    Parser de intención con caché LRU por texto normalizado.
+    Las intenciones devueltas son inmutables (se comparten entre llamadas).
+    """
+    qn = _norm(q or "")
+    intent = INTENT_CACHE.get(qn, generation=catalog_generation())
+    if intent is MISSING:
+        intent = _freeze_intent(_parse_intent_uncached(qn))
+        INTENT_CACHE.put(qn, intent, generation=catalog_generation())
+    return intent
+
+
+def _parse_intent_uncached(qn: str) -> dict:
     """
     Parser de intención compatible con:
       - DATA_FORMAT == "normalized_v2": usa KNOWN_MUNICIPIOS / KNOWN_SEDES y n-gramas de título (NG_TITLE)
       - Formatos previos: usa alias y NG_SEDE si existen
+    Recibe el texto ya normalizado con _norm.
     Retorna un dict con posibles llaves: code, ordinal, nivel, location{municipio[], sede[]}, tema_tokens
     """
-    qn = _norm(q or "")
-
-    city_raw, city_norm = _extract_explicit_city(q or "")
+    city_raw, city_norm = _extract_explicit_city(qn)
 
     def _with_explicit_city(data: dict) -> dict:
         if city_norm and city_norm in KNOWN_MUNICIPIOS:
@@ -789,48 +1792,30 @@ def _parse_intent(q: str) -> dict:
             break
 
     # Helpers locales
+    fuzzy_parts: list[str] = []  # texto de las ubicaciones reconocidas con typos
+
     def _collect_loc_matches(text_tail: str):
         """Devuelve (municipios_detectados, sedes_detectadas) según DATA_FORMAT."""
         tail = _norm(text_tail)
         munis, sedes = set(), set()
 
-        if DATA_FORMAT == "normalized_v2":
-            # Busca por contains tanto en municipio_norm como base_norm
-            for k in KNOWN_MUNICIPIOS:
-                if k in tail or tail in k:
-                    munis.add(k)
-            for k in KNOWN_SEDES:
-                if k in tail or tail in k:
-                    sedes.add(k)
-            # Coincidencias por alias explícito
-            for v, canon in SEDE_ALIAS_TO_CANON.items():
-                if v in tail or tail in v:
-                    sedes.add(canon)
-        else:
-            # Formato previo (mantiene tu lógica antigua si existen esas estructuras)
-            for k in BY_MUNICIPIO.keys():
-                if re.search(rf"\b{re.escape(k)}\b", tail):
-                    munis.add(k)
-            ALIAS_M = globals().get("ALIAS_MUNICIPIO", {})
-            for canon, variants in ALIAS_M.items():
-                for v in variants:
-                    if re.search(rf"\b{re.escape(v)}\b", tail):
-                        # agrega todas las variantes que estén indexadas
-                        for vv in ALIAS_M.get(canon, {canon}):
-                            if vv in BY_MUNICIPIO:
-                                munis.add(vv)
-
-            for k in BY_SEDE.keys():
-                if re.search(rf"\b{re.escape(k)}\b", tail):
-                    sedes.add(k)
-            ALIAS_S = globals().get("ALIAS_SEDE", {})
-            for canon, variants in ALIAS_S.items():
-                for v in variants:
-                    if re.search(rf"\b{re.escape(v)}\b", tail):
-                        sedes.add(_norm(v))
+        # Una sola pasada sobre la cola con límites de palabra
+        for _start, _end, (kind, key) in get_catalog()["LOCATION_MATCHER"].iter_matches(tail):
+            if kind == "municipio":
+                munis.add(key)
+            else:
+                sedes.add(key)
 
+        # Ubicaciones con typos ("popayna", "quilichau", "vrd el sendro")
+        if _is_v2():
+            for surface, payloads in _fuzzy_location_matches(tail):
+                for kind, key in payloads:
+                    (munis if kind == "municipio" else sedes).add(key)
+                fuzzy_parts.append(surface)
+
+        if not _is_v2():
             # NG_SEDE (si existe)
-            if "NG_SEDE" in globals():
+            if NG_SEDE:
                 for g in _ngrams_for_text(tail):
                     if g in NG_SEDE:
                         for p in NG_SEDE[g]:
@@ -858,7 +1843,8 @@ def _parse_intent(q: str) -> dict:
             mun_detect, sede_detect = _collect_loc_matches(tail_txt)
             if mun_detect or sede_detect:
                 loc = {"municipio": list(mun_detect)} if mun_detect else {"sede": list(sede_detect)}
-                base_tokens = _topic_tokens_from_text(qn)
+                # las ubicaciones con typos no deben pasar por la corrección temática
+                base_tokens = _topic_tokens_from_text(qn, exclude={t for part in fuzzy_parts for t in _tokens(part)})
                 loc_parts = list(mun_detect) + list(sede_detect)
                 if city_norm:
                     loc_parts.append(city_norm)
@@ -904,12 +1890,13 @@ def _score_code(code: str, intent: dict) -> int:
     factor secundario y nivel como bonus.
     En formatos legacy retorna 0 (se ordena por nombre).
     """
-    if DATA_FORMAT != "normalized_v2":
+    if not _is_v2():
         return 0
 
     prog = BY_CODE.get(code)
     if not prog:
         return 0
+    feat = PROGRAM_FEATURES[code]
 
     score = 0
 
@@ -917,26 +1904,29 @@ def _score_code(code: str, intent: dict) -> int:
     if intent.get("nivel") and intent["nivel"] == prog.get("nivel_norm"):
         score += 5
 
-    # Ubicación (miramos todas las ofertas)
+    # Ubicación (claves de todas las ofertas, precalculadas)
     loc = intent.get("location") or {}
-    ofertas = prog.get("ofertas") or []
 
     if "municipio" in loc:
         muni_keys = {_norm(x) for x in loc["municipio"] if x}
-        if any((of.get("municipio_norm") in muni_keys) or
-               (of.get("municipio_base_norm") in muni_keys) for of in ofertas):
+        if not feat.municipio_keys.isdisjoint(muni_keys):
             score += 2
 
     if "sede" in loc:
         sede_keys = {_norm(x) for x in loc["sede"] if x}
-        if any(of.get("sede_norm") in sede_keys for of in ofertas):
+        if not feat.sede_keys.isdisjoint(sede_keys):
             score += 2
 
     # Afinidad por tema
     tema_tokens = _intent_topic_tokens(intent)
     tail = _norm(intent.get("tail_text") or "")
     if tema_tokens or tail:
-        score += min(120, _topic_match_score_v2(prog, tema_tokens, tail))
+        ranker = get_catalog().state.get("TOPIC_BM25F")
+        if ranker is not None:
+            topic = ranker.points(ranker.score(code, tema_tokens))
+        else:
+            topic = _topic_match_score_v2(feat, tema_tokens, tail)
+        score += min(120, topic)
 
     return score
 
@@ -971,6 +1961,19 @@ def _score_program(p, intent) -> int:
         if any(t in fields_topic for t in tt): score += 15
     return score
 
+def _search_cache_key(intent) -> tuple:
+    """Forma canónica (hashable) de los campos de la intención que afectan la búsqueda."""
+    loc = intent.get("location") or {}
+    return (
+        intent.get("nivel"),
+        tuple(sorted({_norm(x) for x in loc.get("municipio") or () if x})),
+        tuple(sorted({_norm(x) for x in loc.get("sede") or () if x})),
+        tuple(sorted(intent.get("tema_tokens") or ())),
+        intent.get("tail_text") or "",
+        (intent.get("explicit_city") or {}).get("norm"),
+    )
+
+
 def _search_programs(intent: dict) -> list[tuple]:
     # 1) código-ordinal directo
     if intent.get("code") and intent.get("ordinal"):
@@ -982,6 +1985,16 @@ def _search_programs(intent: dict) -> list[tuple]:
         if not prog: return []
         return [(intent["code"], of.get("ordinal", i+1)) for i, of in enumerate(prog.get("ofertas", []))]
 
+    # Búsqueda general: lista rankeada cacheada por intención canónica
+    key = _search_cache_key(intent)
+    ranked = SEARCH_CACHE.get(key, generation=catalog_generation())
+    if ranked is MISSING:
+        ranked = tuple(_search_programs_uncached(intent))
+        SEARCH_CACHE.put(key, ranked, generation=catalog_generation())
+    return list(ranked)
+
+
+def _search_programs_uncached(intent: dict) -> list[tuple]:
     candidates = set()
     explicit_city = (intent.get("explicit_city") or {}).get("norm")
     explicit_city_filter = explicit_city and (intent.get("tema_tokens") or intent.get("tail_text"))
@@ -989,27 +2002,16 @@ def _search_programs(intent: dict) -> list[tuple]:
     # 3) ubicación primero (si viene)
     had_loc = False
     if explicit_city_filter:
-        for k, pairs in BY_MUNICIPIO.items():
-            if explicit_city in k or k in explicit_city:
-                for pair in pairs:
-                    candidates.add(pair)
+        candidates |= _location_pairs(explicit_city, BY_MUNICIPIO, MUNICIPIO_CONTAINMENT)
         had_loc = True
 
     for muni in intent.get("location", {}).get("municipio", []):
         had_loc = True
-        key = _norm(muni)
-        # intentamos match por beginswith (soporte "popayan - vrd")
-        for k in list(BY_MUNICIPIO.keys()):
-            if key in k or k in key:
-                for pair in BY_MUNICIPIO[k]:
-                    candidates.add(pair)
+        # match por contención (soporte "popayan - vrd"), precalculado al cargar
+        candidates |= _location_pairs(_norm(muni), BY_MUNICIPIO, MUNICIPIO_CONTAINMENT)
     for sede in intent.get("location", {}).get("sede", []):
         had_loc = True
-        key = _norm(sede)
-        for k in list(BY_SEDE.keys()):
-            if key in k or k in key:
-                for pair in BY_SEDE[k]:
-                    candidates.add(pair)
+        candidates |= _location_pairs(_norm(sede), BY_SEDE, SEDE_CONTAINMENT)
 
     # 4) tema
     topic_codes = _topic_match_codes(intent)
@@ -1128,7 +2130,7 @@ def _render_ficha_v2(prog: dict, of: dict | None, code: str) -> str:
 
     if comp:
         parts.append("\n*Competencias:*")
-        comp_list = comp if isinstance(comp, list) else [str(comp)]
+        comp_list = list(comp) if isinstance(comp, (list, tuple)) else [str(comp)]
         for c in comp_list[:6]:
             if c:
                 parts.append(f"• {c}")
@@ -1161,39 +2163,46 @@ def _get_offer_v2(code: str, ordinal: int):
     prog = BY_CODE.get(code)
     if not prog:
         return None, None
-    for of in prog.get("ofertas", []):
-        if of.get("ordinal") == ordinal:
-            return prog, of
-    return prog, None
+    return prog, OFFER_BY_KEY.get((code, ordinal))
 
 def _offer_count_v2(prog_or_code) -> int:
     """
     Devuelve el número de ofertas reales (ordinales únicos) para un programa (v2).
     Acepta el dict del programa o un código.
     """
-    if DATA_FORMAT != "normalized_v2":
+    if not _is_v2():
         return 0
-    prog = prog_or_code
-    if not isinstance(prog_or_code, dict):
-        prog = BY_CODE.get(str(prog_or_code).strip()) or {}
-    ofertas = prog.get("ofertas") or []
-    # contar ordinales únicos por seguridad
-    seen = set()
-    for of in ofertas:
-        o = of.get("ordinal")
-        if o:
-            seen.add(o)
-    return len(seen)
+    if isinstance(prog_or_code, Mapping):
+        code = str(prog_or_code.get("codigo") or "").strip()
+    else:
+        code = str(prog_or_code).strip()
+    return OFFER_COUNT.get(code, 0)
+
+
+def _cached_render(key: tuple, render):
+    """Devuelve el render cacheado para 'key' (por generación del catálogo) o lo construye."""
+    out = RENDER_CACHE.get(key, generation=catalog_generation())
+    if out is MISSING:
+        out = render()
+        RENDER_CACHE.put(key, out, generation=catalog_generation())
+    return out
 
 
 def ficha_por_codigo_y_ordinal(code: str, ord_n: int) -> str:
     """
     Si hay dataset v2: muestra la ubicación específica (municipio+sede+horario) del ordinal dado.
     Si no, cae al render legacy usando la n-ésima variante.
+    El texto se cachea por (código, ordinal) para códigos existentes.
     """
     code = str(code).strip()
+    if code not in BY_CODE:
+        return _ficha_por_codigo_y_ordinal(code, ord_n)
+    return _cached_render(("ficha", code, ord_n), lambda: _ficha_por_codigo_y_ordinal(code, ord_n))
+
 
-    if DATA_FORMAT == "normalized_v2":
+def _ficha_por_codigo_y_ordinal(code: str, ord_n: int) -> str:
+
+    if _is_v2():
         prog, of = _get_offer_v2(code, ord_n)
         if not prog:
             return "No encontré ese programa."
@@ -1215,10 +2224,17 @@ def ficha_por_codigo(code: str) -> str:
       - Si el programa tiene varias ofertas: lista las ubicaciones (10 primeras) con su ordinal.
       - Si tiene una sola: muestra la ficha completa de esa oferta.
     Si no hay v2, renderiza con el formato legacy.
+    El texto se cachea por código para códigos existentes.
     """
     code = str(code).strip()
+    if code not in BY_CODE:
+        return _ficha_por_codigo(code)
+    return _cached_render(("ficha", code), lambda: _ficha_por_codigo(code))
+
+
+def _ficha_por_codigo(code: str) -> str:
 
-    if DATA_FORMAT == "normalized_v2":
+    if _is_v2():
         prog = BY_CODE.get(code)
         if not prog:
             return "No encontré un programa con ese código.\n\nPrueba revisando el código 😢."
@@ -1272,16 +2288,11 @@ def _format_list(items: list[tuple], page: int = 0, page_size: int = PAGE_SIZE)
 
     cards = []
     for i, (code, ord_n) in enumerate(chunk, start=start + 1):
-        if DATA_FORMAT == "normalized_v2":
+        if _is_v2():
             prog = BY_CODE.get(code)
-            of = None
-            if prog:
-                for o in (prog.get("ofertas") or []):
-                    if o.get("ordinal") == ord_n:
-                        of = o
-                        break
-
-            offer_count = len((prog or {}).get("ofertas") or [])
+            of = OFFER_BY_KEY.get((code, ord_n)) if prog else None
+
+            offer_count = OFFER_COUNT.get(code, 0)
             if offer_count > 1:
                 hint = f"💡 +{offer_count-1} ubic. más — escribe *{code}* para ver todas."
             else:
@@ -1357,7 +2368,7 @@ def _nth_by_code(code: str, n: int):
     Devuelve la n-ésima variante (1-based) de un programa por código usando BY_CODE=list.
     En normalized_v2 no aplica y retorna None.
     """
-    if DATA_FORMAT == "normalized_v2":
+    if _is_v2():
         return None
     lst = BY_CODE.get(str(code).strip(), [])
     return lst[n - 1] if 1 <= n <= len(lst) else None
@@ -1369,21 +2380,38 @@ def _find_by_code(code: str):
     Devuelve la primera variante para un código usando BY_CODE=list.
     En normalized_v2 no aplica y retorna None (ficha_por_codigo usa BY_CODE[code] v2 directamente).
     """
-    if DATA_FORMAT == "normalized_v2":
+    if _is_v2():
         return None
     lst = BY_CODE.get(str(code).strip(), [])
     return lst[0] if lst else None
 
 def _render_prog_fields(prog, fields):
-    """Utilidad para armar bloques de requisitos/perfil/competencias/certificacion."""
+    """
+    Utilidad para armar bloques de requisitos/perfil/competencias/certificacion.
+    Los bloques se cachean por (código, campos pedidos).
+    """
+    wanted = (
+        "requisitos" in fields,
+        "perfil" in fields,
+        "competencias" in fields,
+        "certificacion" in fields or "certificación" in fields,
+    )
+    code = str(prog.get("codigo") or prog.get("code") or "").strip()
+    if not code:
+        return _render_prog_fields_uncached(prog, wanted)
+    return list(_cached_render(("fields", code) + wanted, lambda: tuple(_render_prog_fields_uncached(prog, wanted))))
+
+
+def _render_prog_fields_uncached(prog, wanted: tuple) -> list[str]:
+    want_req, want_perfil, want_comp, want_cert = wanted
     parts = []
-    if "requisitos" in fields:
+    if want_req:
         parts.append("\n*Requisitos:*")
         parts.append(prog.get("requisitos") or "No disponible.")
-    if "perfil" in fields:
+    if want_perfil:
         parts.append("\n*Perfil del egresado:*")
         parts.append(prog.get("perfil") or "No disponible.")
-    if "competencias" in fields:
+    if want_comp:
         parts.append("\n*Competencias:*")
         comps = prog.get("competencias") or []
         if comps:
@@ -1394,7 +2422,7 @@ def _render_prog_fields(prog, fields):
                 parts.append(f"   (+{len(comps)-6} más)")
         else:
             parts.append("No disponible.")
-    if "certificacion" in fields or "certificación" in fields:
+    if want_cert:
         parts.append("\n*Certificación:*")
         parts.append(prog.get("certificacion") or "No disponible.")
     return parts
@@ -1422,15 +2450,12 @@ def _handle_follow_query(texto: str) -> str or None:
     intent = _parse_intent(texto)
 
     # 1) Si viene código-ordinal: responde específico a esa oferta
-    if intent.get("code") and intent.get("ordinal") and DATA_FORMAT == "normalized_v2":
+    if intent.get("code") and intent.get("ordinal") and _is_v2():
         code, ord_n = intent["code"], intent["ordinal"]
         prog = BY_CODE.get(code)
         if not prog:
             return "No encontré información para ese código."
-        oferta = None
-        for of in (prog.get("ofertas") or []):
-            if of.get("ordinal") == ord_n:
-                oferta = of; break
+        oferta = OFFER_BY_KEY.get((code, ord_n))
 
         if not oferta:
             return "No encontré esa variante (revisa el *código-ordinal*)."
@@ -1443,13 +2468,13 @@ def _handle_follow_query(texto: str) -> str or None:
         # Campos de programa (generales)
         parts += _render_prog_fields(prog, asked - {"horario"})
         # Sugerencia
-        all_offers = prog.get("ofertas") or []
-        if len(all_offers) > 1:
-            parts.append(f"\n💡 Este programa tiene *{len(all_offers)} ubicaciones*. Escribe *{code}* para ver todas.")
+        offer_count = OFFER_COUNT.get(code, 0)
+        if offer_count > 1:
+            parts.append(f"\n💡 Este programa tiene *{offer_count} ubicaciones*. Escribe *{code}* para ver todas.")
         return "\n".join([p for p in parts if p])
 
     # 2) Si viene código SIN ordinal
-    if intent.get("code") and DATA_FORMAT == "normalized_v2":
+    if intent.get("code") and _is_v2():
         code = intent["code"]
         prog = BY_CODE.get(code)
         if not prog:
@@ -1475,8 +2500,9 @@ def _handle_follow_query(texto: str) -> str or None:
         parts += _render_prog_fields(prog, asked - {"horario"})
 
         # Sugerencia de ubicaciones
-        if len(ofertas) > 1:
-            parts.append(f"\n💡 Este programa tiene *{len(ofertas)} ubicaciones*. Escribe *{code}* para listarlas.")
+        offer_count = OFFER_COUNT.get(code, 0)
+        if offer_count > 1:
+            parts.append(f"\n💡 Este programa tiene *{offer_count} ubicaciones*. Escribe *{code}* para listarlas.")
         return "\n".join([p for p in parts if p])
 
     # 3) Sin código: combinar con nivel/ubicación si la consulta los trae
@@ -1490,15 +2516,13 @@ def _handle_follow_query(texto: str) -> str or None:
     items = items[:10]
 
     # Si pide HORARIO → mejor mostrar por oferta (code-ordinal) con ubicación
-    if "horario" in asked and DATA_FORMAT == "normalized_v2":
+    if "horario" in asked and _is_v2():
         lines = ["*Horarios encontrados:*"]
         seen = set()
         for code, ord_n in items:
-            prog = BY_CODE.get(code); oferta = None
+            prog = BY_CODE.get(code)
             if not prog: continue
-            for of in prog.get("ofertas") or []:
-                if of.get("ordinal") == ord_n:
-                    oferta = of; break
+            oferta = OFFER_BY_KEY.get((code, ord_n))
             if not oferta: continue
             key = (code, ord_n)
             if key in seen: continue
@@ -1509,7 +2533,7 @@ def _handle_follow_query(texto: str) -> str or None:
         return "\n".join(lines)
 
     # Para requisitos/perfil/competencias/certificacion: 1 bloque por programa (no por oferta)
-    if DATA_FORMAT == "normalized_v2":
+    if _is_v2():
         lines = []
         seen_codes = set()
         for code, ord_n in items:
@@ -1554,8 +2578,34 @@ STATE = {
     "page": 0,
     "header_base": "Resultados",
     "total_pages": 1,
+    "generation": 0,   # generación del catálogo con la que se calcularon los items
 }
 
+
+def _code_items(code: str) -> list[tuple]:
+    """[(code, ordinal), ...] de todas las ofertas de un código (v2)."""
+    prog = BY_CODE.get(code) if _is_v2() else None
+    if not prog:
+        return []
+    return [(code, of.get("ordinal", i+1)) for i, of in enumerate(prog.get("ofertas") or [])]
+
+
+def _refresh_stale_state(page_size: int = PAGE_SIZE) -> None:
+    """Si el catálogo se recargó desde la última búsqueda, la repite sobre el vigente."""
+    generation = catalog_generation()
+    if STATE.get("generation") == generation:
+        return
+    intent = STATE.get("intent") or {}
+    if intent.get("code"):
+        items = _code_items(intent["code"])
+    else:
+        items = _search_programs(intent) if intent else []
+    STATE.update({
+        "items": items,
+        "total_pages": math.ceil(len(items) / page_size) or 1,
+        "generation": generation,
+    })
+
 def _header_text(base_label: str, page_number: int, total_pages: int) -> str:
     total_pages = max(total_pages, 1)
     return f"{base_label} (pág. {page_number}/{total_pages}):\n"
@@ -1619,14 +2669,11 @@ def route_general_response(texto: str):
 
 
 def _match_sena_info(text: str) -> dict | None:
-    """Busca la respuesta de conocimiento general por tags normalizados."""
-    text_norm = _norm_basic_no_accents(text)
-    for item in SENA_INFO:
-        for tag in item.get("tags_norm", []):
-            if tag and tag in text_norm:
-                log.debug("Matched sena_info id=%s", item.get("id"))
-                return item
-    return None
+    """Busca la respuesta de conocimiento general en el índice de tags."""
+    item = GENERAL_INFO_INDEX.match(text)
+    if item:
+        log.debug("Matched sena_info id=%s", item.get("id"))
+    return item
 
 def generar_respuesta(texto: str, show_all: bool = False, page: int = 0, page_size: int = PAGE_SIZE) -> str:
     """
@@ -1644,6 +2691,7 @@ def generar_respuesta(texto: str, show_all: bool = False, page: int = 0, page_si
 
     # --- Paginación: 'ver más' ---
     if qn in {"ver mas", "ver más", "vermas"} and STATE.get("items"):
+        _refresh_stale_state(page_size)
         STATE["page"] += 1
         total_pages = STATE.get("total_pages") or math.ceil(len(STATE.get("items") or []) / page_size) or 1
         body = _format_list(STATE["items"], page=STATE["page"], page_size=page_size)
@@ -1669,13 +2717,6 @@ def generar_respuesta(texto: str, show_all: bool = False, page: int = 0, page_si
     if follow:
         return follow
 
-
-    # --- Información general del SENA ---
-    general_info = _match_general_info_answer(texto)
-    if general_info:
-        return general_info
-
-
     # --- Parseo de intención ---
     intent = _parse_intent(texto)
 
@@ -1684,9 +2725,9 @@ def generar_respuesta(texto: str, show_all: bool = False, page: int = 0, page_si
         return ficha_por_codigo_y_ordinal(intent["code"], intent["ordinal"])
 
     if intent.get("code"):
-        prog = BY_CODE.get(intent["code"]) if DATA_FORMAT == "normalized_v2" else None
+        prog = BY_CODE.get(intent["code"]) if _is_v2() else None
         if prog and prog.get("ofertas"):
-            items = [(intent["code"], of.get("ordinal", i+1)) for i, of in enumerate(prog.get("ofertas"))]
+            items = _code_items(intent["code"])
             total_pages = math.ceil(len(items) / page_size) or 1
             header_base = f"Ubicaciones para *{prog['programa']}*"
             STATE.update({
@@ -1695,6 +2736,7 @@ def generar_respuesta(texto: str, show_all: bool = False, page: int = 0, page_si
                 "page": 0,
                 "header_base": header_base,
                 "total_pages": total_pages,
+                "generation": catalog_generation(),
             })
             header_txt = _header_text(header_base, 1, total_pages)
             return header_txt + _format_list(items, page=0, page_size=page_size)
@@ -1705,7 +2747,12 @@ def generar_respuesta(texto: str, show_all: bool = False, page: int = 0, page_si
     if not results:
         explicit_city = intent.get("explicit_city") or {}
         if explicit_city.get("norm") and (intent.get("tema_tokens") or intent.get("tail_text")):
-            city_label = (explicit_city.get("raw") or explicit_city.get("norm") or "").strip() or "esa ciudad"
+            # La intención en caché es por texto normalizado: la etiqueta (con tildes)
+            # sale de lo que escribió el usuario
+            city_raw, city_norm = _extract_explicit_city(texto)
+            if city_norm != explicit_city.get("norm"):
+                city_raw = explicit_city.get("raw")
+            city_label = (city_raw or explicit_city.get("norm") or "").strip() or "esa ciudad"
             topic_desc = intent.get("tail_text") or " ".join(sorted(intent.get("tema_tokens") or [])) or "tu búsqueda"
             return (
                 f"No encontré programas en {city_label.title()} que coincidan con {topic_desc}. "
@@ -1756,6 +2803,7 @@ def generar_respuesta(texto: str, show_all: bool = False, page: int = 0, page_si
         "page": 0,
         "header_base": header_base,
         "total_pages": total_pages,
+        "generation": catalog_generation(),
     })
 
     # --- Página inicial ---
@@ -1,7 +1,7 @@
 import os
 from collections.abc import Mapping, Sequence
 from contextlib import contextmanager
-from datetime import datetime
+from datetime import datetime, timedelta
 from typing import Optional
 
 from sqlalchemy import (
@@ -16,13 +16,17 @@ from sqlalchemy import (
     create_engine,
     inspect,
     text,
+    update,
 )
 from sqlalchemy.dialects.sqlite import JSON as SQLiteJSON
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import Session, relationship, sessionmaker
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, relationship, selectinload, sessionmaker
 
 # ========================= CONFIG =========================
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///storage_simple/app.db")
+# Segundos tras los que un mensaje reclamado y sin terminar (worker caído) se puede reclamar de nuevo
+MESSAGE_CLAIM_STALE_AFTER = float(os.getenv("MESSAGE_CLAIM_STALE_AFTER", "300"))
 
 # SQLite necesita este flag para uso en múltiples hilos
 connect_args = {"check_same_thread": False} if DATABASE_URL.startswith("sqlite") else {}
@@ -96,6 +100,32 @@ class SessionState(Base):
     user = relationship("User", back_populates="session_state")
 
 
+class WebhookJob(Base):
+    """Entrega de webhook pendiente de procesar (cola WEBHOOK_QUEUE=db)."""
+
+    __tablename__ = "webhook_jobs"
+
+    id = Column(Integer, primary_key=True)
+    shard = Column(Integer, default=0, nullable=False, index=True)
+    status = Column(String(16), default="pending", nullable=False, index=True)
+    payload = Column(JSON().with_variant(SQLiteJSON, "sqlite"), nullable=False)
+    enqueued_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    claimed_at = Column(DateTime)
+
+
+class ProcessedMessage(Base):
+    """Mensaje entrante (wa_message_id) ya procesado: Meta reenvía el mismo id si respondemos lento."""
+
+    __tablename__ = "processed_messages"
+
+    id = Column(Integer, primary_key=True)
+    wa_message_id = Column(String(128), unique=True, nullable=False)
+    # processing (reclamado por un worker) | done (respondido y confirmado)
+    status = Column(String(16), default="processing", nullable=False)
+    claimed_at = Column(DateTime, default=datetime.utcnow, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False, index=True)
+
+
 # ========================= HELPERS =========================
 @contextmanager
 def get_session():
@@ -117,6 +147,7 @@ def init_db():
             os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
     Base.metadata.create_all(bind=engine)
     _ensure_interaction_lightweight_columns()
+    _ensure_processed_message_columns()
 
 
 def make_json_safe(obj):
@@ -126,7 +157,7 @@ def make_json_safe(obj):
         return obj
     if isinstance(obj, datetime):
         return obj.isoformat()
-    if isinstance(obj, set):
+    if isinstance(obj, (set, frozenset)):
         return [make_json_safe(item) for item in obj]
     if isinstance(obj, Mapping):
         return {str(k): make_json_safe(v) for k, v in obj.items()}
@@ -154,6 +185,85 @@ def get_or_create_user(session: Session, wa_number: str) -> User:
     return user
 
 
+def get_or_create_users(session: Session, wa_numbers) -> dict[str, User]:
+    """Versión por lote de get_or_create_user: una consulta para todos los números,
+    con su estado de sesión ya cargado; los que faltan se crean juntos."""
+    numbers = list(dict.fromkeys(n for n in wa_numbers if n))
+    if not numbers:
+        return {}
+
+    def _load() -> dict[str, User]:
+        rows = (
+            session.query(User)
+            .options(selectinload(User.session_state))
+            .filter(User.wa_number.in_(numbers))
+        )
+        return {u.wa_number: u for u in rows}
+
+    users = _load()
+    missing = [n for n in numbers if n not in users]
+    if missing:
+        for number in missing:
+            user = User(wa_number=number, consent_accepted=False)
+            session.add(user)
+            session.add(SessionState(user=user, state="TERMS_PENDING", data={}))
+        try:
+            session.commit()
+        except IntegrityError:
+            # otro proceso creó alguno de los usuarios en paralelo
+            session.rollback()
+            users = _load()
+            for number in numbers:
+                if number not in users:
+                    users[number] = get_or_create_user(session, number)
+            return users
+        users = _load()
+    return users
+
+
+def claim_message(session: Session, wa_message_id: str, stale_after: float = MESSAGE_CLAIM_STALE_AFTER) -> bool:
+    """Reclama el id de un mensaje entrante (status processing); False si es una reentrega.
+
+    Se confirma enseguida para no retener un lock de escritura mientras se procesa
+    el mensaje. Un id en processing con más de 'stale_after' segundos es de un
+    worker que murió antes de terminar: se vuelve a reclamar con un UPDATE
+    condicional, así que solo un worker lo retoma.
+    """
+    session.add(ProcessedMessage(wa_message_id=wa_message_id, status="processing", claimed_at=datetime.utcnow()))
+    try:
+        session.commit()
+        return True
+    except IntegrityError:
+        session.rollback()
+    now = datetime.utcnow()
+    reclaimed = session.execute(
+        update(ProcessedMessage)
+        .where(
+            ProcessedMessage.wa_message_id == wa_message_id,
+            ProcessedMessage.status == "processing",
+            ProcessedMessage.claimed_at < now - timedelta(seconds=stale_after),
+        )
+        .values(claimed_at=now)
+    ).rowcount
+    session.commit()
+    return bool(reclaimed)
+
+
+def finish_message(session: Session, wa_message_id: str) -> None:
+    """Marca el mensaje como done; no confirma: va en la misma transacción que el estado."""
+    session.query(ProcessedMessage).filter_by(wa_message_id=wa_message_id).update(
+        {"status": "done"}, synchronize_session=False
+    )
+
+
+def release_message(session: Session, wa_message_id: str) -> None:
+    """Libera un id reclamado que no llegó a responderse, para que su reentrega se procese."""
+    session.query(ProcessedMessage).filter_by(wa_message_id=wa_message_id, status="processing").delete(
+        synchronize_session=False
+    )
+    session.commit()
+
+
 def get_or_create_session_state(session: Session, user: User) -> SessionState:
     if user.session_state:
         return user.session_state
@@ -196,6 +306,29 @@ def _ensure_interaction_lightweight_columns() -> None:
             conn.execute(text(stmt))
 
 
+def _ensure_processed_message_columns() -> None:
+    """Add claim columns to processed_messages tables created before they existed."""
+
+    inspector = inspect(engine)
+    if "processed_messages" not in inspector.get_table_names():
+        return
+
+    existing_columns = {col["name"] for col in inspector.get_columns("processed_messages")}
+    additions: list[str] = []
+    if "status" not in existing_columns:
+        # Las filas previas ya estaban respondidas
+        additions.append("ALTER TABLE processed_messages ADD COLUMN status VARCHAR(16) NOT NULL DEFAULT 'done'")
+    if "claimed_at" not in existing_columns:
+        additions.append("ALTER TABLE processed_messages ADD COLUMN claimed_at TIMESTAMP")
+
+    if not additions:
+        return
+
+    with engine.begin() as conn:
+        for stmt in additions:
+            conn.execute(text(stmt))
+
+
 def log_interaction(
     session: Session,
     user_id: int | None,
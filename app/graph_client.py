@@ -0,0 +1,252 @@
+"""
+Cliente compartido para la Graph API de WhatsApp Cloud.
+
+Todos los envíos (app.webhook y app.send) pasan por una sola requests.Session
+con un pool de conexiones keep-alive: la conexión TCP+TLS a graph.facebook.com
+se abre una vez por worker del pool y se reutiliza, en lugar de pagar el
+handshake en cada respuesta. Aquí viven también los reintentos con backoff
+(5xx y fallas al abrir la conexión). Un POST a /messages no es idempotente: un
+timeout de lectura o una conexión que se cae después de enviar no se
+reintentan, porque Meta pudo haber entregado el mensaje.
+
+Configuración:
+- GRAPH_API_VER (v20.0), GRAPH_BASE_URL (https://graph.facebook.com)
+- GRAPH_POOL_SIZE: conexiones keep-alive por host (10)
+- GRAPH_CONNECT_TIMEOUT / GRAPH_READ_TIMEOUT en segundos (3.05 / 15)
+- GRAPH_MAX_RETRIES (2) y GRAPH_RETRY_BACKOFF (0.75 s, lineal por intento)
+"""
+import logging
+import os
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import MaxRetryError, NewConnectionError
+
+log = logging.getLogger(__name__)
+
+GRAPH_API_VER = os.getenv("GRAPH_API_VER", "v20.0")
+GRAPH_BASE_URL = os.getenv("GRAPH_BASE_URL", "https://graph.facebook.com")
+GRAPH_POOL_SIZE = int(os.getenv("GRAPH_POOL_SIZE", "10"))
+GRAPH_CONNECT_TIMEOUT = float(os.getenv("GRAPH_CONNECT_TIMEOUT", "3.05"))
+GRAPH_READ_TIMEOUT = float(os.getenv("GRAPH_READ_TIMEOUT", "15"))
+GRAPH_MAX_RETRIES = int(os.getenv("GRAPH_MAX_RETRIES", "2"))
+GRAPH_RETRY_BACKOFF = float(os.getenv("GRAPH_RETRY_BACKOFF", "0.75"))
+
+
+def _connect_failed(exc: requests.RequestException) -> bool:
+    """True si la request no llegó a enviarse (falló al abrir la conexión): reintentar es seguro."""
+    if isinstance(exc, requests.ConnectTimeout):
+        return True
+    reason = exc.args[0] if exc.args else None
+    if isinstance(reason, MaxRetryError):
+        reason = reason.reason
+    return isinstance(reason, NewConnectionError)
+
+
+def _retry_after(resp: requests.Response) -> Optional[float]:
+    """Segundos del header Retry-After (número o fecha HTTP); None si no viene o no se entiende."""
+    value = (resp.headers.get("Retry-After") or "").strip()
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def _mask_phone(num: str) -> str:
+    num = num or ""
+    return num[:-4] + "****" if len(num) >= 4 else "****"
+
+
+def _message_id(data: dict) -> Optional[str]:
+    """WhatsApp suele devolver el id en "messages"; por si cambia el shape, también en entry/changes."""
+    try:
+        return data["messages"][0]["id"]
+    except Exception:
+        pass
+    try:
+        return data["entry"][0]["changes"][0]["value"]["messages"][0]["id"]
+    except Exception:
+        return None
+
+
+class GraphClient:
+    """Sesión HTTP con pool de conexiones y reintentos para /{phone_number_id}/messages."""
+
+    def __init__(
+        self,
+        token: Optional[str] = None,
+        phone_number_id: Optional[str] = None,
+        api_version: str = GRAPH_API_VER,
+        base_url: str = GRAPH_BASE_URL,
+        pool_size: int = GRAPH_POOL_SIZE,
+        connect_timeout: float = GRAPH_CONNECT_TIMEOUT,
+        read_timeout: float = GRAPH_READ_TIMEOUT,
+        max_retries: int = GRAPH_MAX_RETRIES,
+        backoff: float = GRAPH_RETRY_BACKOFF,
+    ):
+        self.token = os.getenv("WHATSAPP_TOKEN") if token is None else token
+        self.phone_number_id = os.getenv("WHATSAPP_PHONE_NUMBER_ID") if phone_number_id is None else phone_number_id
+        self.api_version = api_version
+        self.base_url = base_url.rstrip("/")
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+
+        self.session = requests.Session()
+        # Los reintentos los maneja post_message (con backoff y logging), no urllib3
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(1, pool_size), max_retries=0)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def messages_url(self) -> str:
+        """URL de envío para la versión y phone number id actuales."""
+        if not self.phone_number_id:
+            raise RuntimeError("Falta WHATSAPP_PHONE_NUMBER_ID en variables de entorno")
+        return f"{self.base_url}/{self.api_version}/{self.phone_number_id}/messages"
+
+    def auth_headers(self) -> Dict[str, str]:
+        if not self.token:
+            raise RuntimeError("Falta WHATSAPP_TOKEN en variables de entorno")
+        return {
+            "Authorization": f"Bearer {self.token}",
+            "Content-Type": "application/json",
+        }
+
+    def close(self) -> None:
+        self.session.close()
+
+    def send_text(self, to: str, body: str, **kwargs) -> Tuple[bool, Dict[str, Any]]:
+        """Envía un mensaje de texto (el llamador decide el recorte de 'body')."""
+        payload = {
+            "messaging_product": "whatsapp",
+            "to": to,
+            "type": "text",
+            "text": {"body": body or ""},
+        }
+        return self.post_message(payload, **kwargs)
+
+    def post_message(
+        self,
+        payload: dict,
+        timeout: Optional[float] = None,
+        max_retries: Optional[int] = None,
+    ) -> Tuple[bool, Dict[str, Any]]:
+        """
+        POST a /messages con reintentos para 5xx y fallas al conectar ('connect_error').
+        Un timeout de lectura ('timeout') o una conexión cortada a mitad de la
+        request ('connection_error') no se reintentan: el mensaje pudo salir.
+
+        Retorna:
+          (True, {"message_id": "wamid...", "status_code": 200, "raw": {...}}) en éxito
+          (False, {"status_code": <int>, "error": <str>, "response": <dict|str>}) en error,
+          más "retry_after" (segundos) si la respuesta trae el header Retry-After
+        'timeout' (opcional) reemplaza el timeout de lectura.
+        """
+        to = payload.get("to", "")
+        try:
+            url = self.messages_url()
+            headers = self.auth_headers()
+        except Exception as e:
+            log.error(f"[send] Config inválida: {e}")
+            return False, {"status_code": 0, "error": str(e)}
+
+        max_retries = self.max_retries if max_retries is None else max_retries
+        timeouts = (self.connect_timeout, self.read_timeout if timeout is None else timeout)
+
+        attempt = 0
+        last_err: Optional[Dict[str, Any]] = None
+        while attempt <= max_retries:
+            try:
+                resp = self.session.post(url, headers=headers, json=payload, timeout=timeouts)
+                sc = resp.status_code
+
+                if sc < 300:
+                    try:
+                        data = resp.json()
+                    except Exception:
+                        data = {}
+                    message_id = _message_id(data)
+                    log.info(f"[send] OK -> {_mask_phone(to)} id={message_id or 'n/a'}")
+                    return True, {"message_id": message_id, "status_code": sc, "raw": data}
+
+                # Error HTTP
+                txt = None
+                try:
+                    txt = resp.text
+                    j = resp.json() if "application/json" in resp.headers.get("Content-Type", "") else None
+                except Exception:
+                    j = None
+
+                err = {"status_code": sc, "error": "http_error", "response": j or txt}
+                retry_after = _retry_after(resp)
+                if retry_after is not None:
+                    err["retry_after"] = retry_after
+                last_err = err
+
+                if 500 <= sc < 600 and attempt < max_retries:
+                    wait = max((attempt + 1) * self.backoff, retry_after or 0.0)
+                    log.warning(f"[send] 5xx {sc}, retry {attempt+1}/{max_retries} en {wait:.2f}s …")
+                    time.sleep(wait)
+                    attempt += 1
+                    continue
+
+                log.error(f"[send] Error {sc} -> {_mask_phone(to)} | resp={txt[:300] if isinstance(txt, str) else str(j)[:300]}")
+                return False, err
+
+            except (requests.Timeout, requests.ConnectionError) as e:
+                if _connect_failed(e):
+                    kind = "connect_error"
+                else:
+                    kind = "timeout" if isinstance(e, requests.Timeout) else "connection_error"
+                err = {"status_code": 0, "error": kind}
+                last_err = err
+                if kind == "connect_error" and attempt < max_retries:
+                    wait = (attempt + 1) * self.backoff
+                    log.warning(f"[send] {kind}, retry {attempt+1}/{max_retries} en {wait:.2f}s …")
+                    time.sleep(wait)
+                    attempt += 1
+                    continue
+                log.error(f"[send] {kind} definitivo")
+                return False, err
+            except Exception as e:
+                err = {"status_code": 0, "error": f"exception: {e.__class__.__name__}", "detail": str(e)}
+                last_err = err
+                log.exception("[send] Excepción enviando")
+                return False, err
+
+        # si salimos del bucle por alguna razón, devuelve último error conocido
+        return False, (last_err or {"status_code": 0, "error": "unknown"})
+
+
+_CLIENT: Optional[GraphClient] = None
+_CLIENT_LOCK = threading.Lock()
+
+
+def get_client() -> GraphClient:
+    """Cliente compartido del proceso (se crea al primer envío)."""
+    global _CLIENT
+    if _CLIENT is None:
+        with _CLIENT_LOCK:
+            if _CLIENT is None:
+                _CLIENT = GraphClient()
+    return _CLIENT
+
+
+def reset_client() -> None:
+    """Cierra el cliente compartido; el siguiente get_client() crea uno nuevo."""
+    global _CLIENT
+    with _CLIENT_LOCK:
+        if _CLIENT is not None:
+            _CLIENT.close()
+        _CLIENT = None
@@ -0,0 +1,421 @@
+"""
+Ingesta en streaming de exportaciones crudas de oferta (una fila por oferta) al
+formato v2 que consume app.core (programa base + lista de ofertas).
+
+Flujo con memoria acotada:
+  1) iter_records: lee el export registro a registro (arreglo JSON, JSONL o CSV).
+  2) Particiona por hash del código en archivos temporales (JSONL).
+  3) Agrupa cada partición (solo cabe en memoria una fracción del export), ordena
+     por código y la deja como corrida ordenada.
+  4) Mezcla las corridas (heapq.merge) y escribe el arreglo v2 programa a programa.
+
+Cada código lleva una huella (sha256 de sus filas crudas) que se guarda en un
+manifiesto junto a la salida; en la siguiente corrida solo se normalizan los
+programas agregados o modificados y el resto se copia de la salida anterior.
+"""
+import csv
+import hashlib
+import heapq
+import json
+import os
+import re
+import shutil
+import tempfile
+import unicodedata
+import zlib
+from typing import Iterable, Iterator
+
+from app.core import _norm, _strip
+
+_CHUNK = 1 << 16
+
+# Conectores que van en minúscula en los nombres de programa ("Gestión de Proyectos")
+_TITLE_LOWER = {"a", "al", "de", "del", "e", "el", "en", "la", "las", "los", "o", "para", "por", "u", "y"}
+_HOURS_RE = re.compile(r"(\d{1,2}):(\d{2})\s*-\s*(\d{1,2}):(\d{2})")
+_SEDE_PREFIX_RE = re.compile(r"^(sede|ctpi)\s+", re.IGNORECASE)
+
+# Campos del programa base: primero no vacío entre las variantes de cada export
+_PROGRAM_SOURCES = {
+    "programa": ("programa", "nombre", "nombre_programa"),
+    "nivel": ("nivel", "nivel_formacion"),
+    "perfil": ("perfil", "perfil_egresado"),
+    "competencias": ("competencias",),
+    "certificacion": ("certificacion", "certificación"),
+    "palabras_clave": ("palabras_clave",),
+}
+
+
+# ========================= LECTURA INCREMENTAL =========================
+def _iter_json_array(fh) -> Iterator[dict]:
+    """Decodifica los elementos de un arreglo JSON de nivel superior sin cargarlo entero."""
+    decoder = json.JSONDecoder()
+    buf = ""
+    pos = 0
+    started = False
+    eof = False
+    while True:
+        # avanza sobre espacios/comas (y el '[' inicial)
+        while True:
+            while pos < len(buf) and buf[pos] in " \t\r\n,":
+                pos += 1
+            if pos < len(buf) or eof:
+                break
+            chunk = fh.read(_CHUNK)
+            buf, pos, eof = buf[pos:] + chunk, 0, not chunk
+        if pos >= len(buf):
+            if started:
+                raise ValueError("Arreglo JSON sin cerrar")
+            return
+        if not started:
+            if buf[pos] != "[":
+                raise ValueError("Se esperaba un arreglo JSON de registros")
+            started = True
+            pos += 1
+            continue
+        if buf[pos] == "]":
+            return
+        try:
+            obj, end = decoder.raw_decode(buf, pos)
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            chunk = fh.read(_CHUNK)
+            buf, pos, eof = buf[pos:] + chunk, 0, not chunk
+            continue
+        # un objeto que termina justo en el borde del buffer puede estar truncado (números)
+        if end == len(buf) and not eof:
+            chunk = fh.read(_CHUNK)
+            buf, pos, eof = buf[pos:] + chunk, 0, not chunk
+            continue
+        yield obj
+        pos = end
+        if pos > _CHUNK:
+            buf, pos = buf[pos:], 0
+
+
+def _iter_jsonl(fh) -> Iterator[dict]:
+    for line in fh:
+        line = line.strip()
+        if line:
+            yield json.loads(line)
+
+
+def _iter_csv(fh) -> Iterator[dict]:
+    for row in csv.DictReader(fh):
+        # listas en CSV: "a | b | c"
+        for key in ("competencias", "requisitos", "palabras_clave"):
+            if isinstance(row.get(key), str) and "|" in row[key]:
+                row[key] = [x.strip() for x in row[key].split("|") if x.strip()]
+        yield row
+
+
+def detect_format(path: str) -> str:
+    ext = os.path.splitext(path)[1].lower()
+    if ext in (".jsonl", ".ndjson"):
+        return "jsonl"
+    if ext == ".csv":
+        return "csv"
+    return "json"
+
+
+def iter_records(path: str, fmt: str | None = None) -> Iterator[dict]:
+    """Registros crudos del export, uno a la vez."""
+    fmt = fmt or detect_format(path)
+    readers = {"json": _iter_json_array, "jsonl": _iter_jsonl, "csv": _iter_csv}
+    if fmt not in readers:
+        raise ValueError(f"Formato no soportado: {fmt}")
+    with open(path, "r", encoding="utf-8", newline="" if fmt == "csv" else None) as fh:
+        yield from readers[fmt](fh)
+
+
+# ========================= NORMALIZACIÓN POR FILA =========================
+def _title(s: str, lower_connectors: bool = False) -> str:
+    words = _strip(s).rstrip(".").lower().split(" ")
+    out = []
+    for i, w in enumerate(words):
+        if lower_connectors and i and w in _TITLE_LOWER:
+            out.append(w)
+        else:
+            out.append(w[:1].upper() + w[1:])
+    return " ".join(out)
+
+
+def _strip_accents(s: str) -> str:
+    return "".join(ch for ch in unicodedata.normalize("NFKD", s) if not unicodedata.combining(ch))
+
+
+def _horario(s) -> str:
+    s = _strip(s)
+    return _HOURS_RE.sub(lambda m: f"{int(m[1]):02d}:{m[2]}–{int(m[3]):02d}:{m[4]}", s)
+
+
+def _first(rec: dict, keys: tuple):
+    for k in keys:
+        v = rec.get(k)
+        if v not in (None, "", []):
+            return v
+    return None
+
+
+def record_code(rec: dict) -> str:
+    return _strip(rec.get("codigo") or rec.get("codigo_ficha") or rec.get("no") or "")
+
+
+def normalize_row(rec: dict) -> tuple[str, dict, dict] | None:
+    """(codigo, campos del programa, oferta sin ordinal) para una fila cruda; None si no tiene código."""
+    code = record_code(rec)
+    if not code:
+        return None
+
+    program = {k: _first(rec, keys) for k, keys in _PROGRAM_SOURCES.items()}
+
+    municipio = _title(rec.get("municipio") or rec.get("ciudad") or "")
+    municipio_base = _title(_strip_accents(municipio.split(" - ")[0]))
+    sede_raw = _SEDE_PREFIX_RE.sub("", _strip(rec.get("sede_nombre") or rec.get("sede") or rec.get("centro") or ""))
+    sede_parts = [p.strip() for p in sede_raw.split(" - ") if p.strip()]
+    sede_nombre = _title(sede_parts[0]) if sede_parts else ""
+    ambiente = rec.get("ambiente") or (" - ".join(sede_parts[1:]) if len(sede_parts) > 1 else None)
+    offer = {
+        "municipio": municipio,
+        "municipio_norm": _norm(municipio),
+        "municipio_base": municipio_base,
+        "municipio_base_norm": _norm(municipio_base),
+        "sede_nombre": sede_nombre,
+        "sede_norm": _norm(sede_nombre),
+        "ambiente": _title(ambiente) if ambiente else None,
+        "horario": _horario(rec.get("horario") or rec.get("jornada") or ""),
+    }
+    return code, program, offer
+
+
+def build_program(code: str, rows: Iterable[tuple[dict, dict]]) -> dict:
+    """Agrupa las filas de un código en un programa v2 (ofertas ordenadas y sin duplicados)."""
+    base: dict = {}
+    offers: dict[tuple, dict] = {}
+    for program, offer in rows:
+        for k, v in program.items():
+            if base.get(k) in (None, "", []) and v not in (None, "", []):
+                base[k] = v
+        key = (offer["municipio_norm"], offer["sede_norm"], _norm(offer["ambiente"] or ""), offer["horario"])
+        offers.setdefault(key, offer)
+
+    programa = _title(base.get("programa") or "", lower_connectors=True)
+    nivel = _title(base.get("nivel") or "")
+    competencias = base.get("competencias") or []
+    if isinstance(competencias, str):
+        competencias = [c.strip() for c in re.split(r"[;\n]", competencias) if c.strip()]
+    out = {
+        "codigo": code,
+        "programa": programa,
+        "programa_norm": _norm(programa),
+        "nivel": nivel,
+        "nivel_norm": _norm(nivel),
+        "perfil": _strip(base.get("perfil") or ""),
+        "competencias": sorted({_strip(c) for c in competencias if c}),
+        "certificacion": _strip(base.get("certificacion") or ""),
+        "palabras_clave": [_norm(k) for k in (base.get("palabras_clave") or []) if _norm(k)],
+        "ofertas": [],
+    }
+    for ordinal, key in enumerate(sorted(offers), start=1):
+        out["ofertas"].append({**offers[key], "ordinal": ordinal})
+    return out
+
+
+# ========================= PIPELINE =========================
+MANIFEST_VERSION = 1
+
+
+def manifest_path(out_path: str) -> str:
+    """Manifiesto de huellas que acompaña a la salida de una ingesta."""
+    return f"{out_path}.manifest.json"
+
+
+def read_manifest(path: str) -> dict[str, str]:
+    """{codigo: huella} de la ingesta anterior; vacío si no existe o es de otra versión."""
+    try:
+        with open(path, encoding="utf-8") as fh:
+            data = json.load(fh)
+    except (OSError, ValueError):
+        return {}
+    if data.get("version") != MANIFEST_VERSION:
+        return {}
+    return dict(data.get("programs") or {})
+
+
+def write_manifest(path: str, programs: dict[str, str]) -> None:
+    tmp = f"{path}.tmp{os.getpid()}"
+    with open(tmp, "w", encoding="utf-8") as fh:
+        json.dump({"version": MANIFEST_VERSION, "programs": dict(sorted(programs.items()))}, fh, indent=0)
+    os.replace(tmp, path)
+
+
+def _fingerprint(lines: list[str]) -> str:
+    """Huella de las filas crudas de un código (independiente del orden de las filas)."""
+    h = hashlib.sha256()
+    for line in sorted(lines):
+        h.update(line.encode("utf-8"))
+        h.update(b"\n")
+    return h.hexdigest()
+
+
+def _partition(records: Iterable[dict], workdir: str, partitions: int) -> tuple[list[str], dict]:
+    paths = [os.path.join(workdir, f"part-{i:04d}.jsonl") for i in range(partitions)]
+    handles = [open(p, "w", encoding="utf-8") for p in paths]
+    stats = {"rows": 0, "skipped": 0}
+    try:
+        for rec in records:
+            stats["rows"] += 1
+            code = record_code(rec)
+            if not code:
+                stats["skipped"] += 1
+                continue
+            part = zlib.crc32(code.encode("utf-8")) % partitions
+            handles[part].write(json.dumps([code, rec], ensure_ascii=False, sort_keys=True) + "\n")
+    finally:
+        for fh in handles:
+            fh.close()
+    return paths, stats
+
+
+def _partition_previous(previous_path: str, workdir: str, partitions: int) -> list[str]:
+    """Reparte la salida anterior con el mismo hash que las filas nuevas."""
+    paths = [os.path.join(workdir, f"prev-{i:04d}.jsonl") for i in range(partitions)]
+    handles = [open(p, "w", encoding="utf-8") for p in paths]
+    try:
+        for prog in iter_records(previous_path, "json"):
+            code = _strip(prog.get("codigo"))
+            if code:
+                part = zlib.crc32(code.encode("utf-8")) % partitions
+                handles[part].write(json.dumps(prog, ensure_ascii=False) + "\n")
+    finally:
+        for fh in handles:
+            fh.close()
+    return paths
+
+
+def _sorted_run(part_path: str, prev_path: str | None, manifest: dict[str, str], diff: dict) -> str:
+    """
+    Agrupa una partición por código y la reescribe como programas v2 ordenados
+    (JSONL). Solo se normalizan los códigos cuya huella no coincide con el
+    manifiesto; los demás se copian de la salida anterior.
+    """
+    groups: dict[str, list[str]] = {}
+    with open(part_path, encoding="utf-8") as fh:
+        for line in fh:
+            code = json.loads(line)[0]
+            groups.setdefault(code, []).append(line.rstrip("\n"))
+    previous: dict[str, str] = {}
+    if prev_path:
+        with open(prev_path, encoding="utf-8") as fh:
+            for line in fh:
+                code = _strip(json.loads(line).get("codigo"))
+                if code in groups:
+                    previous[code] = line.rstrip("\n")
+        os.remove(prev_path)
+
+    run_path = part_path[:-len(".jsonl")] + ".run.jsonl"
+    with open(run_path, "w", encoding="utf-8") as out:
+        for code in sorted(groups):
+            fp = _fingerprint(groups[code])
+            old_fp = manifest.get(code)
+            if old_fp == fp and code in previous:
+                prog_json = previous[code]
+                diff["unchanged"] += 1
+            else:
+                rows = []
+                for line in groups[code]:
+                    row = normalize_row(json.loads(line)[1])
+                    rows.append((row[1], row[2]))
+                prog_json = json.dumps(build_program(code, rows), ensure_ascii=False)
+                diff["changed" if old_fp else "added"].append(code)
+            out.write(json.dumps([code, fp], ensure_ascii=False) + "\t" + prog_json + "\n")
+    os.remove(part_path)
+    return run_path
+
+
+def _iter_run(path: str) -> Iterator[tuple[str, str, str]]:
+    with open(path, encoding="utf-8") as fh:
+        for line in fh:
+            head, prog_json = line.rstrip("\n").split("\t", 1)
+            code, fp = json.loads(head)
+            yield code, fp, prog_json
+
+
+def iter_programs(
+    records: Iterable[dict],
+    partitions: int = 64,
+    workdir: str | None = None,
+    stats: dict | None = None,
+    previous: str | None = None,
+    manifest: dict[str, str] | None = None,
+    new_manifest: dict[str, str] | None = None,
+) -> Iterator[dict]:
+    """
+    Programas v2 ordenados por código a partir de registros crudos (memoria ~ una partición).
+
+    Con 'previous' (salida anterior) y 'manifest' (sus huellas) solo se procesan los
+    programas agregados o modificados. 'stats' recibe el conteo de filas y el diff
+    (added/changed/removed/unchanged); 'new_manifest' las huellas de esta corrida.
+    """
+    manifest = manifest or {}
+    partitions = max(1, partitions)
+    diff = {"added": [], "changed": [], "removed": [], "unchanged": 0}
+    with tempfile.TemporaryDirectory(dir=workdir, prefix="ingest-") as tmp:
+        parts, part_stats = _partition(records, tmp, partitions)
+        prevs = _partition_previous(previous, tmp, partitions) if previous and manifest else [None] * partitions
+        runs = [_sorted_run(p, pp, manifest, diff) for p, pp in zip(parts, prevs)]
+        seen = set()
+        for code, fp, prog_json in heapq.merge(*(_iter_run(r) for r in runs), key=lambda x: x[0]):
+            seen.add(code)
+            if new_manifest is not None:
+                new_manifest[code] = fp
+            yield json.loads(prog_json)
+        diff["removed"] = sorted(set(manifest) - seen)
+        diff["added"].sort()
+        diff["changed"].sort()
+        if stats is not None:
+            stats.update(part_stats)
+            stats.update(diff)
+
+
+def write_programs(programs: Iterable[dict], out_path: str) -> int:
+    """Escribe el arreglo v2 de forma incremental (un programa por línea) y atómica."""
+    os.makedirs(os.path.dirname(os.path.abspath(out_path)), exist_ok=True)
+    tmp = f"{out_path}.tmp{os.getpid()}"
+    count = 0
+    with open(tmp, "w", encoding="utf-8") as out:
+        out.write("[")
+        for prog in programs:
+            out.write("\n" if count == 0 else ",\n")
+            out.write(json.dumps(prog, ensure_ascii=False))
+            count += 1
+        out.write("\n]\n")
+    os.replace(tmp, out_path)
+    return count
+
+
+def ingest(src: str, out_path: str, fmt: str | None = None, partitions: int = 64,
+           workdir: str | None = None, incremental: bool = True) -> dict:
+    """
+    Ingesta completa: export crudo -> programas_normalizado_v2.json + manifiesto.
+
+    En modo incremental reutiliza los programas de la salida anterior cuyo
+    contenido no cambió. Devuelve las estadísticas con el diff.
+    """
+    man_path = manifest_path(out_path)
+    manifest = read_manifest(man_path) if incremental and os.path.exists(out_path) else {}
+    previous = None
+    if manifest:
+        # copia: la salida anterior se sobrescribe mientras se lee
+        previous = os.path.join(workdir or os.path.dirname(os.path.abspath(out_path)), f".prev{os.getpid()}.json")
+        shutil.copyfile(out_path, previous)
+    stats: dict = {}
+    new_manifest: dict[str, str] = {}
+    try:
+        programs = iter_programs(iter_records(src, fmt), partitions, workdir, stats, previous, manifest, new_manifest)
+        stats["programs"] = write_programs(programs, out_path)
+    finally:
+        if previous:
+            os.remove(previous)
+    write_manifest(man_path, new_manifest)
+    return stats
@@ -0,0 +1,674 @@
+"""
+Catálogo v2 en disco para leer con mmap (una sola copia en el page cache del SO,
+compartida por todos los workers).
+
+Formato (enteros uint32 en el orden de bytes nativo, secciones alineadas a 8):
+
+    cabecera   MAGIC | versión | marca de endianness | nº secciones | hash de contenido
+    directorio por sección: nombre (32 bytes) | offset u64 | longitud u64
+    str.offsets / str.data   pool de strings UTF-8 (id -> bytes)
+    programs                 filas fijas: Program.FIELDS (sin "ofertas") + extras + features
+                             + código (llave de BY_CODE) + tipo de "ofertas" + primera oferta
+                             + nº ofertas + nº ordinales únicos
+    offers                   filas fijas: id de programa + Offer.FIELDS + extras
+    offer_keys               (id de programa, ordinal) por id de oferta de los postings
+    offer_index              (id de programa, llave de ordinal, id de oferta) de la primera
+                             oferta por ordinal, ordenadas (OFFER_BY_KEY por búsqueda binaria)
+    codes                    ids de programa ordenados por código (búsqueda binaria)
+    <INDICE>.keys/.ids       llaves ordenadas (id de string, inicio, cantidad) + postings
+
+Cada valor de campo es un id del pool; ABSENT/NULL marcan llave ausente o None, y
+los valores que no son str (listas, enteros) se guardan como JSON con JSON_FLAG.
+"""
+import json
+import logging
+import mmap
+import os
+import struct
+from abc import abstractmethod
+from array import array
+from collections.abc import Mapping, Sequence
+
+from app.cache import MISSING, LRUCache
+from app.records import Offer, Program
+
+log = logging.getLogger(__name__)
+
+MAGIC = b"SENAMMAP"
+MMAP_VERSION = 2
+_ENDIAN_MARK = 0x01020304
+_HEADER = struct.Struct("=8sIII64s")
+_DIR_ENTRY = struct.Struct("=32sQQ")
+
+ABSENT = 0xFFFFFFFF
+NULL = 0xFFFFFFFE
+JSON_FLAG = 0x80000000
+
+# Índices de postings que se guardan tal cual (llave -> array de ids)
+POSTING_INDEXES = (
+    "BY_MUNICIPIO",
+    "BY_SEDE",
+    "NG_TITLE",
+    "TITLE_TOKENS",
+    "TITLE_PHRASES",
+    "DESC_TOKENS",
+    "MUNICIPIO_CONTAINMENT",
+    "SEDE_CONTAINMENT",
+)
+
+_PROGRAM_FIELDS = tuple(f for f in Program.FIELDS if f != "ofertas")
+_P_EXTRA, _P_FEATURES, _P_CODE, _P_OFERTAS, _P_OFFER_START, _P_OFFER_LEN, _P_OFFER_COUNT = range(
+    len(_PROGRAM_FIELDS), len(_PROGRAM_FIELDS) + 7
+)
+_PROGRAM_WIDTH = len(_PROGRAM_FIELDS) + 7
+_O_PROGRAM = 0
+_O_EXTRA = len(Offer.FIELDS) + 1
+_OFFER_WIDTH = len(Offer.FIELDS) + 2
+
+
+# ========================= ESCRITURA =========================
+class _StringPool:
+    def __init__(self):
+        self.ids: dict[str, int] = {}
+        self.offsets = array("I", [0])
+        self.data = bytearray()
+
+    def add(self, s: str) -> int:
+        sid = self.ids.get(s)
+        if sid is None:
+            sid = len(self.ids)
+            if sid >= JSON_FLAG - 2:
+                raise ValueError("Demasiados strings para el formato mmap")
+            self.ids[s] = sid
+            self.data += s.encode("utf-8")
+            self.offsets.append(len(self.data))
+        return sid
+
+    def value(self, v) -> int:
+        if v is None:
+            return NULL
+        if isinstance(v, str):
+            return self.add(v)
+        return JSON_FLAG | self.add(json.dumps(_plain(v), ensure_ascii=False, sort_keys=True))
+
+
+def _plain(v):
+    if isinstance(v, Mapping):
+        return {k: _plain(x) for k, x in v.items()}
+    if isinstance(v, (list, tuple, set, frozenset)):
+        return [_plain(x) for x in v]
+    return v
+
+
+def _ordinal_key(ordinal) -> str:
+    """Llave comparable de un ordinal de oferta (str, número, None u otro valor JSON)."""
+    if isinstance(ordinal, str):
+        return "s" + ordinal
+    if isinstance(ordinal, float) and ordinal.is_integer():
+        ordinal = int(ordinal)  # 1.0 == 1, como en el dict en memoria
+    return "j" + json.dumps(_plain(ordinal), ensure_ascii=False, sort_keys=True)
+
+
+def _sorted_keys(keys) -> list[tuple[bytes, str]]:
+    return sorted((k.encode("utf-8"), k) for k in keys)
+
+
+def write_mmap_catalog(path: str, key: str, state: dict) -> None:
+    """Serializa un estado v2 (build_catalog_state) al formato mmap, de forma atómica."""
+    if state.get("DATA_FORMAT") != "normalized_v2":
+        raise ValueError("El catálogo mmap solo soporta DATA_FORMAT == 'normalized_v2'")
+
+    pool = _StringPool()
+    codes = state["PROGRAM_CODES"]
+    pid_by_code = {code: pid for pid, code in enumerate(codes)}
+    programs = array("I")
+    offers = array("I")
+    offer_index = []
+    for pid, code in enumerate(codes):
+        prog = state["BY_CODE"][code]
+        row = [pool.value(prog[f]) if f in prog else ABSENT for f in _PROGRAM_FIELDS]
+        extra = {k: v for k, v in prog.items() if k not in Program.FIELDS}
+        row.append(pool.value(extra) if extra else ABSENT)
+        row.append(pool.value(state["PROGRAM_FEATURES"][code].to_dict()))
+        row.append(pool.add(code))
+        ofertas = prog.get("ofertas", MISSING)
+        row.append(ABSENT if ofertas is MISSING else NULL if ofertas is None else 0)
+        row.append(len(offers) // _OFFER_WIDTH)
+        row.append(len(ofertas or ()))
+        row.append(state["OFFER_COUNT"].get(code, 0))
+        programs.extend(row)
+        first_by_ordinal = {}
+        for of in ofertas or ():
+            key_bytes = _ordinal_key(of.get("ordinal")).encode("utf-8")
+            first_by_ordinal.setdefault(key_bytes, len(offers) // _OFFER_WIDTH)
+            orow = [pid] + [pool.value(of[f]) if f in of else ABSENT for f in Offer.FIELDS]
+            extra = {k: v for k, v in of.items() if k not in Offer.FIELDS}
+            orow.append(pool.value(extra) if extra else ABSENT)
+            offers.extend(orow)
+        offer_index.extend((pid, kb, oid) for kb, oid in first_by_ordinal.items())
+
+    offer_keys = array("I")
+    for code, ordinal in state["OFFER_KEYS"]:
+        offer_keys.extend((pid_by_code[code], pool.value(ordinal)))
+
+    offer_index_rows = array("I")
+    for pid, kb, oid in sorted(offer_index):
+        offer_index_rows.extend((pid, pool.add(kb.decode("utf-8")), oid))
+
+    sorted_codes = array("I", (pid_by_code[c] for _b, c in _sorted_keys(codes)))
+
+    sections = [
+        ("programs", programs.tobytes()),
+        ("offers", offers.tobytes()),
+        ("offer_keys", offer_keys.tobytes()),
+        ("offer_index", offer_index_rows.tobytes()),
+        ("codes", sorted_codes.tobytes()),
+    ]
+    for name in POSTING_INDEXES:
+        bucket = state[name]
+        rows, ids = array("I"), array("I")
+        for _b, k in _sorted_keys(bucket.keys()):
+            postings = bucket[k]
+            rows.extend((pool.add(k), len(ids), len(postings)))
+            ids.extend(postings)
+        sections.append((f"{name}.keys", rows.tobytes()))
+        sections.append((f"{name}.ids", ids.tobytes()))
+    # El pool se cierra al final: todas las secciones ya registraron sus strings
+    sections = [("str.offsets", pool.offsets.tobytes()), ("str.data", bytes(pool.data))] + sections
+
+    header_len = _HEADER.size + _DIR_ENTRY.size * len(sections)
+    offset = _align(header_len)
+    directory = []
+    for name, blob in sections:
+        directory.append((name, offset, len(blob)))
+        offset = _align(offset + len(blob))
+
+    for name, _blob in sections:
+        if len(name.encode("ascii")) > _DIR_ENTRY.size - 16:
+            raise ValueError(f"Nombre de sección demasiado largo: {name}")
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp = f"{path}.tmp{os.getpid()}"
+    with open(tmp, "wb") as fh:
+        fh.write(_HEADER.pack(MAGIC, MMAP_VERSION, _ENDIAN_MARK, len(sections), key.encode("ascii")))
+        for name, off, length in directory:
+            fh.write(_DIR_ENTRY.pack(name.encode("ascii"), off, length))
+        for (name, off, _length), (_n, blob) in zip(directory, sections):
+            fh.write(b"\0" * (off - fh.tell()))
+            fh.write(blob)
+    os.replace(tmp, path)
+
+
+def _align(n: int) -> int:
+    return (n + 7) & ~7
+
+
+# ========================= LECTURA =========================
+class MmapCatalog:
+    """Archivo mmap abierto en solo lectura; las vistas decodifican bajo demanda."""
+
+    def __init__(self, path: str, key: str):
+        with open(path, "rb") as fh:
+            self._mm = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, endian, nsections, file_key = _HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or version != MMAP_VERSION or endian != _ENDIAN_MARK:
+            raise ValueError("formato o versión mmap incompatible")
+        self.content_key = file_key.rstrip(b"\0").decode("ascii")
+        if self.content_key != key:
+            raise LookupError("hash de contenido distinto")
+        buf = memoryview(self._mm)
+        self._sections = {}
+        for i in range(nsections):
+            raw_name, off, length = _DIR_ENTRY.unpack_from(self._mm, _HEADER.size + i * _DIR_ENTRY.size)
+            self._sections[raw_name.rstrip(b"\0").decode("ascii")] = buf[off:off + length]
+        self._str_offsets = self._u32("str.offsets")
+        self._str_data = self._sections["str.data"]
+        self.programs = self._u32("programs")
+        self.offers = self._u32("offers")
+        self.offer_keys = self._u32("offer_keys")
+        self.offer_index = self._u32("offer_index")
+        self.sorted_codes = self._u32("codes")
+        self.n_programs = len(self.programs) // _PROGRAM_WIDTH
+
+    def _u32(self, name: str) -> memoryview:
+        return self._sections[name].cast("I")
+
+    # --- pool de strings / valores
+    def string_bytes(self, sid: int) -> bytes:
+        return bytes(self._str_data[self._str_offsets[sid]:self._str_offsets[sid + 1]])
+
+    def string(self, sid: int) -> str:
+        return self.string_bytes(sid).decode("utf-8")
+
+    def value(self, vid: int, default=MISSING):
+        if vid == ABSENT:
+            return default
+        if vid == NULL:
+            return None
+        if vid & JSON_FLAG:
+            return _frozen(json.loads(self.string(vid & ~JSON_FLAG)))
+        return self.string(vid)
+
+    # --- tablas
+    def program_code(self, pid: int) -> str:
+        return self.string(self.programs[pid * _PROGRAM_WIDTH + _P_CODE])
+
+    def find_program(self, code: str) -> int:
+        """Id de programa por código (búsqueda binaria sobre 'codes'); -1 si no existe."""
+        target = code.encode("utf-8")
+        lo, hi = 0, len(self.sorted_codes)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            pid = self.sorted_codes[mid]
+            probe = self.string_bytes(self.programs[pid * _PROGRAM_WIDTH + _P_CODE])
+            if probe < target:
+                lo = mid + 1
+            elif probe > target:
+                hi = mid
+            else:
+                return pid
+        return -1
+
+    def find_offer(self, pid: int, ordinal) -> int:
+        """Id de la primera oferta del programa con ese ordinal (búsqueda binaria); -1 si no hay."""
+        target = (pid, _ordinal_key(ordinal).encode("utf-8"))
+        rows = self.offer_index
+        lo, hi = 0, len(rows) // 3
+        while lo < hi:
+            mid = (lo + hi) // 2
+            probe = (rows[3 * mid], self.string_bytes(rows[3 * mid + 1]))
+            if probe < target:
+                lo = mid + 1
+            elif probe > target:
+                hi = mid
+            else:
+                return rows[3 * mid + 2]
+        return -1
+
+    def program_field(self, pid: int, col: int) -> int:
+        return self.programs[pid * _PROGRAM_WIDTH + col]
+
+    def offer_field(self, oid: int, col: int) -> int:
+        return self.offers[oid * _OFFER_WIDTH + col]
+
+    def postings(self, name: str) -> "MmapPostings":
+        return MmapPostings(self, self._u32(f"{name}.keys"), self._u32(f"{name}.ids"))
+
+    # --- estado completo con la forma de build_catalog_state (sin config ni matcher)
+    def indexes(self, features_factory, features_cache_size: int = 4096) -> dict:
+        state = {
+            "PROGRAMAS": MmapProgramList(self),
+            "BY_CODE": MmapPrograms(self),
+            "OFFER_BY_KEY": MmapOfferIndex(self),
+            "OFFER_COUNT": MmapOfferCount(self),
+            "OFFER_KEYS": MmapOfferKeys(self),
+            "PROGRAM_CODES": MmapProgramCodes(self),
+            "PROGRAM_FEATURES": MmapFeatures(self, features_factory, features_cache_size),
+            "NG_SEDE": {},
+            "PROGRAMAS_BY_CODE": {},
+        }
+        for name in POSTING_INDEXES:
+            state[name] = self.postings(name)
+        # Conjuntos pequeños (llaves de ubicación): se materializan
+        state["KNOWN_MUNICIPIOS"] = set(state["BY_MUNICIPIO"].keys())
+        state["KNOWN_SEDES"] = set(state["BY_SEDE"].keys())
+        return state
+
+
+def _frozen(v):
+    if isinstance(v, list):
+        return tuple(_frozen(x) for x in v)
+    return v
+
+
+def open_mmap_catalog(path: str, key: str) -> MmapCatalog | None:
+    """Abre el catálogo si existe y su hash coincide; None en cualquier otro caso."""
+    try:
+        return MmapCatalog(path, key)
+    except FileNotFoundError:
+        return None
+    except LookupError:
+        log.info("Catálogo mmap %s desactualizado; se ignora", path)
+        return None
+    except Exception as e:
+        log.warning("No se pudo abrir el catálogo mmap %s: %s", path, e)
+        return None
+
+
+# ========================= VISTAS PEREZOSAS =========================
+class _MmapRecord(Mapping):
+    """
+    Registro (programa u oferta) que decodifica sus campos al leerlos. Mapping ya
+    es un ABC: las subclases deben implementar _field (lectura de su tabla).
+    """
+
+    __slots__ = ("_cat", "_id")
+    FIELDS: tuple[str, ...] = ()
+    _COLUMNS: dict = {}
+    _EXTRA_COL = 0
+
+    def __init__(self, cat: MmapCatalog, rid: int):
+        self._cat = cat
+        self._id = rid
+
+    @abstractmethod
+    def _field(self, col: int) -> int:
+        """Id del pool guardado en la columna 'col' de la fila de este registro."""
+
+    def _extra(self) -> dict:
+        extra = self._cat.value(self._field(self._EXTRA_COL), None)
+        return extra or {}
+
+    def get(self, key, default=None):
+        col = self._COLUMNS.get(key)
+        if col is not None:
+            return self._cat.value(self._field(col), default)
+        return self._extra().get(key, default)
+
+    def __getitem__(self, key):
+        value = self.get(key, MISSING)
+        if value is MISSING:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key) -> bool:
+        return self.get(key, MISSING) is not MISSING
+
+    def __iter__(self):
+        for name in self.FIELDS:
+            if name in self:
+                yield name
+        yield from self._extra()
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+    def __bool__(self) -> bool:
+        return True
+
+    def to_dict(self) -> dict:
+        return {
+            k: v.to_dict() if isinstance(v, _MmapRecord)
+            else tuple(x.to_dict() for x in v) if isinstance(v, tuple) and v and isinstance(v[0], _MmapRecord)
+            else v
+            for k, v in self.items()
+        }
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({self.to_dict()!r})"
+
+
+class MmapOffer(_MmapRecord):
+    __slots__ = ()
+    FIELDS = Offer.FIELDS
+    _COLUMNS = {f: i + 1 for i, f in enumerate(Offer.FIELDS)}
+    _EXTRA_COL = _O_EXTRA
+
+    def _field(self, col: int) -> int:
+        return self._cat.offer_field(self._id, col)
+
+
+class MmapProgram(_MmapRecord):
+    __slots__ = ()
+    FIELDS = Program.FIELDS
+    _COLUMNS = {f: i for i, f in enumerate(_PROGRAM_FIELDS)}
+    _EXTRA_COL = _P_EXTRA
+
+    def _field(self, col: int) -> int:
+        return self._cat.program_field(self._id, col)
+
+    def offers(self) -> tuple:
+        start = self._field(_P_OFFER_START)
+        return tuple(MmapOffer(self._cat, oid) for oid in range(start, start + self._field(_P_OFFER_LEN)))
+
+    def get(self, key, default=None):
+        if key == "ofertas":
+            kind = self._field(_P_OFERTAS)
+            if kind == ABSENT:
+                return default
+            return None if kind == NULL else self.offers()
+        return super().get(key, default)
+
+
+class MmapPrograms(Mapping):
+    """BY_CODE: código -> MmapProgram."""
+
+    __slots__ = ("_cat",)
+
+    def __init__(self, cat: MmapCatalog):
+        self._cat = cat
+
+    def __getitem__(self, code):
+        pid = self._cat.find_program(code) if isinstance(code, str) else -1
+        if pid < 0:
+            raise KeyError(code)
+        return MmapProgram(self._cat, pid)
+
+    def get(self, code, default=None):
+        pid = self._cat.find_program(code) if isinstance(code, str) else -1
+        return MmapProgram(self._cat, pid) if pid >= 0 else default
+
+    def __contains__(self, code) -> bool:
+        return isinstance(code, str) and self._cat.find_program(code) >= 0
+
+    def __iter__(self):
+        return (self._cat.program_code(pid) for pid in range(self._cat.n_programs))
+
+    def __len__(self) -> int:
+        return self._cat.n_programs
+
+
+class MmapProgramList(Sequence):
+    """PROGRAMAS: programas en el orden del archivo de origen."""
+
+    __slots__ = ("_cat",)
+
+    def __init__(self, cat: MmapCatalog):
+        self._cat = cat
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        return MmapProgram(self._cat, i)
+
+    def __len__(self) -> int:
+        return self._cat.n_programs
+
+
+class MmapProgramCodes(Sequence):
+    """PROGRAM_CODES: id de programa -> código."""
+
+    __slots__ = ("_cat",)
+
+    def __init__(self, cat: MmapCatalog):
+        self._cat = cat
+
+    def __getitem__(self, pid):
+        if not 0 <= pid < self._cat.n_programs:
+            raise IndexError(pid)
+        return self._cat.program_code(pid)
+
+    def __len__(self) -> int:
+        return self._cat.n_programs
+
+
+class MmapOfferKeys(Sequence):
+    """OFFER_KEYS: id de oferta -> (code, ordinal)."""
+
+    __slots__ = ("_cat",)
+
+    def __init__(self, cat: MmapCatalog):
+        self._cat = cat
+
+    def __getitem__(self, oid):
+        pid, ordinal = self._cat.offer_keys[2 * oid], self._cat.offer_keys[2 * oid + 1]
+        return self._cat.program_code(pid), self._cat.value(ordinal, None)
+
+    def __len__(self) -> int:
+        return len(self._cat.offer_keys) // 2
+
+
+class MmapOfferIndex(Mapping):
+    """OFFER_BY_KEY: (code, ordinal) -> primera oferta con ese ordinal."""
+
+    __slots__ = ("_cat",)
+
+    def __init__(self, cat: MmapCatalog):
+        self._cat = cat
+
+    def get(self, key, default=None):
+        try:
+            code, ordinal = key
+        except (TypeError, ValueError):
+            return default
+        pid = self._cat.find_program(code) if isinstance(code, str) else -1
+        if pid < 0:
+            return default
+        try:
+            oid = self._cat.find_offer(pid, ordinal)
+        except TypeError:  # ordinal no serializable: no puede estar en el índice
+            return default
+        return MmapOffer(self._cat, oid) if oid >= 0 else default
+
+    def __getitem__(self, key):
+        of = self.get(key, MISSING)
+        if of is MISSING:
+            raise KeyError(key)
+        return of
+
+    def __contains__(self, key) -> bool:
+        return self.get(key, MISSING) is not MISSING
+
+    def __iter__(self):
+        seen = set()
+        for pid in range(self._cat.n_programs):
+            prog = MmapProgram(self._cat, pid)
+            code = self._cat.program_code(pid)
+            for of in prog.offers():
+                key = (code, of.get("ordinal"))
+                if key not in seen:
+                    seen.add(key)
+                    yield key
+
+    def __len__(self) -> int:
+        return len(self._cat.offer_index) // 3
+
+
+class MmapOfferCount(Mapping):
+    """OFFER_COUNT: code -> nº de ordinales únicos (precalculado en el archivo)."""
+
+    __slots__ = ("_cat",)
+
+    def __init__(self, cat: MmapCatalog):
+        self._cat = cat
+
+    def get(self, code, default=None):
+        pid = self._cat.find_program(code) if isinstance(code, str) else -1
+        return self._cat.program_field(pid, _P_OFFER_COUNT) if pid >= 0 else default
+
+    def __getitem__(self, code):
+        count = self.get(code)
+        if count is None:
+            raise KeyError(code)
+        return count
+
+    def __contains__(self, code) -> bool:
+        return self.get(code) is not None
+
+    def __iter__(self):
+        return iter(MmapPrograms(self._cat))
+
+    def __len__(self) -> int:
+        return self._cat.n_programs
+
+
+class MmapPostings(Mapping):
+    """Llave -> memoryview de ids (sin copiar) por búsqueda binaria en llaves ordenadas."""
+
+    __slots__ = ("_cat", "_keys", "_ids")
+
+    def __init__(self, cat: MmapCatalog, keys: memoryview, ids: memoryview):
+        self._cat = cat
+        self._keys = keys
+        self._ids = ids
+
+    def _find(self, key: str) -> int:
+        target = key.encode("utf-8")
+        keys = self._keys
+        lo, hi = 0, len(keys) // 3
+        while lo < hi:
+            mid = (lo + hi) // 2
+            probe = self._cat.string_bytes(keys[3 * mid])
+            if probe < target:
+                lo = mid + 1
+            elif probe > target:
+                hi = mid
+            else:
+                return mid
+        return -1
+
+    def _slice(self, row: int) -> memoryview:
+        start, count = self._keys[3 * row + 1], self._keys[3 * row + 2]
+        return self._ids[start:start + count]
+
+    def get(self, key, default=None):
+        row = self._find(key) if isinstance(key, str) else -1
+        return self._slice(row) if row >= 0 else default
+
+    def __getitem__(self, key):
+        ids = self.get(key)
+        if ids is None:
+            raise KeyError(key)
+        return ids
+
+    def __contains__(self, key) -> bool:
+        return isinstance(key, str) and self._find(key) >= 0
+
+    def __iter__(self):
+        return (self._cat.string(self._keys[3 * row]) for row in range(len(self)))
+
+    def __len__(self) -> int:
+        return len(self._keys) // 3
+
+    def items(self):
+        return [(self._cat.string(self._keys[3 * row]), self._slice(row)) for row in range(len(self))]
+
+
+class MmapFeatures(Mapping):
+    """PROGRAM_FEATURES: se reconstruyen desde el archivo, con una LRU acotada por proceso."""
+
+    __slots__ = ("_cat", "_factory", "_cache")
+
+    def __init__(self, cat: MmapCatalog, factory, maxsize: int):
+        self._cat = cat
+        self._factory = factory
+        self._cache = LRUCache(maxsize=maxsize, name="mmap_features")
+
+    def get(self, code, default=None):
+        feat = self._cache.get(code)
+        if feat is MISSING:
+            pid = self._cat.find_program(code) if isinstance(code, str) else -1
+            if pid < 0:
+                return default
+            feat = self._factory(self._cat.value(self._cat.program_field(pid, _P_FEATURES)))
+            self._cache.put(code, feat)
+        return feat
+
+    def __getitem__(self, code):
+        feat = self.get(code)
+        if feat is None:
+            raise KeyError(code)
+        return feat
+
+    def __contains__(self, code) -> bool:
+        return isinstance(code, str) and self._cat.find_program(code) >= 0
+
+    def __iter__(self):
+        return iter(MmapPrograms(self._cat))
+
+    def __len__(self) -> int:
+        return self._cat.n_programs
@@ -0,0 +1,356 @@
+"""
+Despachador de mensajes salientes hacia la Graph API.
+
+Las respuestas no se envían en el hilo que las genera: se encolan y un pool
+acotado de workers las manda respetando:
+- un token bucket global (OUTBOUND_RATE mensajes/s, ráfagas de OUTBOUND_BURST);
+- un intervalo mínimo entre mensajes al mismo destinatario
+  (OUTBOUND_RECIPIENT_INTERVAL). Cada destinatario va siempre al mismo worker,
+  así que sus mensajes salen en orden.
+
+Los workers no duermen por un destinatario: cada shard guarda una cola FIFO por
+destinatario y un heap de destinatarios ordenado por el momento en que pueden
+volver a recibir. Un destinatario en espera (intervalo o backoff de un
+reintento) no bloquea a los demás de su shard.
+
+Ante un 429 o un 5xx la tasa del bucket baja a la mitad (sin bajar de
+OUTBOUND_MIN_RATE) y el mensaje se reintenta con backoff; tras una racha de
+envíos exitosos la tasa vuelve a subir hasta OUTBOUND_RATE (AIMD). Si Graph
+manda Retry-After, el reintento no sale antes, y con un 429 el bucket tampoco
+entrega tokens hasta entonces. Una falla de red local (no se pudo conectar) se
+reintenta pero no frena la tasa global: no es una señal de Graph.
+"""
+import heapq
+import itertools
+import logging
+import os
+import threading
+import time
+import zlib
+from collections import deque
+
+from app.graph_client import get_client
+
+log = logging.getLogger(__name__)
+
+OUTBOUND_WORKERS = max(1, int(os.getenv("OUTBOUND_WORKERS", "4")))
+OUTBOUND_RATE = float(os.getenv("OUTBOUND_RATE", "20"))
+OUTBOUND_BURST = float(os.getenv("OUTBOUND_BURST", "20"))
+OUTBOUND_MIN_RATE = float(os.getenv("OUTBOUND_MIN_RATE", "1"))
+OUTBOUND_RECIPIENT_INTERVAL = float(os.getenv("OUTBOUND_RECIPIENT_INTERVAL", "1.0"))
+OUTBOUND_MAX_ATTEMPTS = max(1, int(os.getenv("OUTBOUND_MAX_ATTEMPTS", "4")))
+OUTBOUND_RETRY_BACKOFF = float(os.getenv("OUTBOUND_RETRY_BACKOFF", "1.0"))
+OUTBOUND_QUEUE_MAXSIZE = int(os.getenv("OUTBOUND_QUEUE_MAXSIZE", "1000"))
+
+# AIMD: factor de frenado ante 429/5xx y recuperación tras N envíos exitosos
+SLOWDOWN = 0.5
+SPEEDUP = 1.25
+RECOVER_AFTER = 20
+# Latencias recientes que se guardan para los percentiles
+LATENCY_WINDOW = 1000
+
+
+class TokenBucket:
+    """Token bucket seguro entre hilos; la tasa se puede cambiar en caliente."""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = max(rate, 1e-6)
+        self.burst = max(1.0, burst)
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._held_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def set_rate(self, rate: float) -> None:
+        with self._lock:
+            self._refill(time.monotonic())
+            self.rate = max(rate, 1e-6)
+
+    def hold(self, seconds: float) -> None:
+        """No entrega tokens durante 'seconds' (p. ej. el Retry-After de un 429)."""
+        with self._lock:
+            self._held_until = max(self._held_until, time.monotonic() + seconds)
+
+    def acquire(self) -> float:
+        """Toma un token, esperando si hace falta; devuelve los segundos esperados."""
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if now < self._held_until:
+                    delay = self._held_until - now
+                elif self._tokens >= 1:
+                    self._tokens -= 1
+                    return waited
+                else:
+                    delay = (1 - self._tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+
+def _retryable(info: dict) -> bool:
+    sc = info.get("status_code") or 0
+    # Un timeout de lectura no se reintenta: el mensaje pudo haber salido
+    return sc == 429 or 500 <= sc < 600 or info.get("error") == "connect_error"
+
+
+class _Shard:
+    """Mensajes de un worker: cola FIFO por destinatario y heap (listo_en, seq, destinatario)."""
+
+    __slots__ = ("cond", "by_to", "heap", "next_at")
+
+    def __init__(self):
+        self.cond = threading.Condition()
+        self.by_to: dict[str, deque] = {}  # destinatario -> deque de [body, intento, encolado_en]
+        self.heap: list[tuple[float, int, str]] = []
+        self.next_at: dict[str, float] = {}  # destinatario -> próximo envío permitido
+
+
+class OutboundDispatcher:
+    """Pool de workers (uno por shard de destinatarios) que envía con send_text del cliente Graph."""
+
+    def __init__(
+        self,
+        client=None,
+        workers: int = OUTBOUND_WORKERS,
+        rate: float = OUTBOUND_RATE,
+        burst: float = OUTBOUND_BURST,
+        min_rate: float = OUTBOUND_MIN_RATE,
+        recipient_interval: float = OUTBOUND_RECIPIENT_INTERVAL,
+        max_attempts: int = OUTBOUND_MAX_ATTEMPTS,
+        retry_backoff: float = OUTBOUND_RETRY_BACKOFF,
+        maxsize: int = OUTBOUND_QUEUE_MAXSIZE,
+    ):
+        self._client = client
+        self.workers = max(1, int(workers))
+        self.base_rate = rate
+        self.min_rate = min(min_rate, rate)
+        self.bucket = TokenBucket(rate, burst)
+        self.recipient_interval = recipient_interval
+        self.max_attempts = max(1, int(max_attempts))
+        self.retry_backoff = retry_backoff
+        self.maxsize = max(0, int(maxsize))
+        self._shards = [_Shard() for _ in range(self.workers)]
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._threads: list[threading.Thread] = []
+        self._pending = 0
+        self._ok_streak = 0
+        self.sent = 0
+        self.failed = 0
+        self.throttled = 0
+        self.server_errors = 0
+        self.network_errors = 0
+        self.retries = 0
+        self._wait_total = 0.0
+        self._latencies = deque(maxlen=LATENCY_WINDOW)
+
+    @property
+    def client(self):
+        return self._client if self._client is not None else get_client()
+
+    def running(self) -> bool:
+        return any(t.is_alive() for t in self._threads)
+
+    def start(self) -> "OutboundDispatcher":
+        with self._lock:
+            if self.running():
+                return self
+            self._stop.clear()
+            self._threads = [
+                threading.Thread(target=self._run, args=(i,), name=f"outbound-{i}", daemon=True)
+                for i in range(self.workers)
+            ]
+            for t in self._threads:
+                t.start()
+        return self
+
+    def stop(self, timeout: float = 5.0) -> None:
+        self._stop.set()
+        for sh in self._shards:
+            with sh.cond:
+                sh.cond.notify_all()  # despierta al worker
+        for t in self._threads:
+            t.join(timeout=timeout)
+        self._threads = []
+
+    def submit(self, to: str, body: str) -> bool:
+        """Encola un texto para 'to'; False si la cola está llena."""
+        with self._lock:
+            if self.maxsize and self._pending >= self.maxsize:
+                return False
+            self._pending += 1
+        sh = self._shards[zlib.crc32((to or "").encode("utf-8")) % self.workers]
+        now = time.monotonic()
+        with sh.cond:
+            pending = sh.by_to.get(to)
+            if pending is None:
+                pending = sh.by_to[to] = deque()
+                self._schedule(sh, to, max(now, sh.next_at.get(to, 0.0)))
+                sh.cond.notify()
+            pending.append([body, 1, now])
+        return True
+
+    def _schedule(self, sh: _Shard, to: str, ready_at: float) -> None:
+        heapq.heappush(sh.heap, (ready_at, next(self._seq), to))
+
+    def join(self, timeout: float = 10.0) -> bool:
+        """Espera a que se envíen (o fallen) todos los mensajes encolados; False si vence."""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            with self._lock:
+                if self._pending == 0:
+                    return True
+            time.sleep(0.01)
+        return False
+
+    def _run(self, shard: int) -> None:
+        sh = self._shards[shard]
+        while not self._stop.is_set():
+            to = self._next_ready(sh)
+            if to is None:
+                continue
+            try:
+                self._deliver(sh, to)
+            except Exception:
+                log.exception("[outbound] Error enviando")
+                self._finish(sh, to, ok=False)
+
+    def _next_ready(self, sh: _Shard) -> str | None:
+        """Destinatario cuyo turno ya llegó (espera como máximo 0.5 s); None si no hay."""
+        with sh.cond:
+            if sh.heap:
+                delay = sh.heap[0][0] - time.monotonic()
+                if delay <= 0:
+                    return heapq.heappop(sh.heap)[2]
+                sh.cond.wait(min(delay, 0.5))
+            else:
+                sh.cond.wait(0.5)
+        return None
+
+    def _deliver(self, sh: _Shard, to: str) -> None:
+        """Un intento de envío del primer mensaje de 'to'; si se reintenta, vuelve al heap."""
+        with sh.cond:
+            item = sh.by_to[to][0]
+        body, attempt, enqueued_at = item
+        self.bucket.acquire()
+        started = time.monotonic()
+        # Los reintentos los decide el despachador (con frenado adaptativo)
+        ok, info = self.client.send_text(to, body, max_retries=0)
+        finished = time.monotonic()
+        with self._lock:
+            if attempt == 1:
+                # Espera en cola hasta el primer intento (intervalo por destinatario + bucket)
+                self._wait_total += started - enqueued_at
+            self._latencies.append(finished - started)
+        if ok:
+            self._on_success()
+        elif _retryable(info):
+            if info.get("status_code"):
+                self._on_throttle(info)
+            else:
+                with self._lock:
+                    self.network_errors += 1
+                log.warning(f"[outbound] {info.get('error')} hacia Graph; se reintenta sin cambiar la tasa")
+            if attempt < self.max_attempts:
+                with self._lock:
+                    self.retries += 1
+                delay = max(self.retry_backoff * attempt, info.get("retry_after") or 0.0)
+                with sh.cond:
+                    item[1] = attempt + 1
+                    # Sigue primero en su cola: el orden por destinatario se mantiene
+                    self._schedule(sh, to, finished + delay)
+                return
+        self._finish(sh, to, ok, finished)
+
+    def _finish(self, sh: _Shard, to: str, ok: bool, finished: float | None = None) -> None:
+        """Saca el primer mensaje de 'to' y agenda el siguiente tras el intervalo por destinatario."""
+        finished = time.monotonic() if finished is None else finished
+        with sh.cond:
+            pending = sh.by_to[to]
+            pending.popleft()
+            ready_at = finished + self.recipient_interval
+            sh.next_at[to] = ready_at
+            if pending:
+                self._schedule(sh, to, ready_at)
+            else:
+                del sh.by_to[to]
+            if len(sh.next_at) > 10_000:
+                sh.next_at = {k: v for k, v in sh.next_at.items() if v > finished}
+        with self._lock:
+            self._pending -= 1
+            if not ok:
+                self.failed += 1
+
+    def _on_success(self) -> None:
+        with self._lock:
+            self.sent += 1
+            self._ok_streak += 1
+            if self._ok_streak < RECOVER_AFTER or self.bucket.rate >= self.base_rate:
+                return
+            self._ok_streak = 0
+            rate = min(self.base_rate, self.bucket.rate * SPEEDUP)
+        self.bucket.set_rate(rate)
+
+    def _on_throttle(self, info: dict) -> None:
+        """429 o 5xx de Graph: baja la tasa global (y respeta Retry-After en un 429)."""
+        throttled = info.get("status_code") == 429
+        with self._lock:
+            if throttled:
+                self.throttled += 1
+            else:
+                self.server_errors += 1
+            self._ok_streak = 0
+            rate = max(self.min_rate, self.bucket.rate * SLOWDOWN)
+        log.warning(f"[outbound] {info.get('status_code')}: tasa -> {rate:.2f} msg/s")
+        self.bucket.set_rate(rate)
+        if throttled and info.get("retry_after"):
+            self.bucket.hold(info["retry_after"])
+
+    def stats(self) -> dict:
+        with self._lock:
+            lat = sorted(self._latencies)
+            done = self.sent + self.failed
+
+            def pct(p):
+                return round(lat[min(len(lat) - 1, int(p * len(lat)))] * 1000, 1) if lat else 0.0
+
+            return {
+                "workers": self.workers,
+                "running": self.running(),
+                "depth": self._pending,
+                "rate": round(self.bucket.rate, 3),
+                "base_rate": self.base_rate,
+                "sent": self.sent,
+                "failed": self.failed,
+                "throttled": self.throttled,
+                "server_errors": self.server_errors,
+                "network_errors": self.network_errors,
+                "retries": self.retries,
+                "latency_avg_ms": round(sum(lat) / len(lat) * 1000, 1) if lat else 0.0,
+                "latency_p50_ms": pct(0.5),
+                "latency_p95_ms": pct(0.95),
+                "latency_max_ms": round(lat[-1] * 1000, 1) if lat else 0.0,
+                "wait_avg_ms": round(self._wait_total / done * 1000, 1) if done else 0.0,
+            }
+
+
+_DISPATCHER: OutboundDispatcher | None = None
+_DISPATCHER_LOCK = threading.Lock()
+
+
+def get_dispatcher() -> OutboundDispatcher:
+    """Despachador compartido del proceso (se crea y arranca al primer envío)."""
+    global _DISPATCHER
+    with _DISPATCHER_LOCK:
+        if _DISPATCHER is None:
+            _DISPATCHER = OutboundDispatcher()
+        if not _DISPATCHER.running():
+            _DISPATCHER.start()
+    return _DISPATCHER
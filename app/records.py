@@ -0,0 +1,131 @@
+"""Registros compactos (con __slots__) para los programas y ofertas del catálogo v2."""
+import sys
+from collections.abc import Mapping
+
+
+class _Record(Mapping):
+    """
+    Registro de solo lectura con la interfaz de dict que usa el resto del código
+    (get, [], in, keys/items). Los campos conocidos van en __slots__; cualquier
+    otra llave del JSON se conserva en '_extra'. Los campos de INTERNED se
+    internan para que los valores repetidos (municipios, sedes, horarios)
+    compartan un único objeto str.
+    """
+
+    __slots__ = ("_extra", "_len")
+    FIELDS: tuple[str, ...] = ()
+    INTERNED: frozenset = frozenset()
+    _FIELD_SET: frozenset = frozenset()
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._FIELD_SET = frozenset(cls.FIELDS)
+
+    def __init__(self, data: Mapping):
+        extra = None
+        self._len = len(data)
+        for key, value in data.items():
+            value = self._convert(key, value)
+            if key in self._FIELD_SET:
+                setattr(self, key, value)
+            else:
+                if extra is None:
+                    extra = {}
+                extra[key] = value
+        self._extra = extra
+
+    def _convert(self, key: str, value):
+        if type(value) is str and key in self.INTERNED:
+            return sys.intern(value)
+        if type(value) is list:
+            return tuple(value)
+        return value
+
+    def __getitem__(self, key):
+        if key in self._FIELD_SET:
+            try:
+                return getattr(self, key)
+            except AttributeError:
+                pass
+        elif self._extra is not None and key in self._extra:
+            return self._extra[key]
+        raise KeyError(key)
+
+    def get(self, key, default=None):
+        if key in self._FIELD_SET:
+            return getattr(self, key, default)
+        if self._extra is not None:
+            return self._extra.get(key, default)
+        return default
+
+    def __contains__(self, key) -> bool:
+        if key in self._FIELD_SET:
+            return hasattr(self, key)
+        return self._extra is not None and key in self._extra
+
+    def __iter__(self):
+        for name in self.FIELDS:
+            if hasattr(self, name):
+                yield name
+        if self._extra is not None:
+            yield from self._extra
+
+    def __len__(self) -> int:
+        return self._len
+
+    def to_dict(self) -> dict:
+        """Copia en dicts planos; las ofertas de un programa también se convierten."""
+        return {k: _plain_value(v) for k, v in self.items()}
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({self.to_dict()!r})"
+
+
+def _plain_value(v):
+    if isinstance(v, _Record):
+        return v.to_dict()
+    if isinstance(v, (tuple, list)) and any(isinstance(x, _Record) for x in v):
+        return type(v)(_plain_value(x) for x in v)
+    return v
+
+
+class Offer(_Record):
+    """Oferta (municipio/sede/horario) de un programa."""
+
+    FIELDS = (
+        "ordinal",
+        "municipio",
+        "municipio_norm",
+        "municipio_base",
+        "municipio_base_norm",
+        "sede_nombre",
+        "sede_norm",
+        "ambiente",
+        "horario",
+    )
+    INTERNED = frozenset(FIELDS)
+    __slots__ = FIELDS
+
+
+class Program(_Record):
+    """Programa base v2 con sus ofertas como tupla de Offer."""
+
+    FIELDS = (
+        "codigo",
+        "programa",
+        "programa_norm",
+        "nivel",
+        "nivel_norm",
+        "perfil",
+        "competencias",
+        "certificacion",
+        "palabras_clave",
+        "ofertas",
+    )
+    INTERNED = frozenset({"codigo", "nivel", "nivel_norm"})
+    __slots__ = FIELDS
+
+    def _convert(self, key: str, value):
+        if key == "ofertas" and isinstance(value, list):
+            return tuple(of if isinstance(of, Offer) else Offer(of) for of in value)
+        return super()._convert(key, value)
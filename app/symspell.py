@@ -0,0 +1,100 @@
+"""
+Corrección ortográfica por borrado simétrico (estilo SymSpell).
+
+Al construir se generan, para cada palabra del vocabulario, todas las variantes
+con hasta 'max_distance' letras borradas. Una consulta genera sus propios
+borrados y los busca en ese diccionario: el número de búsquedas depende solo del
+largo de la palabra consultada, no del tamaño del vocabulario. Como en SymSpell,
+los borrados se calculan solo sobre los primeros 'prefix_length' caracteres, lo
+que acota tanto el índice como el costo de cada consulta. Los candidatos se
+confirman con la distancia de Damerau-Levenshtein (transposiciones incluidas).
+"""
+
+
+def _deletes(word: str, max_distance: int) -> set[str]:
+    """Variantes de 'word' con 1..max_distance letras borradas (nunca la cadena vacía)."""
+    out: set[str] = set()
+    frontier = {word}
+    for _ in range(max_distance):
+        step = set()
+        for w in frontier:
+            if len(w) > 1:
+                step.update(w[:i] + w[i + 1:] for i in range(len(w)))
+        step -= out
+        if not step:
+            break
+        out |= step
+        frontier = step
+    return out
+
+
+def edit_distance(a: str, b: str, max_distance: int) -> int:
+    """Damerau-Levenshtein (OSA) entre a y b; max_distance + 1 si la supera."""
+    if abs(len(a) - len(b)) > max_distance:
+        return max_distance + 1
+    prev2 = None
+    prev = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        cur = [i] + [0] * len(b)
+        row_min = cur[0]
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            cur[j] = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + cost)
+            if prev2 is not None and i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                cur[j] = min(cur[j], prev2[j - 2] + 1)
+            row_min = min(row_min, cur[j])
+        if row_min > max_distance:
+            return max_distance + 1
+        prev2, prev = prev, cur
+    return prev[-1] if prev[-1] <= max_distance else max_distance + 1
+
+
+class SymSpell:
+    """Vocabulario {palabra: frecuencia} + índice de borrados del prefijo -> palabras."""
+
+    __slots__ = ("max_distance", "prefix_length", "words", "deletes")
+
+    def __init__(self, words: dict[str, int], max_distance: int = 2, prefix_length: int = 7):
+        self.max_distance = max_distance
+        self.prefix_length = prefix_length
+        self.words = dict(words)
+        deletes: dict[str, list[str]] = {}
+        for word in self.words:
+            prefix = word[:prefix_length]
+            for variant in {prefix} | _deletes(prefix, max_distance):
+                deletes.setdefault(variant, []).append(word)
+        self.deletes = {k: tuple(v) for k, v in deletes.items()}
+
+    def __contains__(self, word: str) -> bool:
+        return word in self.words
+
+    def __len__(self) -> int:
+        return len(self.words)
+
+    def lookup(self, word: str, max_distance: int | None = None) -> str | None:
+        """
+        Palabra del vocabulario más cercana a 'word' (a distancia <= max_distance).
+        Empates: mayor frecuencia; si aun así hay empate, None (ambiguo).
+        """
+        if word in self.words:
+            return word
+        max_distance = self.max_distance if max_distance is None else min(max_distance, self.max_distance)
+        if max_distance <= 0:
+            return None
+
+        prefix = word[:self.prefix_length]
+        candidates = set()
+        for variant in {prefix} | _deletes(prefix, max_distance):
+            candidates.update(self.deletes.get(variant, ()))
+
+        best, best_key, tied = None, None, False
+        for cand in candidates:
+            dist = edit_distance(word, cand, max_distance)
+            if dist > max_distance:
+                continue
+            key = (dist, -self.words[cand])
+            if best_key is None or key < best_key:
+                best, best_key, tied = cand, key, False
+            elif key == best_key:
+                tied = True
+        return None if tied else best
@@ -0,0 +1,172 @@
+"""
+Motor opcional de puntaje temático con matrices dispersas (NumPy/SciPy).
+
+Reproduce exactamente core._topic_match_score_v2, pero en lugar de intersectar
+sets programa por programa arma al indexar una matriz programa x término con los
+pesos por campo ya aplicados. Una consulta se resuelve con la suma de unas pocas
+columnas (una por token) para todos los programas a la vez; las frases se buscan
+con str.find sobre un único texto con todos los títulos (y otro con las palabras
+clave), saltando al programa siguiente tras cada coincidencia.
+
+Se activa con TOPIC_SCORER=sparse; sin numpy/scipy app.core usa el puntaje clásico.
+"""
+from bisect import bisect_right
+
+try:
+    import numpy as np
+    from scipy import sparse
+except ImportError:  # pragma: no cover - dependencia opcional
+    np = None
+    sparse = None
+
+# Mismos pesos que core._topic_match_score_v2
+TITLE_WEIGHT = 25
+KW_WEIGHT = 22
+DESC_WEIGHT = 10
+COVERAGE_WEIGHT = 5
+FULL_COVERAGE_BONUS = 20
+TITLE_PHRASE_BONUS = 80
+KW_PHRASE_BONUS = 60
+
+# Separador de títulos/palabras clave concatenados; _norm nunca lo deja en una frase
+_SEP = "\n"
+
+
+def available() -> bool:
+    return np is not None and sparse is not None
+
+
+class TopicMatrix:
+    """
+    Matrices CSC (programa x término) construidas una vez por catálogo.
+
+    La fila i corresponde al id de programa i (posición en PROGRAM_CODES), igual
+    que en los postings TITLE_TOKENS/DESC_TOKENS.
+    """
+
+    __slots__ = ("codes", "vocab", "weighted", "coverage", "candidates", "titles", "keywords")
+
+    def __init__(self, codes, features, title_postings, desc_postings):
+        if not available():
+            raise RuntimeError("TopicMatrix requiere numpy y scipy")
+        self.codes = tuple(codes)
+        vocab: dict[str, int] = {}
+
+        def col(tok: str) -> int:
+            return vocab.setdefault(tok, len(vocab))
+
+        fields = {"title": ([], []), "kw": ([], []), "desc": ([], []), "any": ([], [])}
+        titles, keywords = [], []
+        for pid, code in enumerate(self.codes):
+            feat = features[code]
+            for name, toks in (("title", feat.title_tokens), ("kw", feat.kw_tokens), ("desc", feat.desc_tokens)):
+                rows, cols = fields[name]
+                for tok in toks:
+                    rows.append(pid)
+                    cols.append(col(tok))
+            rows, cols = fields["any"]
+            for tok in feat.title_tokens | feat.kw_tokens | feat.desc_tokens:
+                rows.append(pid)
+                cols.append(col(tok))
+            titles.append(feat.title)
+            keywords.append(_SEP.join(feat.kw_phrases))
+
+        # Candidatos: mismos postings que core._topic_candidate_codes
+        cand_rows, cand_cols = [], []
+        for postings in (title_postings, desc_postings):
+            for tok, ids in postings.items():
+                c = col(tok)
+                for pid in ids:
+                    cand_rows.append(pid)
+                    cand_cols.append(c)
+
+        shape = (len(self.codes), len(vocab))
+
+        def matrix(rows, cols):
+            data = np.ones(len(rows), dtype=np.int32)
+            m = sparse.csc_matrix((data, (rows, cols)), shape=shape, dtype=np.int32)
+            m.data[:] = 1  # (pid, tok) repetidos cuentan una vez, como en los sets
+            return m
+
+        title_m, kw_m, desc_m = (matrix(*fields[n]) for n in ("title", "kw", "desc"))
+        self.coverage = matrix(*fields["any"])
+        self.weighted = (
+            TITLE_WEIGHT * title_m
+            + KW_WEIGHT * kw_m
+            + DESC_WEIGHT * desc_m
+            + COVERAGE_WEIGHT * self.coverage
+        ).tocsc()
+        self.candidates = matrix(cand_rows, cand_cols)
+        self.vocab = vocab
+        self.titles = TextColumn(titles)
+        self.keywords = TextColumn(keywords)
+
+    def _columns(self, tokens) -> list[int]:
+        return [self.vocab[t] for t in tokens if t in self.vocab]
+
+    @staticmethod
+    def _column_sum(m, cols):
+        return np.asarray(m[:, cols].sum(axis=1)).ravel()
+
+    def scores(self, tema_tokens: set[str], tema_phrase: str, keys: set[str], min_score: int = 0) -> list[tuple[str, int]]:
+        """
+        [(code, score)] con score >= min_score (sin ordenar) de los programas que
+        comparten algún token de 'keys' (core._topic_candidate_keys) con los postings
+        o cuyo título o palabras clave contienen la frase.
+        """
+        if not (tema_tokens or tema_phrase) or not self.codes:
+            return []
+        key_cols = self._columns(keys)
+        if key_cols:
+            mask = self._column_sum(self.candidates, key_cols) > 0
+        else:
+            mask = np.zeros(len(self.codes), dtype=bool)
+
+        score = np.zeros(len(self.codes), dtype=np.int64)
+        if tema_phrase:
+            title_rows = self.titles.rows_containing(tema_phrase)
+            kw_rows = self.keywords.rows_containing(tema_phrase)
+            score[title_rows] += TITLE_PHRASE_BONUS
+            score[kw_rows] += KW_PHRASE_BONUS
+            mask[title_rows] = True
+            mask[kw_rows] = True
+        if tema_tokens:
+            cols = self._columns(tema_tokens)
+            if cols:
+                score += self._column_sum(self.weighted, cols)
+                coverage = self._column_sum(self.coverage, cols)
+                score += FULL_COVERAGE_BONUS * (coverage == len(tema_tokens))
+
+        hits = np.nonzero(mask & (score >= min_score))[0]
+        return [(self.codes[i], int(score[i])) for i in hits]
+
+
+class TextColumn:
+    """
+    Textos de todos los programas unidos por _SEP, con el offset de inicio de cada
+    fila. No necesita numpy: core la usa también para los candidatos por frase.
+    """
+
+    __slots__ = ("blob", "starts")
+
+    def __init__(self, texts):
+        starts, pos = [], 0
+        for text in texts:
+            starts.append(pos)
+            pos += len(text) + len(_SEP)
+        self.blob = _SEP.join(texts)
+        self.starts = starts
+
+    def rows_containing(self, phrase: str) -> list[int]:
+        """Filas cuyo texto contiene 'phrase' (una vez por fila)."""
+        rows = []
+        blob, starts = self.blob, self.starts
+        n = len(starts)
+        i = blob.find(phrase)
+        while i != -1:
+            row = bisect_right(starts, i) - 1
+            rows.append(row)
+            if row + 1 >= n:
+                break
+            i = blob.find(phrase, starts[row + 1])
+        return rows
@@ -1,22 +1,37 @@
 import os
+import hmac
 import json
 import logging
 import unicodedata
 import re
+import threading
+from collections.abc import Mapping
 from flask import Flask, request, jsonify
-import requests
 from sqlalchemy.orm import Session
 
 # Capa de base de datos
 from app.db import (
     ConsentEvent,
+    claim_message,
+    finish_message,
+    release_message,
     get_or_create_session_state,
-    get_or_create_user,
+    get_or_create_users,
     get_session,
     init_db,
     log_interaction,
 )
 
+# Ids de mensajes ya procesados (deduplicación de reentregas)
+from app.cache import MISSING, LRUCache
+
+# Cliente Graph compartido (pool keep-alive + reintentos)
+from app.graph_client import get_client
+from app.outbound import get_dispatcher
+
+# Cola de entregas y workers
+from app.webhook_queue import WorkerPool, make_queue
+
 # Importa las funciones del core (v2/legacy compatibles)
 from app.core import (
     PAGE_SIZE,
@@ -25,7 +40,11 @@ from app.core import (
     ficha_por_codigo_y_ordinal,
     _parse_intent,
     _search_programs,
+    catalog_generation,
+    get_catalog,
+    reload_catalog,
     route_general_response,
+    start_catalog_watcher,
 )
 
 # ========================= LOGGING =========================
@@ -36,14 +55,62 @@ log = logging.getLogger("webhook")
 WHATSAPP_TOKEN = os.getenv("WHATSAPP_TOKEN", "")
 WHATSAPP_PHONE_NUMBER_ID = os.getenv("WHATSAPP_PHONE_NUMBER_ID", "")
 WHATSAPP_VERIFY_TOKEN = os.getenv("WHATSAPP_VERIFY_TOKEN", "sena_token")
-
-GRAPH_URL = f"https://graph.facebook.com/v19.0/{WHATSAPP_PHONE_NUMBER_ID}/messages"
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")  # vacío = endpoints /admin deshabilitados
+
+# Procesamiento de entregas: "memory" (cola en el proceso), "db" (tabla webhook_jobs)
+# o "sync" (dentro del request, como antes)
+WEBHOOK_QUEUE = os.getenv("WEBHOOK_QUEUE", "memory").strip().lower()
+WEBHOOK_WORKERS = max(1, int(os.getenv("WEBHOOK_WORKERS", "4")))
+WEBHOOK_QUEUE_MAXSIZE = int(os.getenv("WEBHOOK_QUEUE_MAXSIZE", "1000"))  # solo memory; 0 = sin límite
+# Ids de mensajes recientes que se recuerdan en memoria (el resto se verifica en la base)
+DEDUP_CACHE_SIZE = int(os.getenv("DEDUP_CACHE_SIZE", "10000"))
+# Respuestas por el despachador con límite de tasa (1) o directo desde el worker (0)
+OUTBOUND_DISPATCH = os.getenv("OUTBOUND_DISPATCH", "1").strip().lower() not in {"0", "false", "no"}
 
 # ========================= APP =========================
 app = Flask(__name__)
 
-# Inicializar la base de datos (crea tablas si no existen)
-init_db()
+# Inicialización diferida de la base de datos (crea tablas si no existen): se hace una
+# sola vez, al arrancar el servidor o antes del primer webhook, no al importar el módulo.
+_DB_READY = False
+_DB_LOCK = threading.Lock()
+
+
+def ensure_db() -> None:
+    global _DB_READY
+    if _DB_READY:
+        return
+    with _DB_LOCK:
+        if not _DB_READY:
+            init_db()
+            _DB_READY = True
+
+
+# Pool de workers que procesa las entregas encoladas por /webhook (se crea al primer uso)
+WORKERS: WorkerPool | None = None
+_WORKERS_LOCK = threading.Lock()
+
+
+def start_webhook_workers() -> WorkerPool | None:
+    """Arranca (una vez) los workers de WEBHOOK_QUEUE; None con WEBHOOK_QUEUE=sync."""
+    global WORKERS
+    if WEBHOOK_QUEUE == "sync":
+        return None
+    with _WORKERS_LOCK:
+        if WORKERS is None:
+            jobs = make_queue(WEBHOOK_QUEUE, shards=WEBHOOK_WORKERS, maxsize=WEBHOOK_QUEUE_MAXSIZE)
+            WORKERS = WorkerPool(jobs, process_webhook)
+        if not WORKERS.running():
+            WORKERS.start()
+    return WORKERS
+
+
+@app.before_request
+def _ensure_db_before_webhook():
+    if request.endpoint == "incoming":
+        ensure_db()
+        start_catalog_watcher()  # no-op si CATALOG_WATCH_INTERVAL=0 o ya está corriendo
+        start_webhook_workers()
 
 # ========================= ESTADO POR USUARIO =========================
 # Guardamos lo mínimo por chat para paginar y seleccionar por índice
@@ -51,9 +118,30 @@ init_db()
 #   "last_query": "texto normalizado",
 #   "page": 0,                          # página actual (0-based)
 #   "items": [ (code, ordinal), ... ],  # lista completa para la última búsqueda
+#   "generation": 3,                    # generación del catálogo con la que se calcularon
 # }
 STATE = {}
 
+# ========================= DEDUPLICACIÓN =========================
+# Meta reenvía el mismo messages[].id si respondemos lento. Los ids procesados se
+# recuerdan en una LRU acotada (descarte sin tocar la base) y en la tabla
+# processed_messages, cuyo índice único es la verificación definitiva entre procesos.
+SEEN_MESSAGES = LRUCache(maxsize=DEDUP_CACHE_SIZE, name="wa_message_ids")
+DUPLICATES = {"memory": 0, "db": 0}
+_DUPLICATES_LOCK = threading.Lock()
+
+
+def _count_duplicate(where: str, msg: dict) -> None:
+    with _DUPLICATES_LOCK:
+        DUPLICATES[where] += 1
+    log.info(f"Mensaje repetido descartado ({where}): {msg.get('id')}")
+
+
+def _recently_seen(msg: dict) -> bool:
+    msg_id = msg.get("id")
+    return bool(msg_id) and SEEN_MESSAGES.get(msg_id) is not MISSING
+
+
 # ========================= ONBOARDING =========================
 ONBOARDING_STATES = {
     "TERMS_PENDING": "TERMS_PENDING",
@@ -76,19 +164,21 @@ def send_whatsapp_message(to: str, body: str):
     if not WHATSAPP_TOKEN or not WHATSAPP_PHONE_NUMBER_ID:
         log.error("❌ Faltan credenciales de WhatsApp.")
         return
-    payload = {
-        "messaging_product": "whatsapp",
-        "to": to,
-        "type": "text",
-        "text": {"body": body[:4096]},
-    }
-    headers = {"Authorization": f"Bearer {WHATSAPP_TOKEN}", "Content-Type": "application/json"}
-    try:
-        r = requests.post(GRAPH_URL, headers=headers, json=payload, timeout=20)
-        if r.status_code >= 400:
-            log.error(f"Error enviando: {r.status_code} {r.text}")
-    except Exception as e:
-        log.exception(f"Error al llamar al Graph API: {e}")
+    if OUTBOUND_DISPATCH:
+        if get_dispatcher().submit(to, body[:4096]):
+            return
+        log.warning("Cola de salida llena; envío directo")
+    # El cliente registra los errores (y reintenta 5xx y fallas de conexión)
+    get_client().send_text(to, body[:4096])
+
+
+# Envíos emitidos por el hilo actual: process_webhook los compara para saber si un
+# mensaje que falló alcanzó a responder antes del error.
+_SENDS = threading.local()
+
+
+def _sends_issued() -> int:
+    return getattr(_SENDS, "count", 0)
 
 
 def send_and_log(session: Session, user_id: int | None, to: str, body: str, message_type: str = "text"):
@@ -98,10 +188,11 @@ def send_and_log(session: Session, user_id: int | None, to: str, body: str, mess
     defecto. Si se necesita trazabilidad en un caso puntual puede agregarse un log
     explícito en el flujo correspondiente.
     """
+    _SENDS.count = _sends_issued() + 1
     send_whatsapp_message(to=to, body=body)
 
 
-def _intent_label(intent: dict | str | None) -> str | None:
+def _intent_label(intent: Mapping | str | None) -> str | None:
     if intent is None:
         return None
     if isinstance(intent, str):
@@ -115,8 +206,8 @@ def _intent_label(intent: dict | str | None) -> str | None:
     return "unknown"
 
 
-def _prepare_intent(intent: dict | str | None) -> tuple[str | None, dict | None]:
-    return _intent_label(intent), intent if isinstance(intent, dict) else None
+def _prepare_intent(intent: Mapping | str | None) -> tuple[str | None, Mapping | None]:
+    return _intent_label(intent), intent if isinstance(intent, Mapping) else None
 
 
 def _safe_log_interaction(**kwargs):
@@ -143,6 +234,10 @@ def _extract_text(msg: dict) -> str:
 
 def _current_page_items(user_id: str, page_size: int = PAGE_SIZE):
     st = STATE.get(user_id, {})
+    if st.get("items") and st.get("last_query") and st.get("generation") != catalog_generation():
+        # El catálogo se recargó: los (code, ordinal) guardados pueden no existir ya
+        st["items"] = _search_programs(_parse_intent(st["last_query"]) or {})
+        st["generation"] = catalog_generation()
     items = st.get("items", [])
     page = st.get("page", 0)
     start = page * page_size
@@ -232,174 +327,311 @@ def verify():
     return "forbidden", 403
 
 
-# ========================= INCOMING =========================
-@app.post("/webhook")
-def incoming():
-    data = request.get_json(silent=True) or {}
-    log.info(f"Incoming: {json.dumps(data, ensure_ascii=False)}")
+# ========================= ADMIN =========================
+def _admin_authorized() -> bool:
+    token = request.headers.get("X-Admin-Token", "")
+    return bool(ADMIN_TOKEN) and hmac.compare_digest(token, ADMIN_TOKEN)
+
 
+@app.post("/admin/reload-catalog")
+def admin_reload_catalog():
+    if not _admin_authorized():
+        return jsonify({"error": "forbidden"}), 403
+    force = request.args.get("force", "").lower() in {"1", "true", "yes"}
     try:
-        entry = data.get("entry", [])[0]
-        change = entry.get("changes", [])[0]
-        value = change.get("value", {})
-        msgs = value.get("messages", [])
-        if not msgs:
-            return "no messages", 200
-
-        msg = msgs[0]
-        from_number = msg.get("from")
-        text = _extract_text(msg) or ""
-        text_norm = _norm_simple(text)
-
-        with get_session() as session:
-            user = get_or_create_user(session, from_number)
-            state_obj = get_or_create_session_state(session, user)
-            if not user.consent_accepted or state_obj.state != ONBOARDING_STATES["COMPLETED"]:
-                intent_label, intent_metadata = _prepare_intent(
-                    _parse_intent(text_norm) if text_norm else None
-                )
-                _safe_log_interaction(
-                    user_id=user.id,
-                    direction="inbound",
-                    body=text,
-                    intent=intent_label,
-                    metadata=intent_metadata,
-                    step="onboarding",
-                    message_type=msg.get("type", "text"),
-                    wa_message_id=msg.get("id"),
-                )
-                onboarding_reply = _handle_onboarding(session, user, state_obj, text, text_norm)
-                if onboarding_reply:
-                    send_and_log(session, user.id, from_number, onboarding_reply)
-                return "ok", 200
-
-            st = STATE.get(from_number, {"last_query": "", "page": 0, "items": []})
-
-            intent_data = _parse_intent(text_norm) if text_norm else None
-
-            # ============= Router para saludos / info general del SENA ==========
-            routed = route_general_response(text)
-            if routed:
-                respuesta_routed, routed_intent = routed
-                routed_label, routed_metadata = _prepare_intent(routed_intent)
-                _safe_log_interaction(
-                    user_id=user.id,
-                    direction="inbound",
-                    body=text,
-                    intent=routed_label,
-                    metadata=routed_metadata,
-                    step="routed",
-                    message_type=msg.get("type", "text"),
-                    wa_message_id=msg.get("id"),
-                )
-                send_and_log(session, user.id, from_number, respuesta_routed)
-                return "ok", 200
-
-            # ============= 1) Selección directa "codigo-ordinal" =================
-            m_code_idx = re.fullmatch(r"\s*(\d{5,7})-(\d{1,2})\s*", text_norm)
-            if m_code_idx:
-                code, ord_str = m_code_idx.groups()
-                ord_n = int(ord_str)
-                intent_label, intent_metadata = _prepare_intent(intent_data)
-                _safe_log_interaction(
-                    user_id=user.id,
-                    direction="inbound",
-                    body=text,
-                    intent=intent_label,
-                    metadata=intent_metadata,
-                    program_code=code,
-                    step="details",
-                    message_type=msg.get("type", "text"),
-                    wa_message_id=msg.get("id"),
-                )
-                respuesta = ficha_por_codigo_y_ordinal(code, ord_n)
-                # mantener contexto en caso de que el usuario siga con "ver más"
-                STATE[from_number] = {"last_query": f"{code}-{ord_n}", "page": 0, "items": []}
-                send_and_log(session, user.id, from_number, respuesta)
-                return "ok", 200
-
-            # ============= 2) "ver más": misma búsqueda, siguiente página ========
-            if text_norm in {"ver mas", "ver más", "vermas"}:
-                intent_label, intent_metadata = _prepare_intent(intent_data)
-                _safe_log_interaction(
-                    user_id=user.id,
-                    direction="inbound",
-                    body=text,
-                    intent=intent_label,
-                    metadata=intent_metadata,
-                    step="pagination",
-                    message_type=msg.get("type", "text"),
-                    wa_message_id=msg.get("id"),
-                )
-                if not st["last_query"]:
-                    send_and_log(
-                        session,
-                        user.id,
-                        from_number,
-                        "No tengo una búsqueda previa. Escribe por ejemplo: *tecnólogos en Popayán* o *programas en La Casona*.",
-                    )
-                    return "ok", 200
-
-                # Siguiente página
-                st["page"] += 1
-                # Volvemos a pedir la respuesta con show_all=True y la página nueva
-                respuesta = generar_respuesta(st["last_query"], show_all=True, page=st["page"], page_size=PAGE_SIZE)
-                STATE[from_number] = st
-                send_and_log(session, user.id, from_number, respuesta)
-                return "ok", 200
-
-            # ============= 3) Selección por índice (1..10) en la página actual ===
-            if text_norm.isdigit() and st.get("items"):
-                idx = int(text_norm) - 1
-                page_items = _current_page_items(from_number, page_size=PAGE_SIZE)
-                if 0 <= idx < len(page_items) and idx < PAGE_SIZE:
-                    code, ord_n = page_items[idx]
-                    intent_label, intent_metadata = _prepare_intent(intent_data)
-                    _safe_log_interaction(
-                        user_id=user.id,
-                        direction="inbound",
-                        body=text,
-                        intent=intent_label,
-                        metadata=intent_metadata,
-                        program_code=code,
-                        step="details",
-                        message_type=msg.get("type", "text"),
-                        wa_message_id=msg.get("id"),
-                    )
-                    respuesta = ficha_por_codigo_y_ordinal(code, ord_n)
-                    send_and_log(session, user.id, from_number, respuesta)
-                    return "ok", 200
-                # si no válido, sigue al flujo normal
-
-            # ============= 4) Consulta normal ================================
-            # Guardamos los items para poder seleccionar por índice y paginar
-            search_intent = intent_data or _parse_intent(text_norm) or {}
-            intent_label, intent_metadata = _prepare_intent(search_intent)
-            items = _search_programs(search_intent)
-            st = {"last_query": text_norm, "page": 0, "items": items}
-            STATE[from_number] = st
+        reloaded = reload_catalog(force=force)
+    except Exception as e:
+        log.exception("Recarga de catálogo fallida")
+        return jsonify({"reloaded": False, "error": str(e), **get_catalog().stats()}), 500
+    return jsonify({"reloaded": reloaded, **get_catalog().stats()})
+
+
+@app.get("/admin/webhook-queue")
+def admin_webhook_queue():
+    """Profundidad de la cola y retraso de procesamiento de las entregas."""
+    if not _admin_authorized():
+        return jsonify({"error": "forbidden"}), 403
+    with _DUPLICATES_LOCK:
+        duplicates = dict(DUPLICATES)
+    if WORKERS is None:
+        return jsonify({"backend": WEBHOOK_QUEUE, "running": False, "duplicates": duplicates})
+    return jsonify({**WORKERS.stats(), "duplicates": duplicates})
+
 
+@app.get("/admin/outbound")
+def admin_outbound():
+    """Envíos, throttling (429/5xx), tasa vigente y latencia de la Graph API."""
+    if not _admin_authorized():
+        return jsonify({"error": "forbidden"}), 403
+    if not OUTBOUND_DISPATCH:
+        return jsonify({"running": False})
+    return jsonify(get_dispatcher().stats())
+
+
+# ========================= INCOMING =========================
+def _iter_messages(data: dict):
+    """Todos los mensajes de la entrega (todas las entries y changes), en orden."""
+    for entry in data.get("entry") or []:
+        for change in entry.get("changes") or []:
+            value = change.get("value") or {}
+            yield from value.get("messages") or []
+
+
+def _delivery(messages: list[dict]) -> dict:
+    """Entrega con la forma del webhook que contiene solo 'messages'."""
+    return {"entry": [{"changes": [{"value": {"messages": messages}}]}]}
+
+
+def process_webhook(data: dict) -> str:
+    """
+    Procesa una entrega ya aceptada: todos sus mensajes, en orden. Los usuarios
+    (con su estado de sesión) se buscan o crean en una sola consulta por lote, y
+    cada mensaje se confirma por separado: si uno falla se revierte solo ese y
+    se sigue con el resto. Los ids ya procesados se descartan antes de parsear.
+    El id se marca done en la misma transacción que el estado; si el mensaje
+    falla antes de enviar respuesta se libera (su reentrega se procesa), y si ya
+    se envió algo se marca done igual para no responder dos veces.
+    """
+    messages = [m for m in _iter_messages(data) if m.get("from")]
+    if not messages:
+        return "no messages"
+
+    failed = 0
+    with get_session() as session:
+        users = get_or_create_users(session, [m["from"] for m in messages])
+        for msg in messages:
+            msg_id = msg.get("id")
+            if _recently_seen(msg):
+                _count_duplicate("memory", msg)
+                continue
+            sends_before = _sends_issued()
+            try:
+                # Antes de parsear o buscar: el índice único descarta reentregas
+                if msg_id and not claim_message(session, msg_id):
+                    SEEN_MESSAGES.put(msg_id, True)
+                    _count_duplicate("db", msg)
+                    continue
+                _process_message(session, users[msg["from"]], msg)
+                if msg_id:
+                    finish_message(session, msg_id)
+                session.commit()
+                if msg_id:
+                    SEEN_MESSAGES.put(msg_id, True)
+            except Exception:
+                session.rollback()
+                failed += 1
+                log.exception(f"Error procesando mensaje {msg_id}")
+                if msg_id:
+                    try:
+                        if _sends_issued() != sends_before:
+                            finish_message(session, msg_id)
+                            session.commit()
+                        else:
+                            release_message(session, msg_id)
+                    except Exception:
+                        session.rollback()
+                        log.exception(f"No se pudo cerrar el id {msg_id}")
+    if failed:
+        log.warning(f"Entrega con {len(messages)} mensajes: {failed} con error")
+    return "ok"
+
+
+def _process_message(session: Session, user, msg: dict) -> None:
+    """Responde un mensaje: onboarding, saludos/info general, selección, paginación o búsqueda."""
+    from_number = msg.get("from")
+    text = _extract_text(msg) or ""
+    text_norm = _norm_simple(text)
+
+    state_obj = get_or_create_session_state(session, user)
+    if not user.consent_accepted or state_obj.state != ONBOARDING_STATES["COMPLETED"]:
+        intent_label, intent_metadata = _prepare_intent(
+            _parse_intent(text_norm) if text_norm else None
+        )
+        _safe_log_interaction(
+            user_id=user.id,
+            direction="inbound",
+            body=text,
+            intent=intent_label,
+            metadata=intent_metadata,
+            step="onboarding",
+            message_type=msg.get("type", "text"),
+            wa_message_id=msg.get("id"),
+        )
+        onboarding_reply = _handle_onboarding(session, user, state_obj, text, text_norm)
+        if onboarding_reply:
+            send_and_log(session, user.id, from_number, onboarding_reply)
+        return
+
+    st = STATE.get(from_number, {"last_query": "", "page": 0, "items": []})
+
+    intent_data = _parse_intent(text_norm) if text_norm else None
+
+    # ============= Router para saludos / info general del SENA ==========
+    routed = route_general_response(text)
+    if routed:
+        respuesta_routed, routed_intent = routed
+        routed_label, routed_metadata = _prepare_intent(routed_intent)
+        _safe_log_interaction(
+            user_id=user.id,
+            direction="inbound",
+            body=text,
+            intent=routed_label,
+            metadata=routed_metadata,
+            step="routed",
+            message_type=msg.get("type", "text"),
+            wa_message_id=msg.get("id"),
+        )
+        send_and_log(session, user.id, from_number, respuesta_routed)
+        return
+
+    # ============= 1) Selección directa "codigo-ordinal" =================
+    m_code_idx = re.fullmatch(r"\s*(\d{5,7})-(\d{1,2})\s*", text_norm)
+    if m_code_idx:
+        code, ord_str = m_code_idx.groups()
+        ord_n = int(ord_str)
+        intent_label, intent_metadata = _prepare_intent(intent_data)
+        _safe_log_interaction(
+            user_id=user.id,
+            direction="inbound",
+            body=text,
+            intent=intent_label,
+            metadata=intent_metadata,
+            program_code=code,
+            step="details",
+            message_type=msg.get("type", "text"),
+            wa_message_id=msg.get("id"),
+        )
+        respuesta = ficha_por_codigo_y_ordinal(code, ord_n)
+        # mantener contexto en caso de que el usuario siga con "ver más"
+        STATE[from_number] = {"last_query": f"{code}-{ord_n}", "page": 0, "items": []}
+        send_and_log(session, user.id, from_number, respuesta)
+        return
+
+    # ============= 2) "ver más": misma búsqueda, siguiente página ========
+    if text_norm in {"ver mas", "ver más", "vermas"}:
+        intent_label, intent_metadata = _prepare_intent(intent_data)
+        _safe_log_interaction(
+            user_id=user.id,
+            direction="inbound",
+            body=text,
+            intent=intent_label,
+            metadata=intent_metadata,
+            step="pagination",
+            message_type=msg.get("type", "text"),
+            wa_message_id=msg.get("id"),
+        )
+        if not st["last_query"]:
+            send_and_log(
+                session,
+                user.id,
+                from_number,
+                "No tengo una búsqueda previa. Escribe por ejemplo: *tecnólogos en Popayán* o *programas en La Casona*.",
+            )
+            return
+
+        # Siguiente página
+        st["page"] += 1
+        # Volvemos a pedir la respuesta con show_all=True y la página nueva
+        respuesta = generar_respuesta(st["last_query"], show_all=True, page=st["page"], page_size=PAGE_SIZE)
+        STATE[from_number] = st
+        send_and_log(session, user.id, from_number, respuesta)
+        return
+
+    # ============= 3) Selección por índice (1..10) en la página actual ===
+    if text_norm.isdigit() and st.get("items"):
+        idx = int(text_norm) - 1
+        page_items = _current_page_items(from_number, page_size=PAGE_SIZE)
+        if 0 <= idx < len(page_items) and idx < PAGE_SIZE:
+            code, ord_n = page_items[idx]
+            intent_label, intent_metadata = _prepare_intent(intent_data)
             _safe_log_interaction(
                 user_id=user.id,
                 direction="inbound",
                 body=text,
                 intent=intent_label,
                 metadata=intent_metadata,
-                step="search",
+                program_code=code,
+                step="details",
                 message_type=msg.get("type", "text"),
                 wa_message_id=msg.get("id"),
             )
-
-            # Render principal (página 1)
-            respuesta = generar_respuesta(text, show_all=False, page=0, page_size=PAGE_SIZE)
+            respuesta = ficha_por_codigo_y_ordinal(code, ord_n)
             send_and_log(session, user.id, from_number, respuesta)
-            return "ok", 200
+            return
+        # si no válido, sigue al flujo normal
+
+    # ============= 4) Consulta normal ================================
+    # Guardamos los items para poder seleccionar por índice y paginar
+    search_intent = intent_data or _parse_intent(text_norm) or {}
+    intent_label, intent_metadata = _prepare_intent(search_intent)
+    items = _search_programs(search_intent)
+    st = {"last_query": text_norm, "page": 0, "items": items, "generation": catalog_generation()}
+    STATE[from_number] = st
+
+    _safe_log_interaction(
+        user_id=user.id,
+        direction="inbound",
+        body=text,
+        intent=intent_label,
+        metadata=intent_metadata,
+        step="search",
+        message_type=msg.get("type", "text"),
+        wa_message_id=msg.get("id"),
+    )
+
+    # Render principal (página 1)
+    respuesta = generar_respuesta(text, show_all=False, page=0, page_size=PAGE_SIZE)
+    send_and_log(session, user.id, from_number, respuesta)
 
-    except Exception as e:
-        log.exception(f"Error procesando webhook: {e}")
-        return "error", 500
+
+@app.post("/webhook")
+def incoming():
+    data = request.get_json(silent=True)
+    log.info(f"Incoming: {json.dumps(data, ensure_ascii=False)}")
+
+    try:
+        messages = [m for m in _iter_messages(data) if m.get("from")]
+    except (AttributeError, TypeError):
+        return "invalid payload", 400
+    if not messages:
+        return "no messages", 200
+
+    # Reentregas recientes: se descartan sin encolar
+    fresh = []
+    for msg in messages:
+        if _recently_seen(msg):
+            _count_duplicate("memory", msg)
+        else:
+            fresh.append(msg)
+    if not fresh:
+        return "ok", 200
+    messages = fresh
+
+    if WEBHOOK_QUEUE == "sync":
+        try:
+            return process_webhook(_delivery(messages)), 200
+        except Exception as e:
+            log.exception(f"Error procesando webhook: {e}")
+            return "error", 500
+
+    # Un lote por worker: cada usuario cae siempre en el mismo shard, así que sus
+    # mensajes se procesan en orden aunque la entrega traiga varios usuarios.
+    # Se responde en cuanto todo queda encolado. Los lotes se encolan todos o
+    # ninguno: con un 503 parcial, Meta reentregaría también lo ya encolado.
+    workers = start_webhook_workers()
+    batches: dict[int, list[dict]] = {}
+    for msg in messages:
+        batches.setdefault(workers.shard_for(msg["from"]), []).append(msg)
+    if not workers.submit_many([(_delivery(batch), batch[0]["from"]) for batch in batches.values()]):
+        log.warning("Cola del webhook llena; Meta reintentará la entrega")
+        return "busy", 503
+    return "ok", 200
 
 
 if __name__ == "__main__":
+    ensure_db()
+    get_catalog()  # construye índices antes de aceptar tráfico
+    start_catalog_watcher()
+    start_webhook_workers()
     port = int(os.getenv("PORT", "8000"))
     app.run(host="0.0.0.0", port=port, debug=False)
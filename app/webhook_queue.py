@@ -0,0 +1,351 @@
+"""
+Cola de entregas del webhook y pool de workers que las procesan.
+
+/webhook solo valida el payload, lo encola y responde 200; el parseo, la
+búsqueda y el envío por Graph los hace un worker en segundo plano. Así Meta no
+reintenta entregas por respuestas lentas.
+
+Backends (WEBHOOK_QUEUE):
+- "memory": colas en el proceso; lo encolado se pierde si el proceso muere.
+- "db": tabla webhook_jobs de la base local (SQLite/PostgreSQL); sobrevive a
+  reinicios y la comparten todos los procesos que apuntan a la misma base.
+
+Cada entrega va a un shard según el número de origen (un shard por worker), de
+modo que los mensajes de un mismo usuario se procesan en orden y nunca en
+paralelo dentro de un proceso.
+"""
+import logging
+import queue
+import threading
+import time
+import zlib
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import func, update
+
+from app.db import WebhookJob, get_session
+
+log = logging.getLogger("webhook.queue")
+
+
+class Job:
+    """Entrega encolada: payload del webhook y momento (epoch) en que se encoló."""
+
+    __slots__ = ("id", "payload", "enqueued_at", "shard")
+
+    def __init__(self, id, payload: dict, enqueued_at: float, shard: int = 0):
+        self.id = id
+        self.payload = payload
+        self.enqueued_at = enqueued_at
+        self.shard = shard
+
+
+def _shard_for(key: str, shards: int) -> int:
+    return zlib.crc32((key or "").encode("utf-8")) % shards if shards > 1 else 0
+
+
+def _epoch(dt: datetime) -> float:
+    """datetime UTC naive (como los guarda app.db) -> epoch."""
+    return dt.replace(tzinfo=timezone.utc).timestamp()
+
+
+class MemoryQueue:
+    """Colas en memoria, una por shard; 'maxsize' (0 = sin límite) acota el total."""
+
+    backend = "memory"
+
+    def __init__(self, shards: int = 1, maxsize: int = 0):
+        self.shards = max(1, int(shards))
+        self.maxsize = max(0, int(maxsize))
+        self._queues = [queue.Queue() for _ in range(self.shards)]
+        self._lock = threading.Lock()
+        self._size = 0
+        self._seq = 0
+
+    def put(self, payload: dict, key: str = "") -> bool:
+        """Encola; False si la cola está llena."""
+        return self.put_many([(payload, key)])
+
+    def put_many(self, items: list[tuple[dict, str]]) -> bool:
+        """Encola todos los (payload, llave) o ninguno; False si no caben todos."""
+        with self._lock:
+            if self.maxsize and self._size + len(items) > self.maxsize:
+                return False
+            self._size += len(items)
+            now = time.time()
+            jobs = []
+            for payload, key in items:
+                self._seq += 1
+                jobs.append(Job(self._seq, payload, now, _shard_for(key, self.shards)))
+        for job in jobs:
+            self._queues[job.shard].put(job)
+        return True
+
+    def get(self, shard: int, timeout: float | None = None) -> Job | None:
+        try:
+            job = self._queues[shard].get(timeout=timeout)
+        except queue.Empty:
+            return None
+        with self._lock:
+            self._size -= 1
+        return job
+
+    def done(self, job: Job) -> None:
+        pass
+
+    def failed(self, job: Job) -> None:
+        pass
+
+    def depth(self) -> int:
+        with self._lock:
+            return self._size
+
+    def oldest_enqueued_at(self) -> float | None:
+        oldest = None
+        for q in self._queues:
+            with q.mutex:
+                if q.queue:
+                    ts = q.queue[0].enqueued_at
+                    oldest = ts if oldest is None else min(oldest, ts)
+        return oldest
+
+
+class DBQueue:
+    """
+    Cola en la tabla webhook_jobs. Un worker reclama la fila pendiente más antigua
+    de su shard con un UPDATE condicional (status pending -> processing), así que
+    cada entrega la procesa un solo worker aunque haya varios procesos. Las filas
+    procesadas se borran; las fallidas quedan con status "failed" para revisión.
+    """
+
+    backend = "db"
+
+    def __init__(self, shards: int = 1, poll_interval: float = 0.2, session_factory=get_session):
+        self.shards = max(1, int(shards))
+        self.poll_interval = poll_interval
+        self._session = session_factory
+
+    def put(self, payload: dict, key: str = "") -> bool:
+        return self.put_many([(payload, key)])
+
+    def put_many(self, items: list[tuple[dict, str]]) -> bool:
+        """Encola todos los (payload, llave) en una sola transacción."""
+        with self._session() as session:
+            session.add_all(
+                WebhookJob(payload=payload, shard=_shard_for(key, self.shards), status="pending")
+                for payload, key in items
+            )
+        return True
+
+    def _claim(self, shard: int) -> Job | None:
+        with self._session() as session:
+            while True:
+                row = (
+                    session.query(WebhookJob.id, WebhookJob.payload, WebhookJob.enqueued_at)
+                    .filter(WebhookJob.status == "pending", WebhookJob.shard == shard)
+                    .order_by(WebhookJob.id)
+                    .first()
+                )
+                if row is None:
+                    return None
+                claimed = session.execute(
+                    update(WebhookJob)
+                    .where(WebhookJob.id == row.id, WebhookJob.status == "pending")
+                    .values(status="processing", claimed_at=datetime.utcnow())
+                ).rowcount
+                session.commit()
+                if claimed:
+                    return Job(row.id, row.payload, _epoch(row.enqueued_at), shard)
+                # otro worker la reclamó primero: probar con la siguiente
+
+    def get(self, shard: int, timeout: float | None = None) -> Job | None:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            job = self._claim(shard)
+            if job is not None:
+                return job
+            if deadline is not None and time.monotonic() >= deadline:
+                return None
+            time.sleep(self.poll_interval)
+
+    def done(self, job: Job) -> None:
+        with self._session() as session:
+            session.query(WebhookJob).filter(WebhookJob.id == job.id).delete()
+
+    def failed(self, job: Job) -> None:
+        with self._session() as session:
+            session.query(WebhookJob).filter(WebhookJob.id == job.id).update({"status": "failed"})
+
+    def recover(self, stale_after: float = 300.0) -> int:
+        """Devuelve a pending las filas 'processing' de un worker que murió; cuántas."""
+        cutoff = datetime.utcnow() - timedelta(seconds=stale_after)
+        with self._session() as session:
+            return (
+                session.query(WebhookJob)
+                .filter(WebhookJob.status == "processing", WebhookJob.claimed_at < cutoff)
+                .update({"status": "pending", "claimed_at": None})
+            )
+
+    def depth(self) -> int:
+        with self._session() as session:
+            return session.query(func.count(WebhookJob.id)).filter(WebhookJob.status == "pending").scalar() or 0
+
+    def oldest_enqueued_at(self) -> float | None:
+        with self._session() as session:
+            oldest = (
+                session.query(func.min(WebhookJob.enqueued_at))
+                .filter(WebhookJob.status == "pending")
+                .scalar()
+            )
+        return _epoch(oldest) if oldest is not None else None
+
+
+def make_queue(backend: str, shards: int = 1, maxsize: int = 0):
+    if backend == "memory":
+        return MemoryQueue(shards=shards, maxsize=maxsize)
+    if backend == "db":
+        return DBQueue(shards=shards)
+    raise ValueError(f"WEBHOOK_QUEUE desconocida: {backend!r} (memory|db|sync)")
+
+
+class WorkerPool:
+    """
+    Un hilo por shard de 'jobs' que llama handler(payload) por cada entrega.
+
+    stats() expone profundidad de la cola, antigüedad de la entrega más vieja y
+    el retraso de procesamiento (encolado -> inicio) y la duración de cada entrega.
+    """
+
+    def __init__(self, jobs, handler, name: str = "webhook-worker", poll_timeout: float = 0.5):
+        self.jobs = jobs
+        self.handler = handler
+        self.name = name
+        self.poll_timeout = poll_timeout
+        self._threads: list[threading.Thread] = []
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._submitted = 0
+        self.processed = 0
+        self.failed = 0
+        self._lag_total = 0.0
+        self._lag_max = 0.0
+        self._last_lag = 0.0
+        self._busy_total = 0.0
+
+    @property
+    def workers(self) -> int:
+        return self.jobs.shards
+
+    def running(self) -> bool:
+        return any(t.is_alive() for t in self._threads)
+
+    def shard_for(self, key: str) -> int:
+        """Shard (worker) al que va una entrega con esta llave."""
+        return _shard_for(key, self.jobs.shards)
+
+    def start(self) -> "WorkerPool":
+        with self._lock:
+            if self._threads and any(t.is_alive() for t in self._threads):
+                return self
+            self._stop.clear()
+            if hasattr(self.jobs, "recover"):
+                recovered = self.jobs.recover()
+                if recovered:
+                    log.warning("Cola %s: %s entregas huérfanas devueltas a pending", self.jobs.backend, recovered)
+            self._threads = [
+                threading.Thread(target=self._run, args=(shard,), name=f"{self.name}-{shard}", daemon=True)
+                for shard in range(self.jobs.shards)
+            ]
+            for t in self._threads:
+                t.start()
+        return self
+
+    def stop(self, timeout: float = 5.0) -> None:
+        self._stop.set()
+        for t in self._threads:
+            t.join(timeout=timeout)
+        self._threads = []
+
+    def submit(self, payload: dict, key: str = "") -> bool:
+        """Encola una entrega; False si la cola está llena."""
+        if not self.jobs.put(payload, key):
+            return False
+        with self._lock:
+            self._submitted += 1
+        return True
+
+    def submit_many(self, items: list[tuple[dict, str]]) -> bool:
+        """Encola todas las (payload, llave) o ninguna; False si no caben todas."""
+        if not self.jobs.put_many(items):
+            return False
+        with self._lock:
+            self._submitted += len(items)
+        return True
+
+    def join(self, timeout: float = 10.0) -> bool:
+        """Espera a que terminen todas las entregas enviadas con submit(); False si vence."""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            with self._lock:
+                if self.processed + self.failed >= self._submitted:
+                    return True
+            time.sleep(0.01)
+        return False
+
+    def _run(self, shard: int) -> None:
+        while not self._stop.is_set():
+            try:
+                job = self.jobs.get(shard, timeout=self.poll_timeout)
+            except Exception:
+                log.exception("Worker %s: error leyendo la cola", shard)
+                time.sleep(self.poll_timeout)
+                continue
+            if job is not None:
+                self._process(job)
+
+    def _process(self, job: Job) -> None:
+        started = time.time()
+        lag = max(0.0, started - job.enqueued_at)
+        ok = True
+        try:
+            self.handler(job.payload)
+        except Exception:
+            ok = False
+            log.exception("Error procesando entrega %s", job.id)
+        busy = time.time() - started
+        try:
+            if ok:
+                self.jobs.done(job)
+            else:
+                self.jobs.failed(job)
+        except Exception:
+            log.exception("No se pudo cerrar la entrega %s en la cola", job.id)
+        finally:
+            with self._lock:
+                if ok:
+                    self.processed += 1
+                else:
+                    self.failed += 1
+                self._lag_total += lag
+                self._lag_max = max(self._lag_max, lag)
+                self._last_lag = lag
+                self._busy_total += busy
+
+    def stats(self) -> dict:
+        depth = self.jobs.depth()
+        oldest = self.jobs.oldest_enqueued_at()
+        with self._lock:
+            done = self.processed + self.failed
+            return {
+                "backend": self.jobs.backend,
+                "workers": self.workers,
+                "running": self.running(),
+                "depth": depth,
+                "oldest_age_ms": round((time.time() - oldest) * 1000, 1) if oldest is not None else 0.0,
+                "processed": self.processed,
+                "failed": self.failed,
+                "lag_avg_ms": round(self._lag_total / done * 1000, 1) if done else 0.0,
+                "lag_max_ms": round(self._lag_max * 1000, 1),
+                "lag_last_ms": round(self._last_lag * 1000, 1),
+                "busy_avg_ms": round(self._busy_total / done * 1000, 1) if done else 0.0,
+            }
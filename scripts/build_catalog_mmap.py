@@ -0,0 +1,42 @@
+"""Compila el catálogo v2 al formato mmap compartido entre workers.
+
+Uso:
+    python scripts/build_catalog_mmap.py [ruta_salida]
+
+Igual que el snapshot, el archivo queda asociado al hash de contenido del archivo
+de programas y de app/config/*; si cualquiera cambia, app.core lo ignora.
+"""
+from pathlib import Path
+import sys
+import time
+
+ROOT = Path(__file__).resolve().parent.parent
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from app import core  # noqa: E402
+from app.mmap_catalog import write_mmap_catalog  # noqa: E402
+
+
+def main(argv: list[str]) -> int:
+    out = argv[1] if len(argv) > 1 else core.CATALOG_MMAP_PATH
+    if not out:
+        print("CATALOG_MMAP_PATH vacío: indique una ruta de salida")
+        return 1
+    t0 = time.perf_counter()
+    state = core.build_catalog_state()
+    if state["DATA_FORMAT"] != "normalized_v2":
+        print(f"El catálogo mmap requiere programas_normalizado_v2.json (formato actual: {state['DATA_FORMAT']})")
+        return 1
+    key = core.catalog_content_key()
+    write_mmap_catalog(out, key, state)
+    elapsed = (time.perf_counter() - t0) * 1000
+    print(
+        f"Catálogo mmap escrito en {out} ({len(state['BY_CODE'])} programas, "
+        f"{len(state['OFFER_KEYS'])} ofertas, hash {key[:12]}, {elapsed:.0f} ms)"
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main(sys.argv))
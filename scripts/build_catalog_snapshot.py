@@ -0,0 +1,39 @@
+"""Compila los índices del catálogo a un snapshot binario para arranque rápido.
+
+Uso:
+    python scripts/build_catalog_snapshot.py [ruta_salida]
+
+El snapshot queda asociado al hash de contenido del archivo de programas y de
+app/config/*; si cualquiera cambia, app.core lo ignora y reconstruye en memoria.
+"""
+from pathlib import Path
+import sys
+import time
+
+ROOT = Path(__file__).resolve().parent.parent
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from app import core  # noqa: E402
+from app.catalog_snapshot import write_snapshot  # noqa: E402
+
+
+def main(argv: list[str]) -> int:
+    out = argv[1] if len(argv) > 1 else core.CATALOG_SNAPSHOT_PATH
+    if not out:
+        print("CATALOG_SNAPSHOT_PATH vacío: indique una ruta de salida")
+        return 1
+    t0 = time.perf_counter()
+    state = core.build_catalog_state()
+    key = core.catalog_content_key()
+    write_snapshot(out, key, state)
+    elapsed = (time.perf_counter() - t0) * 1000
+    print(
+        f"Snapshot escrito en {out} ({state['DATA_FORMAT']}, "
+        f"{len(state['BY_CODE'])} programas, hash {key[:12]}, {elapsed:.0f} ms)"
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main(sys.argv))
@@ -0,0 +1,62 @@
+"""Reporta la memoria retenida por el catálogo (programas + índices) de un worker.
+
+Uso:
+    python scripts/catalog_memory_report.py [--top N]
+
+Mide con tracemalloc la construcción en limpio (sin snapshot) y muestra el total
+retenido por el estado del catálogo y el desglose por estructura.
+"""
+from pathlib import Path
+import argparse
+import gc
+import sys
+import tracemalloc
+
+ROOT = Path(__file__).resolve().parent.parent
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from app import core  # noqa: E402
+
+
+def _kib(n: int) -> str:
+    return f"{n / 1024:,.1f} KiB"
+
+
+def _measure(fn):
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    result = fn()
+    gc.collect()
+    after = tracemalloc.take_snapshot()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    retained = sum(s.size_diff for s in after.compare_to(before, "filename"))
+    return result, retained, peak
+
+
+def main(argv: list[str]) -> int:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--top", type=int, default=8, help="estructuras a detallar")
+    args = ap.parse_args(argv[1:])
+
+    core.build_catalog_state()  # calienta cachés de normalización/regex: no cuentan como catálogo
+    state, retained, peak = _measure(core.build_catalog_state)
+    print(f"Formato: {state['DATA_FORMAT']} · programas: {len(state['BY_CODE'])}")
+    print(f"Catálogo retenido: {_kib(retained)} (pico durante la construcción: {_kib(peak)})")
+
+    # Desglose: cada estructura construida por separado (incluye lo que comparte con otras)
+    breakdown = []
+    for name in state:
+        _copy, size, _peak = _measure(lambda: core.build_catalog_state()[name])  # noqa: B023
+        breakdown.append((size, name))
+    breakdown.sort(reverse=True)
+    print("Mayores estructuras:")
+    for size, name in breakdown[: args.top]:
+        print(f"  {name:<24} {_kib(size)}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main(sys.argv))
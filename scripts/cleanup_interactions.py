@@ -8,6 +8,8 @@ from app.db import engine
 
 
 DEFAULT_RETENTION_DAYS = 180
+# Meta deja de reintentar una entrega mucho antes; basta con unos días de ids procesados
+DEFAULT_DEDUP_RETENTION_DAYS = 7
 
 
 def main() -> None:
@@ -21,7 +23,16 @@ def main() -> None:
         )
         deleted = result.rowcount or 0
 
+        dedup_days = int(os.getenv("DEDUP_RETENTION_DAYS", DEFAULT_DEDUP_RETENTION_DAYS))
+        dedup_cutoff = datetime.utcnow() - timedelta(days=dedup_days)
+        result = conn.execute(
+            text("DELETE FROM processed_messages WHERE created_at < :cutoff"),
+            {"cutoff": dedup_cutoff},
+        )
+        deleted_ids = result.rowcount or 0
+
     print(f"Eliminadas {deleted} interacciones anteriores a {cutoff_date.date()}")
+    print(f"Eliminados {deleted_ids} ids de mensajes procesados anteriores a {dedup_cutoff.date()}")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,64 @@
+"""Ingesta en streaming de un export crudo (una fila por oferta) al formato v2.
+
+Uso:
+    python scripts/ingest_catalog.py ENTRADA [SALIDA] [--format json|jsonl|csv] [--partitions N]
+                                     [--full] [--report diff.json]
+
+Lee el export registro a registro, agrupa por código en particiones temporales y
+escribe programas_normalizado_v2.json de forma incremental, sin cargar todo el
+archivo en memoria. Las palabras clave curadas no se generan: se conservan si el
+export trae 'palabras_clave'.
+
+Junto a la salida queda SALIDA.manifest.json con la huella de cada código; en la
+siguiente corrida solo se reprocesan los programas agregados o modificados
+(--full fuerza el proceso completo) y se informa el diff.
+"""
+from pathlib import Path
+import argparse
+import json
+import sys
+import time
+
+ROOT = Path(__file__).resolve().parent.parent
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from app.ingest import ingest  # noqa: E402
+
+DEFAULT_OUT = ROOT / "storage_simple" / "programas_normalizado_v2.json"
+
+
+def main(argv: list[str]) -> int:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("entrada")
+    ap.add_argument("salida", nargs="?", default=str(DEFAULT_OUT))
+    ap.add_argument("--format", choices=("json", "jsonl", "csv"), default=None)
+    ap.add_argument("--partitions", type=int, default=64)
+    ap.add_argument("--workdir", default=None, help="directorio para los archivos temporales")
+    ap.add_argument("--full", action="store_true", help="ignora el manifiesto y reprocesa todo")
+    ap.add_argument("--report", default=None, help="guarda el diff (added/changed/removed) en JSON")
+    args = ap.parse_args(argv[1:])
+
+    t0 = time.perf_counter()
+    stats = ingest(args.entrada, args.salida, args.format, args.partitions, args.workdir, incremental=not args.full)
+    elapsed = time.perf_counter() - t0
+    print(
+        f"Ingesta OK: {stats['rows']} filas ({stats['skipped']} sin código) "
+        f"-> {stats['programs']} programas en {args.salida} ({elapsed:.2f}s)"
+    )
+    print(
+        f"Diff: {len(stats['added'])} nuevos, {len(stats['changed'])} modificados, "
+        f"{len(stats['removed'])} eliminados, {stats['unchanged']} sin cambios"
+    )
+    for label in ("added", "changed", "removed"):
+        if stats[label]:
+            print(f"  {label}: {', '.join(stats[label])}")
+    if args.report:
+        report = {k: stats[k] for k in ("added", "changed", "removed", "unchanged")}
+        with open(args.report, "w", encoding="utf-8") as fh:
+            json.dump(report, fh, ensure_ascii=False, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
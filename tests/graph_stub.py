@@ -0,0 +1,70 @@
+"""Servidor HTTP local que imita POST /{version}/{phone_id}/messages de la Graph API."""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class GraphStub:
+    """
+    Registra cada request (recipient, momento, conexión) y responde según
+    'responses': una lista de códigos HTTP (o tuplas (código, headers)) que se
+    consume en orden (luego 200).
+    'delay' simula latencia del servidor.
+    """
+
+    def __init__(self, responses=None, delay: float = 0.0):
+        self.responses = list(responses or [])
+        self.delay = delay
+        self.requests = []  # (to, monotonic, connection_id)
+        self.connections = 0
+        self._lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive
+            disable_nagle_algorithm = True
+
+            def setup(self):
+                super().setup()
+                with stub._lock:
+                    stub.connections += 1
+                    self.connection_id = stub.connections
+
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                body = json.loads(self.rfile.read(length) or b"{}")
+                if stub.delay:
+                    time.sleep(stub.delay)
+                with stub._lock:
+                    stub.requests.append((body.get("to"), time.monotonic(), self.connection_id))
+                    status = stub.responses.pop(0) if stub.responses else 200
+                status, extra_headers = status if isinstance(status, tuple) else (status, {})
+                if status < 300:
+                    out = {"messages": [{"id": f"wamid.{len(stub.requests)}"}]}
+                else:
+                    out = {"error": {"code": status, "message": "stub"}}
+                data = json.dumps(out).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for name, value in extra_headers.items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.base_url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self._thread = threading.Thread(target=self.server.serve_forever, args=(0.05,), daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
@@ -0,0 +1,35 @@
+import unittest
+
+from app.aho_corasick import AhoCorasick
+from app.core import _parse_intent
+
+
+class AhoCorasickTest(unittest.TestCase):
+    def test_finds_overlapping_patterns_in_one_pass(self):
+        ac = AhoCorasick()
+        for pattern in ["popayan", "popayan - vrd el sendero", "el sendero"]:
+            ac.add(pattern)
+        ac.build()
+        found = ac.find_all("tecnicos en popayan - vrd el sendero")
+        self.assertEqual(sorted(found), ["el sendero", "popayan", "popayan - vrd el sendero"])
+
+    def test_whole_words_only(self):
+        ac = AhoCorasick()
+        ac.add("silv", "silvia")
+        ac.build()
+        self.assertEqual(ac.find_all("programas en silvania"), [])
+        self.assertEqual(ac.find_all("programas en silv"), ["silvia"])
+        self.assertEqual(ac.find_all("programas en silvania", whole_words=False), ["silvia"])
+
+
+class LocationIntentTest(unittest.TestCase):
+    def test_alias_resolves_to_known_municipio(self):
+        intent = _parse_intent("programas en guapy")
+        self.assertEqual(list(intent["location"]["municipio"]), ["guapi"])
+
+    def test_partial_words_are_not_locations(self):
+        self.assertNotIn("location", _parse_intent("en"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,63 @@
+import random
+import unittest
+
+from app import core
+from app.bk_tree import BKTree, levenshtein
+
+
+class BKTreeTest(unittest.TestCase):
+    def test_levenshtein(self):
+        self.assertEqual(levenshtein("popayna", "popayan"), 2)
+        self.assertEqual(levenshtein("guapy", "guapi"), 1)
+        self.assertEqual(levenshtein("", "abc"), 3)
+        self.assertEqual(levenshtein("santander", "xyz", 2), 3)  # corta al superar el límite
+
+    def test_search_matches_brute_force(self):
+        rng = random.Random(7)
+        words = {"".join(rng.choice("abcd") for _ in range(rng.randint(1, 7))) for _ in range(300)}
+        tree = BKTree()
+        for w in words:
+            tree.add(w, w.upper())
+        self.assertEqual(len(tree), len(words))
+        for _ in range(100):
+            q = "".join(rng.choice("abcd") for _ in range(rng.randint(1, 7)))
+            for radius in (1, 2):
+                expected = sorted((levenshtein(q, w), w) for w in words if levenshtein(q, w) <= radius)
+                got = [(d, w) for d, w, _p in tree.search(q, radius)]
+                self.assertEqual(got, expected, (q, radius))
+
+    def test_same_word_keeps_all_payloads(self):
+        tree = BKTree()
+        tree.add("casona", ("sede", "la casona"))
+        tree.add("casona", ("sede", "sede la casona"))
+        [(d, word, payloads)] = tree.search("casna", 1)
+        self.assertEqual((d, word), (1, "casona"))
+        self.assertEqual(payloads, {("sede", "la casona"), ("sede", "sede la casona")})
+
+
+class FuzzyLocationTest(unittest.TestCase):
+    def _location(self, q):
+        return core._parse_intent_uncached(core._norm(q)).get("location")
+
+    def test_misspelled_locations_resolve(self):
+        self.assertEqual(self._location("sistemas en popayna"), {"municipio": ["popayan"]})
+        self.assertEqual(self._location("tecnologo en quilichau"), {"municipio": ["santander de quilichao"]})
+        self.assertEqual(self._location("programas en santader de quilichao"), {"municipio": ["santander de quilichao"]})
+        self.assertEqual(self._location("guapy"), {"municipio": ["guapi"]})
+
+    def test_typo_search_matches_exact_search(self):
+        for typo, good in (("sistemas en popayna", "sistemas en popayan"), ("mercadres", "mercaderes")):
+            typo_intent = core._parse_intent_uncached(core._norm(typo))
+            good_intent = core._parse_intent_uncached(core._norm(good))
+            self.assertEqual(typo_intent.get("location"), good_intent.get("location"), typo)
+            self.assertEqual(core._search_programs_uncached(typo_intent),
+                             core._search_programs_uncached(good_intent), typo)
+
+    def test_ambiguous_and_topic_words_are_not_locations(self):
+        self.assertIsNone(self._location("timbiki"))  # timbiqui y timbio empatan
+        self.assertEqual(core._fuzzy_location_matches("metalmecanica"), [])
+        self.assertEqual(core._fuzzy_location_matches("tecnologo 228118"), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
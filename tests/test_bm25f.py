@@ -0,0 +1,59 @@
+import unittest
+from unittest import mock
+
+from app import core
+from app.bm25f import BM25FIndex
+
+DOCS = [
+    ("1", {"title": ["gestion", "empresarial"], "kw": [], "desc": ["gestion", "administrativa"]}),
+    ("2", {"title": ["gestion", "ambiental"], "kw": ["ambiente"], "desc": ["gestion"]}),
+    ("3", {"title": ["metalmecanica"], "kw": [], "desc": ["gestion", "soldadura", "torno"]}),
+    ("4", {"title": ["gestion", "documental"], "kw": [], "desc": []}),
+]
+
+
+class BM25FIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.index = BM25FIndex(DOCS)
+
+    def test_rare_terms_outweigh_common_ones(self):
+        self.assertGreater(self.index.idf["metalmecanica"], self.index.idf["gestion"])
+        scores = self.index.scores({"gestion", "metalmecanica"})
+        self.assertEqual(max(scores, key=scores.get), "3")
+
+    def test_title_outweighs_description(self):
+        scores = self.index.scores({"soldadura"})
+        title_only = BM25FIndex([("x", {"title": ["soldadura"]}), ("y", {"desc": ["soldadura"]})])
+        self.assertEqual(set(scores), {"3"})
+        self.assertGreater(title_only.score("x", {"soldadura"}), title_only.score("y", {"soldadura"}))
+
+    def test_single_score_matches_postings(self):
+        tokens = {"gestion", "ambiental", "torno", "inexistente"}
+        scores = self.index.scores(tokens)
+        for code, _ in DOCS:
+            self.assertAlmostEqual(self.index.score(code, tokens), scores.get(code, 0.0), places=5)
+        self.assertEqual(self.index.score("no-existe", tokens), 0.0)
+
+
+class BM25FRankerTest(unittest.TestCase):
+    def test_flag_switches_topic_ranking(self):
+        state = core.build_catalog_state()
+        core._attach_topic_scorers(state)
+        self.assertNotIn("TOPIC_BM25F", state)
+        with mock.patch.object(core, "TOPIC_RANKER", "bm25f"):
+            core._attach_topic_scorers(state)
+        ranker = state["TOPIC_BM25F"]
+        self.assertEqual(set(ranker.codes), set(core.BY_CODE))
+
+        tokens = core._topic_tokens_from_text("software")
+        with mock.patch.dict(core.get_catalog().state, {"TOPIC_BM25F": ranker}):
+            results = core._topic_scores_v2(tokens, "software")
+            self.assertTrue(results)
+            self.assertEqual(results, sorted(results, key=lambda x: (-x[1], core.BY_CODE[x[0]]["programa_norm"])))
+            for code, pts in results:
+                self.assertIn("software", core.PROGRAM_FEATURES[code].title_tokens | core.PROGRAM_FEATURES[code].desc_tokens)
+                self.assertEqual(pts, ranker.points(ranker.score(code, tokens)))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,96 @@
+import unittest
+
+from app.cache import MISSING, LRUCache
+from app.core import (
+    INTENT_CACHE,
+    RENDER_CACHE,
+    SEARCH_CACHE,
+    _parse_intent,
+    _search_programs,
+    _ficha_por_codigo_y_ordinal,
+    _search_programs_uncached,
+    ficha_por_codigo_y_ordinal,
+    clear_caches,
+)
+
+
+class LRUCacheTest(unittest.TestCase):
+    def test_evicts_least_recently_used(self):
+        cache = LRUCache(maxsize=2)
+        cache.put("a", 1)
+        cache.put("b", 2)
+        cache.get("a")
+        cache.put("c", 3)
+        self.assertIs(cache.get("b"), MISSING)
+        self.assertEqual(cache.get("a"), 1)
+        self.assertEqual(cache.stats()["hits"], 2)
+        self.assertEqual(cache.stats()["misses"], 1)
+
+    def test_generation_and_ttl_expire_entries(self):
+        cache = LRUCache(maxsize=4, ttl=60)
+        cache.put("k", "v", generation=1)
+        self.assertEqual(cache.get("k", generation=1), "v")
+        self.assertIs(cache.get("k", generation=2), MISSING)
+
+        cache = LRUCache(maxsize=4, ttl=-1)
+        self.assertIsNone(cache.ttl)
+
+
+class IntentCacheTest(unittest.TestCase):
+    def setUp(self):
+        clear_caches()
+
+    def test_same_normalized_text_hits_cache(self):
+        first = _parse_intent("Tecnólogo en Popayán")
+        hits = INTENT_CACHE.hits
+        second = _parse_intent("tecnologo en popayan")
+        self.assertIs(first, second)
+        self.assertEqual(INTENT_CACHE.hits, hits + 1)
+
+    def test_cached_intents_are_immutable(self):
+        intent = _parse_intent("programas sobre sistemas")
+        with self.assertRaises(TypeError):
+            intent["nivel"] = "tecnico"
+        with self.assertRaises(AttributeError):
+            intent["tema_tokens"].add("cocina")
+
+
+
+class SearchCacheTest(unittest.TestCase):
+    def setUp(self):
+        clear_caches()
+
+    def test_equivalent_intents_share_ranked_results(self):
+        first = _search_programs(_parse_intent("sistemas en popayan"))
+        hits = SEARCH_CACHE.hits
+        second = _search_programs(_parse_intent("Sistemas en Popayán"))
+        self.assertEqual(first, second)
+        self.assertEqual(SEARCH_CACHE.hits, hits + 1)
+        self.assertEqual(second, _search_programs_uncached(_parse_intent("sistemas en popayan")))
+
+    def test_callers_get_a_private_copy(self):
+        intent = _parse_intent("programas en popayan")
+        items = _search_programs(intent)
+        items.clear()
+        self.assertTrue(_search_programs(intent))
+
+
+
+class RenderCacheTest(unittest.TestCase):
+    def setUp(self):
+        clear_caches()
+
+    def test_ficha_is_rendered_once_per_code_ordinal(self):
+        first = ficha_por_codigo_y_ordinal("228118", 2)
+        hits = RENDER_CACHE.hits
+        self.assertEqual(ficha_por_codigo_y_ordinal("228118", 2), first)
+        self.assertEqual(RENDER_CACHE.hits, hits + 1)
+        self.assertEqual(first, _ficha_por_codigo_y_ordinal("228118", 2))
+
+    def test_unknown_codes_are_not_cached(self):
+        ficha_por_codigo_y_ordinal("000000", 1)
+        self.assertEqual(len(RENDER_CACHE), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
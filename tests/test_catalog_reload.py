@@ -0,0 +1,101 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from app import core
+
+
+class CatalogReloadTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        root = self.tmp.name
+        config_dir = os.path.join(root, "config")
+        shutil.copytree(core.CONFIG_DIR, config_dir)
+        self.programas_path = os.path.join(root, "programas_normalizado_v2.json")
+        shutil.copy(core._programas_path(), self.programas_path)
+
+        patches = [
+            mock.patch.object(core, "_CATALOG", None),
+            mock.patch.object(core, "PROGRAMAS_PATH_CANDIDATES", [self.programas_path]),
+            mock.patch.object(core, "CONFIG_DIR", config_dir),
+            mock.patch.object(core, "TOPIC_SYNONYM_PATHS", [os.path.join(config_dir, "topic_synonyms.json")]),
+            mock.patch.object(core, "LOCATION_ALIAS_PATHS", [os.path.join(config_dir, "location_aliases.json")]),
+            mock.patch.object(core, "CATALOG_SNAPSHOT_PATH", ""),
+            mock.patch.dict(core.STATE, {}),
+        ]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+        self.addCleanup(core.clear_caches)
+        self.addCleanup(self.tmp.cleanup)
+
+    def _drop_program(self, code: str) -> None:
+        with open(self.programas_path, encoding="utf-8") as fh:
+            programas = json.load(fh)
+        programas = [p for p in programas if str(p.get("codigo")) != code]
+        with open(self.programas_path, "w", encoding="utf-8") as fh:
+            json.dump(programas, fh, ensure_ascii=False)
+
+    def test_reload_swaps_catalog_and_bumps_generation(self):
+        code = next(iter(core.BY_CODE))
+        old = core.get_catalog()
+        self.assertFalse(core.reload_catalog())  # sin cambios de contenido
+
+        self._drop_program(code)
+        self.assertTrue(core.reload_catalog())
+        self.assertIsNot(core.get_catalog(), old)
+        self.assertEqual(core.catalog_generation(), old.generation + 1)
+        self.assertNotIn(code, core.BY_CODE)
+        self.assertIn(code, old["BY_CODE"])  # el catálogo anterior queda intacto
+
+    def test_reload_reuses_unchanged_programs(self):
+        old = core.get_catalog()
+        codes = list(old["BY_CODE"])
+        changed, dropped = codes[0], codes[1]
+        with open(self.programas_path, encoding="utf-8") as fh:
+            programas = json.load(fh)
+        programas = [p for p in programas if str(p.get("codigo")) != dropped]
+        for p in programas:
+            if str(p.get("codigo")) == changed:
+                p["perfil"] = "perfil actualizado con robotica"
+        with open(self.programas_path, "w", encoding="utf-8") as fh:
+            json.dump(programas, fh, ensure_ascii=False)
+
+        self.assertTrue(core.reload_catalog())
+        fresh = core.get_catalog()
+        self.assertEqual(
+            core.diff_program_hashes(old["PROGRAM_HASHES"], fresh["PROGRAM_HASHES"]),
+            {"added": [], "changed": [changed], "removed": [dropped]},
+        )
+        for code in codes[2:]:
+            self.assertIs(fresh["BY_CODE"][code], old["BY_CODE"][code])
+            self.assertIs(fresh["PROGRAM_FEATURES"][code], old["PROGRAM_FEATURES"][code])
+        self.assertIsNot(fresh["PROGRAM_FEATURES"][changed], old["PROGRAM_FEATURES"][changed])
+        self.assertIn("robotica", fresh["PROGRAM_FEATURES"][changed].desc_tokens)
+
+    def test_invalid_config_keeps_current_catalog(self):
+        old = core.get_catalog()
+        with open(os.path.join(core.CONFIG_DIR, "location_aliases.json"), "w", encoding="utf-8") as fh:
+            json.dump({"alias_sede": {"Casona": ["x"], "casona": ["y"]}}, fh)
+        with self.assertRaises(ValueError):
+            core.reload_catalog()
+        self.assertIs(core.get_catalog(), old)
+
+    def test_stale_pagination_is_recomputed(self):
+        core.generar_respuesta("programas en popayan")
+        items = list(core.STATE["items"])
+        self.assertGreater(len(items), core.PAGE_SIZE)
+        dropped = items[0][0]
+
+        self._drop_program(dropped)
+        core.reload_catalog()
+        core.generar_respuesta("ver mas")
+        self.assertEqual(core.STATE["generation"], core.catalog_generation())
+        self.assertNotIn(dropped, {c for c, _ in core.STATE["items"]})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,89 @@
+import os
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+from app import core
+from app.catalog_snapshot import read_snapshot, write_snapshot
+
+
+class CatalogSnapshotTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "catalog.bin")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_roundtrip_matches_fresh_build(self):
+        key = core.catalog_content_key()
+        state = core.build_catalog_state()
+        write_snapshot(self.path, key, state)
+
+        loaded = read_snapshot(self.path, key)
+        self.assertIsNotNone(loaded)
+        self.assertEqual(set(loaded), set(state))
+        self.assertEqual(loaded["BY_CODE"], core.BY_CODE)
+        self.assertEqual(dict(loaded["BY_MUNICIPIO"]), dict(core.BY_MUNICIPIO))
+        self.assertEqual(
+            loaded["LOCATION_MATCHER"].find_all("tecnologo en popayan"),
+            core.LOCATION_MATCHER.find_all("tecnologo en popayan"),
+        )
+
+    def test_stale_or_corrupt_snapshot_is_ignored(self):
+        write_snapshot(self.path, core.catalog_content_key(), {"BY_CODE": {}})
+        self.assertIsNone(read_snapshot(self.path, "0" * 64))
+
+        with open(self.path, "wb") as fh:
+            fh.write(b"basura")
+        self.assertIsNone(read_snapshot(self.path, core.catalog_content_key()))
+        self.assertIsNone(read_snapshot(os.path.join(self.tmp.name, "nope.bin"), "x"))
+
+    def test_snapshot_missing_index_keys_is_rebuilt(self):
+        programas, _fmt = core._load_programas(core._programas_path())
+        cfg = {"PROGRAMAS": programas, "DATA_FORMAT": "normalized_v2", **core._load_config()}
+        self.assertEqual(set(core._build_v2_indexes(programas, cfg)), core.V2_INDEX_KEYS)
+
+        key = core.catalog_content_key()
+        state = core.build_catalog_state()
+        state.pop("LOCATION_FUZZY")  # p. ej. snapshot escrito por una versión anterior
+        write_snapshot(self.path, key, state)
+        with mock.patch.object(core, "CATALOG_SNAPSHOT_PATH", self.path), \
+                mock.patch.object(core, "CATALOG_MMAP_PATH", None):
+            catalog = core.Catalog.load()
+        self.assertEqual(catalog.source, "build")
+        self.assertIn("LOCATION_FUZZY", catalog.state)
+
+
+class LazyCatalogTest(unittest.TestCase):
+    def test_built_once_under_concurrency(self):
+        built = []
+        real_load = core.Catalog.load
+
+        def counting_load():
+            built.append(1)
+            return real_load()
+
+        with mock.patch.object(core, "_CATALOG", None), mock.patch.object(
+            core.Catalog, "load", side_effect=counting_load
+        ):
+            seen = []
+            threads = [threading.Thread(target=lambda: seen.append(core.get_catalog())) for _ in range(8)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            self.assertEqual(len(built), 1)
+            self.assertTrue(all(c is seen[0] for c in seen))
+
+    def test_module_names_are_views_of_catalog(self):
+        catalog = core.get_catalog()
+        self.assertEqual(core.DATA_FORMAT, catalog.data_format)
+        self.assertIs(core.LOCATION_MATCHER, catalog["LOCATION_MATCHER"])
+        self.assertEqual(len(core.BY_CODE), len(catalog["BY_CODE"]))
+        self.assertIn("popayan", core.KNOWN_MUNICIPIOS)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,31 @@
+import unittest
+
+from app.core import GeneralInfoIndex, _match_general_info_entry
+
+
+class GeneralInfoIndexTest(unittest.TestCase):
+    def test_known_questions(self):
+        cases = {
+            "inscripción": "como_inscribirme",
+            "¿Qué es el SENA?": "que_es_sena",
+            "contacto sena": "canales_contacto",
+        }
+        for text, expected in cases.items():
+            entry = _match_general_info_entry(text)
+            self.assertIsNotNone(entry, text)
+            self.assertEqual(entry["id"], expected)
+
+    def test_longest_tag_wins_over_file_order(self):
+        index = GeneralInfoIndex(
+            [
+                {"id": "generico", "tags": ["sena"], "answer": "a"},
+                {"id": "especifico", "tags": ["horario sena"], "answer": "b"},
+            ]
+        )
+        self.assertEqual(index.match("cual es el horario sena")["id"], "especifico")
+        self.assertEqual(index.match("sena")["id"], "generico")
+        self.assertIsNone(index.match("programas en popayan"))
+
+
+if __name__ == "__main__":
+    unittest.main()
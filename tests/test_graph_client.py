@@ -0,0 +1,82 @@
+import socket
+import unittest
+from unittest import mock
+
+from app import graph_client, send, webhook
+from app.graph_client import GraphClient
+from tests.graph_stub import GraphStub
+
+
+def _client(stub, **kwargs):
+    return GraphClient(token="t", phone_number_id="123", base_url=stub.base_url, backoff=0, **kwargs)
+
+
+class GraphClientTest(unittest.TestCase):
+    def test_reuses_keep_alive_connection(self):
+        with GraphStub() as stub:
+            client = _client(stub)
+            self.addCleanup(client.close)
+            for i in range(5):
+                ok, info = client.send_text("5730011122", f"hola {i}")
+                self.assertTrue(ok)
+                self.assertEqual(info["message_id"], f"wamid.{i + 1}")
+            self.assertEqual(len(stub.requests), 5)
+            self.assertEqual(stub.connections, 1)
+
+    def test_retries_5xx_but_not_4xx(self):
+        with GraphStub(responses=[500, 503]) as stub:
+            client = _client(stub, max_retries=2)
+            self.addCleanup(client.close)
+            ok, info = client.send_text("1", "x")
+            self.assertTrue(ok)
+            self.assertEqual(len(stub.requests), 3)
+
+        with GraphStub(responses=[400]) as stub:
+            client = _client(stub, max_retries=2)
+            self.addCleanup(client.close)
+            ok, info = client.send_text("1", "x")
+            self.assertFalse(ok)
+            self.assertEqual((info["status_code"], info["error"]), (400, "http_error"))
+            self.assertEqual(len(stub.requests), 1)
+
+    def test_retries_connect_failures_only(self):
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            port = sock.getsockname()[1]  # puerto cerrado: conexión rechazada
+        client = GraphClient(token="t", phone_number_id="123", base_url=f"http://127.0.0.1:{port}", backoff=0, max_retries=2)
+        self.addCleanup(client.close)
+        with mock.patch.object(client.session, "post", wraps=client.session.post) as post:
+            ok, info = client.send_text("1", "x")
+        self.assertFalse(ok)
+        self.assertEqual((info["error"], post.call_count), ("connect_error", 3))
+
+        with GraphStub(delay=0.3) as stub:
+            client = _client(stub, max_retries=2, read_timeout=0.05)
+            self.addCleanup(client.close)
+            with mock.patch.object(client.session, "post", wraps=client.session.post) as post:
+                ok, info = client.send_text("1", "x")
+            self.assertFalse(ok)
+            # El POST pudo haberse entregado: reintentarlo duplicaría la respuesta
+            self.assertEqual((info["error"], post.call_count), ("timeout", 1))
+
+    def test_missing_credentials(self):
+        ok, info = GraphClient(token="", phone_number_id="").send_text("1", "x")
+        self.assertFalse(ok)
+        self.assertEqual(info["status_code"], 0)
+
+    def test_both_senders_share_the_client(self):
+        with GraphStub() as stub:
+            client = _client(stub)
+            self.addCleanup(client.close)
+            with mock.patch.object(graph_client, "_CLIENT", client), \
+                    mock.patch.object(webhook, "OUTBOUND_DISPATCH", False), \
+                    mock.patch.object(webhook, "WHATSAPP_TOKEN", "t"), \
+                    mock.patch.object(webhook, "WHATSAPP_PHONE_NUMBER_ID", "123"):
+                self.assertTrue(send.send_whatsapp_message("1", "desde send")[0])
+                webhook.send_whatsapp_message("2", "desde webhook")
+            self.assertEqual([r[0] for r in stub.requests], ["1", "2"])
+            self.assertEqual(stub.connections, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
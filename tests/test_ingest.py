@@ -0,0 +1,112 @@
+import io
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from app import ingest
+
+ROWS = [
+    {"codigo": "228118", "programa": "ANALISIS Y DESARROLLO DE SOFTWARE.", "nivel": "TECNÓLOGO",
+     "municipio": "POPAYÁN", "sede": "SEDE ALTO CAUCA - Software 2", "horario": "L a V 7:00 - 13:00",
+     "perfil_egresado": "Desarrolla software", "competencias": ["b", "a"], "certificacion": "TECNÓLOGO"},
+    {"codigo": "228118", "programa": "", "nivel": "TECNÓLOGO", "municipio": "GUAPI",
+     "sede": "Sala de sistemas", "horario": "L a V 07:00 - 13:00"},
+    {"codigo": "228118", "programa": "ANALISIS Y DESARROLLO DE SOFTWARE.", "nivel": "TECNÓLOGO",
+     "municipio": "POPAYÁN", "sede": "SEDE ALTO CAUCA - Software 2", "horario": "L a V 07:00 - 13:00"},
+    {"codigo": "134104", "programa": "ASISTENCIA ADMINISTRATIVA", "nivel": "TÉCNICO",
+     "municipio": "POPAYÁN - VRD. EL SENDERO", "sede": "Salón comunal", "horario": "L a V 18:00 - 22:00"},
+    {"programa": "SIN CODIGO"},
+]
+
+
+class StreamingIngestTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _ingest(self, records, partitions=3):
+        out = os.path.join(self.tmp.name, "v2.json")
+        stats = {}
+        n = ingest.write_programs(ingest.iter_programs(records, partitions, self.tmp.name, stats), out)
+        with open(out, encoding="utf-8") as fh:
+            return n, stats, json.load(fh)
+
+    def test_groups_rows_into_v2_programs(self):
+        n, stats, progs = self._ingest(ROWS)
+        self.assertEqual(n, 2)
+        self.assertEqual((stats["rows"], stats["skipped"]), (5, 1))
+        self.assertEqual([p["codigo"] for p in progs], ["134104", "228118"])
+
+        prog = progs[1]
+        self.assertEqual(prog["programa"], "Analisis y Desarrollo de Software")
+        self.assertEqual(prog["nivel_norm"], "tecnologo")
+        self.assertEqual(prog["competencias"], ["a", "b"])
+        # la fila repetida (misma sede, ambiente y horario) se descarta
+        self.assertEqual(
+            [(o["ordinal"], o["municipio"], o["sede_nombre"], o["ambiente"], o["horario"]) for o in prog["ofertas"]],
+            [(1, "Guapi", "Sala De Sistemas", None, "L a V 07:00–13:00"),
+             (2, "Popayán", "Alto Cauca", "Software 2", "L a V 07:00–13:00")],
+        )
+        self.assertEqual(progs[0]["ofertas"][0]["municipio_base_norm"], "popayan")
+
+    def test_partition_count_does_not_change_output(self):
+        self.assertEqual(self._ingest(ROWS, 1)[2], self._ingest(ROWS, 16)[2])
+
+    def test_json_array_reader_handles_chunk_boundaries(self):
+        text = json.dumps(ROWS * 20, ensure_ascii=False, indent=2)
+        with mock.patch.object(ingest, "_CHUNK", 7):
+            parsed = list(ingest._iter_json_array(io.StringIO(text)))
+        self.assertEqual(parsed, ROWS * 20)
+
+    def test_jsonl_and_csv_inputs(self):
+        jsonl = os.path.join(self.tmp.name, "rows.jsonl")
+        with open(jsonl, "w", encoding="utf-8") as fh:
+            fh.writelines(json.dumps(r, ensure_ascii=False) + "\n" for r in ROWS)
+        csv_path = os.path.join(self.tmp.name, "rows.csv")
+        with open(csv_path, "w", encoding="utf-8") as fh:
+            fh.write("codigo,programa,municipio,sede,horario,competencias\n")
+            fh.write('228118,ADSO,POPAYÁN,SEDE LA SAMARIA,L a V 7:00 - 13:00,"x | y"\n')
+
+        self.assertEqual(list(ingest.iter_records(jsonl)), ROWS)
+        _, _, progs = self._ingest(ingest.iter_records(csv_path))
+        self.assertEqual(progs[0]["competencias"], ["x", "y"])
+        self.assertEqual(progs[0]["ofertas"][0]["sede_norm"], "la samaria")
+
+
+    def test_incremental_run_only_rebuilds_changed_programs(self):
+        src = os.path.join(self.tmp.name, "rows.jsonl")
+        out = os.path.join(self.tmp.name, "out", "v2.json")
+
+        def run(rows, **kw):
+            with open(src, "w", encoding="utf-8") as fh:
+                fh.writelines(json.dumps(r, ensure_ascii=False) + "\n" for r in rows)
+            return ingest.ingest(src, out, partitions=4, workdir=self.tmp.name, **kw)
+
+        first = run(ROWS)
+        self.assertEqual(first["added"], ["134104", "228118"])
+        self.assertEqual(run(ROWS)["unchanged"], 2)
+
+        rows = [r for r in ROWS if r.get("codigo") != "134104"]
+        rows[1] = {**rows[1], "horario": "L a V 13:00 - 19:00"}
+        rows.append({"codigo": "999", "programa": "NUEVO", "municipio": "GUAPI", "sede": "X"})
+        with mock.patch.object(ingest, "build_program", wraps=ingest.build_program) as build:
+            stats = run(rows)
+        self.assertEqual(
+            (stats["added"], stats["changed"], stats["removed"], stats["unchanged"]),
+            (["999"], ["228118"], ["134104"], 0),
+        )
+        self.assertEqual(sorted(c.args[0] for c in build.call_args_list), ["228118", "999"])
+
+        with open(out, encoding="utf-8") as fh:
+            incremental = fh.read()
+        run(rows, incremental=False)
+        with open(out, encoding="utf-8") as fh:
+            self.assertEqual(fh.read(), incremental)
+
+
+if __name__ == "__main__":
+    unittest.main()
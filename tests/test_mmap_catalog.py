@@ -0,0 +1,62 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from app import core
+from app.mmap_catalog import open_mmap_catalog, write_mmap_catalog
+
+
+class MmapCatalogTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp = tempfile.TemporaryDirectory()
+        cls.path = os.path.join(cls.tmp.name, "catalog.mmap")
+        cls.key = core.catalog_content_key()
+        cls.state = core.build_catalog_state()
+        write_mmap_catalog(cls.path, cls.key, cls.state)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmp.cleanup()
+
+    def test_tables_match_in_memory_build(self):
+        mm = open_mmap_catalog(self.path, self.key)
+        lazy = mm.indexes(core.ProgramFeatures.from_dict)
+        self.assertEqual(list(lazy["BY_CODE"]), list(self.state["BY_CODE"]))
+        for code, prog in self.state["BY_CODE"].items():
+            self.assertEqual(lazy["BY_CODE"][code].to_dict(), prog.to_dict())
+            self.assertEqual(lazy["OFFER_COUNT"][code], self.state["OFFER_COUNT"][code])
+            feat, lazy_feat = self.state["PROGRAM_FEATURES"][code], lazy["PROGRAM_FEATURES"][code]
+            self.assertEqual(feat.to_dict(), lazy_feat.to_dict())
+        for key, of in self.state["OFFER_BY_KEY"].items():
+            self.assertEqual(lazy["OFFER_BY_KEY"][key].to_dict(), of.to_dict())
+        self.assertEqual(len(lazy["OFFER_BY_KEY"]), len(self.state["OFFER_BY_KEY"]))
+        code, ordinal = next(iter(self.state["OFFER_BY_KEY"]))
+        self.assertIsNone(lazy["OFFER_BY_KEY"].get((code, str(ordinal))))  # "1" != 1, como en el dict
+        self.assertIsNone(lazy["OFFER_BY_KEY"].get((code, 10_000)))
+        self.assertEqual(list(lazy["OFFER_KEYS"]), list(self.state["OFFER_KEYS"]))
+        for name in ("BY_MUNICIPIO", "BY_SEDE", "TITLE_TOKENS", "DESC_TOKENS", "SEDE_CONTAINMENT"):
+            self.assertEqual(
+                {k: list(v) for k, v in lazy[name].items()},
+                {k: list(v) for k, v in self.state[name].items()},
+            )
+        self.assertIsNone(lazy["BY_CODE"].get("000000"))
+        self.assertIsNone(lazy["TITLE_TOKENS"].get("inexistente"))
+
+    def test_stale_key_is_ignored(self):
+        self.assertIsNone(open_mmap_catalog(self.path, "0" * 64))
+        self.assertIsNone(open_mmap_catalog(os.path.join(self.tmp.name, "nope.mmap"), self.key))
+
+    def test_search_through_mmap_catalog(self):
+        queries = ["tecnologo en popayan", "programas sobre sistemas", "cursos en la casona"]
+        expected = [core._search_programs_uncached(core._parse_intent_uncached(core._norm(q))) for q in queries]
+        with mock.patch.object(core, "_CATALOG", None), mock.patch.object(core, "CATALOG_MMAP_PATH", self.path):
+            self.assertEqual(core.get_catalog().source, "mmap")
+            got = [core._search_programs_uncached(core._parse_intent_uncached(core._norm(q))) for q in queries]
+            self.assertIn("Código", core._ficha_por_codigo(expected[0][0][0]))
+        self.assertEqual(got, expected)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,119 @@
+import time
+import unittest
+from unittest import mock
+
+from app import webhook
+from app.graph_client import GraphClient
+from app.outbound import OutboundDispatcher, TokenBucket
+from tests.graph_stub import GraphStub
+
+
+class TokenBucketTest(unittest.TestCase):
+    def test_rate_limits_after_burst(self):
+        bucket = TokenBucket(rate=50, burst=2)
+        started = time.monotonic()
+        for _ in range(7):
+            bucket.acquire()
+        # 2 de ráfaga + 5 a 50/s
+        self.assertGreaterEqual(time.monotonic() - started, 0.09)
+
+
+class OutboundDispatcherTest(unittest.TestCase):
+    def _dispatcher(self, stub, **kwargs):
+        client = GraphClient(token="t", phone_number_id="123", base_url=stub.base_url, backoff=0)
+        self.addCleanup(client.close)
+        opts = {"workers": 3, "rate": 200, "burst": 200, "recipient_interval": 0, "retry_backoff": 0}
+        opts.update(kwargs)
+        dispatcher = OutboundDispatcher(client=client, **opts).start()
+        self.addCleanup(dispatcher.stop)
+        return dispatcher
+
+    def test_sends_in_order_with_recipient_pacing(self):
+        with GraphStub() as stub:
+            d = self._dispatcher(stub, recipient_interval=0.05)
+            for i in range(3):
+                d.submit("a", f"a{i}")
+            for i in range(4):
+                d.submit(f"u{i}", "x")
+            self.assertTrue(d.join())
+            times = [t for to, t, _c in stub.requests if to == "a"]
+            self.assertEqual(len(times), 3)
+            self.assertTrue(all(b - a >= 0.045 for a, b in zip(times, times[1:])))
+            stats = d.stats()
+            self.assertEqual((stats["sent"], stats["failed"], stats["depth"]), (7, 0, 0))
+            self.assertGreater(stats["latency_max_ms"], 0)
+
+    def test_waiting_recipient_does_not_block_its_shard(self):
+        with GraphStub(responses=[503]) as stub:
+            d = self._dispatcher(stub, workers=1, recipient_interval=0.3, retry_backoff=0.3)
+            d.submit("a", "a0")  # 503: se reintenta en 0.3 s
+            d.submit("a", "a1")
+            d.submit("b", "b0")
+            d.submit("c", "c0")
+            self.assertTrue(d.join())
+            self.assertEqual([r[0] for r in stub.requests], ["a", "b", "c", "a", "a"])
+            # b y c salen sin esperar el backoff ni el intervalo de "a"
+            self.assertLess(stub.requests[2][1] - stub.requests[0][1], 0.2)
+            self.assertEqual((d.stats()["sent"], d.stats()["retries"]), (4, 1))
+
+    def test_global_rate_is_respected(self):
+        with GraphStub() as stub:
+            d = self._dispatcher(stub, rate=40, burst=1)
+            for i in range(9):
+                d.submit(f"u{i}", "x")
+            self.assertTrue(d.join())
+            first, last = stub.requests[0][1], stub.requests[-1][1]
+            self.assertGreaterEqual(last - first, 0.18)  # 8 intervalos a 40/s
+
+    def test_429_slows_down_and_retries(self):
+        with GraphStub(responses=[429, 503]) as stub:
+            d = self._dispatcher(stub, workers=1, rate=100, min_rate=10)
+            d.submit("a", "hola")
+            self.assertTrue(d.join())
+            stats = d.stats()
+            self.assertEqual((stats["sent"], stats["throttled"], stats["server_errors"], stats["retries"]), (1, 1, 1, 2))
+            self.assertEqual(stats["rate"], 25)
+            self.assertEqual(len(stub.requests), 3)
+
+    def test_429_honors_retry_after(self):
+        with GraphStub(responses=[(429, {"Retry-After": "0.3"})]) as stub:
+            d = self._dispatcher(stub, workers=1)
+            d.submit("a", "hola")
+            self.assertTrue(d.join())
+            self.assertEqual([r[0] for r in stub.requests], ["a", "a"])
+            self.assertGreaterEqual(stub.requests[1][1] - stub.requests[0][1], 0.28)
+
+    def test_network_errors_do_not_slow_down(self):
+        client = mock.Mock()
+        client.send_text.side_effect = [(False, {"status_code": 0, "error": "connect_error"}), (True, {})]
+        d = OutboundDispatcher(client=client, workers=1, rate=100, burst=100, recipient_interval=0, retry_backoff=0)
+        d.start()
+        self.addCleanup(d.stop)
+        d.submit("a", "hola")
+        self.assertTrue(d.join())
+        stats = d.stats()
+        self.assertEqual((stats["sent"], stats["network_errors"], stats["server_errors"], stats["retries"]), (1, 1, 0, 1))
+        self.assertEqual(stats["rate"], 100)
+
+    def test_client_errors_are_not_retried(self):
+        with GraphStub(responses=[400]) as stub:
+            d = self._dispatcher(stub)
+            d.submit("a", "hola")
+            self.assertTrue(d.join())
+            self.assertEqual((d.stats()["failed"], d.stats()["retries"]), (1, 0))
+            self.assertEqual(len(stub.requests), 1)
+
+    def test_webhook_replies_go_through_dispatcher(self):
+        with GraphStub() as stub:
+            d = self._dispatcher(stub)
+            with mock.patch.object(webhook, "get_dispatcher", return_value=d), \
+                    mock.patch.object(webhook, "OUTBOUND_DISPATCH", True), \
+                    mock.patch.object(webhook, "WHATSAPP_TOKEN", "t"), \
+                    mock.patch.object(webhook, "WHATSAPP_PHONE_NUMBER_ID", "123"):
+                webhook.send_whatsapp_message("57300", "hola")
+            self.assertTrue(d.join())
+            self.assertEqual([r[0] for r in stub.requests], ["57300"])
+
+
+if __name__ == "__main__":
+    unittest.main()
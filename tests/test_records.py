@@ -0,0 +1,76 @@
+import pickle
+import unittest
+
+from app import core
+from app.records import Offer, Program
+
+
+RAW = {
+    "codigo": "123456",
+    "programa": "Cocina",
+    "nivel": "Tecnico",
+    "competencias": ["Preparar alimentos"],
+    "requisitos": "Noveno grado",
+    "ofertas": [
+        {"ordinal": 1, "municipio": "Popayán", "horario": "L a V"},
+        {"ordinal": 2, "municipio": "Popayán", "horario": "L a V"},
+    ],
+}
+
+
+class RecordsTest(unittest.TestCase):
+    def test_dict_compatibility(self):
+        prog = Program(RAW)
+        self.assertEqual(prog["programa"], "Cocina")
+        self.assertEqual(prog.get("perfil", "-"), "-")  # campo conocido ausente
+        self.assertEqual(prog.get("requisitos"), "Noveno grado")  # llave extra
+        self.assertNotIn("perfil", prog)
+        self.assertIn("requisitos", prog)
+        with self.assertRaises(KeyError):
+            prog["perfil"]
+        self.assertEqual(prog["competencias"], ("Preparar alimentos",))
+        self.assertIsInstance(prog["ofertas"][0], Offer)
+        self.assertEqual(prog.to_dict()["ofertas"][1]["ordinal"], 2)
+
+    def test_location_strings_are_shared(self):
+        a, b = Program(RAW)["ofertas"]
+        self.assertIs(a["municipio"], b["municipio"])
+        self.assertIs(a["horario"], b["horario"])
+
+    def test_fingerprint_sees_offer_fields(self):
+        changed = {**RAW, "ofertas": [dict(RAW["ofertas"][0]), {**RAW["ofertas"][1], "horario": "Sábados"}]}
+        self.assertEqual(Program(RAW).to_dict()["ofertas"][1]["horario"], "L a V")
+        self.assertNotEqual(
+            core._program_fingerprint(Program(RAW)), core._program_fingerprint(Program(changed))
+        )
+
+    def test_pickle_roundtrip(self):
+        prog = Program(RAW)
+        self.assertEqual(pickle.loads(pickle.dumps(prog)), prog)
+
+
+class CompactPostingsTest(unittest.TestCase):
+    def test_postings_decode_to_catalog_pairs(self):
+        for key, ids in core.BY_MUNICIPIO.items():
+            for code, ordinal in (core.OFFER_KEYS[i] for i in ids):
+                self.assertIn(code, core.BY_CODE)
+                self.assertIn((code, ordinal), core.OFFER_BY_KEY)
+        for tok, ids in core.TITLE_TOKENS.items():
+            codes = {core.PROGRAM_CODES[i] for i in ids}
+            self.assertTrue(all(tok in core.PROGRAM_FEATURES[c].title_tokens
+                                or tok in core.PROGRAM_FEATURES[c].kw_tokens for c in codes))
+
+    def test_containment_matches_pairwise_substring_check(self):
+        bucket = {
+            "popayan": [0], "popayan - vrd el sendero": [1], "payan": [2], "el tambo": [3],
+            "tambo": [4], "cali": [5], "la": [6], "": [7],
+        }
+        expected = {
+            key: sorted({i for k, ids in bucket.items() if key in k or k in key for i in ids}) for key in bucket
+        }
+        got = {k: list(v) for k, v in core._containment_postings(bucket).items()}
+        self.assertEqual(got, expected)
+
+
+if __name__ == "__main__":
+    unittest.main()
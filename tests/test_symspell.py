@@ -0,0 +1,47 @@
+import unittest
+
+from app import core
+from app.symspell import SymSpell, edit_distance
+
+
+class SymSpellTest(unittest.TestCase):
+    def setUp(self):
+        self.speller = SymSpell({"metalmecanica": 2, "mecanica": 5, "programacion": 3, "casa": 1, "cosa": 1})
+
+    def test_corrects_within_distance(self):
+        self.assertEqual(self.speller.lookup("metalmecanika"), "metalmecanica")
+        self.assertEqual(self.speller.lookup("programacoin"), "programacion")  # transposición = 1
+        self.assertEqual(self.speller.lookup("mecanica"), "mecanica")
+        self.assertIsNone(self.speller.lookup("mekanika", 1))
+        self.assertEqual(self.speller.lookup("mekanika", 2), "mecanica")
+
+    def test_ambiguous_or_distant_words_are_not_corrected(self):
+        self.assertIsNone(self.speller.lookup("cesa", 1))  # casa y cosa empatan
+        self.assertIsNone(self.speller.lookup("electricidad"))
+
+    def test_edit_distance(self):
+        self.assertEqual(edit_distance("enfemeria", "enfermeria", 2), 1)
+        self.assertEqual(edit_distance("ab", "ba", 2), 1)
+        self.assertEqual(edit_distance("abc", "xyz", 1), 2)
+
+
+class TopicTypoTest(unittest.TestCase):
+    def _codes(self, q):
+        intent = core._parse_intent_uncached(core._norm(q))
+        return intent, core._search_programs_uncached(intent)
+
+    def test_misspelled_topics_find_the_same_programs(self):
+        for typo, good in (("metalmecanika", "metalmecanica"), ("programacoin", "programacion"),
+                           ("electricidda", "electricidad"), ("tecnologo en softwre", "tecnologo en software")):
+            self.assertEqual(self._codes(typo), self._codes(good), typo)
+            self.assertTrue(self._codes(typo)[1], typo)
+
+    def test_short_location_and_unknown_tokens_are_kept(self):
+        self.assertEqual(core._correct_topic_tokens({"redez"}), {"redes"})
+        self.assertEqual(core._correct_topic_tokens({"cocin"}), {"cocin"})
+        self.assertEqual(core._correct_topic_tokens({"guapi", "quilichao"}), {"guapi", "quilichao"})
+        self.assertEqual(core._correct_topic_tokens({"soft"}), {"soft"})
+
+
+if __name__ == "__main__":
+    unittest.main()
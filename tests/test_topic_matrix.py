@@ -0,0 +1,82 @@
+import unittest
+from unittest import mock
+
+from app import core, topic_matrix
+
+QUERIES = [
+    "sistemas", "software", "analisis y desarrollo de software", "mecanica de motos", "construccion",
+    "gestion", "contabilidad", "agua", "electricidad", "redes", "soldadura", "topografia",
+    "audiovisuales", "confeccion", "telecomunicaciones", "quiero estudiar sistemas", "xyz", "desarrollo",
+]
+
+
+# Pedazos de palabra: solo los encuentra la frase (substring), no los postings
+PARTIAL_QUERIES = ["sistem", "soft", "electri", "contab"]
+
+
+def _full_scores(tokens, phrase):
+    """Puntaje clásico sobre todos los programas, sin recuperar candidatos."""
+    results = []
+    for code, feat in core.PROGRAM_FEATURES.items():
+        sc = core._topic_match_score_v2(feat, tokens, phrase)
+        if sc >= 15:
+            results.append((code, sc))
+    results.sort(key=lambda x: (-x[1], core.BY_CODE[x[0]]["programa_norm"]))
+    return results
+
+
+class TopicCandidatesTest(unittest.TestCase):
+    def test_candidates_match_full_scoring_on_partial_words(self):
+        for q in PARTIAL_QUERIES + QUERIES:
+            tokens, phrase = core._topic_tokens_from_text(q), core._norm(q)
+            expected = _full_scores(tokens, phrase)
+            self.assertEqual(core._topic_scores_v2(tokens, phrase), expected, q)
+        self.assertTrue(_full_scores(set(), "sistem"))
+
+
+@unittest.skipUnless(topic_matrix.available(), "requiere numpy y scipy")
+class TopicMatrixTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        catalog = core.get_catalog()
+        cls.matrix = topic_matrix.TopicMatrix(
+            catalog["PROGRAM_CODES"], catalog["PROGRAM_FEATURES"], catalog["TITLE_TOKENS"], catalog["DESC_TOKENS"]
+        )
+
+    def _both(self, tokens, phrase):
+        classic = core._topic_scores_v2(tokens, phrase)
+        with mock.patch.dict(core.get_catalog().state, {"TOPIC_MATRIX": self.matrix}):
+            sparse = core._topic_scores_v2(tokens, phrase)
+        return classic, sparse
+
+    def test_matches_classic_scorer_on_queries(self):
+        for q in QUERIES:
+            tokens, phrase = core._topic_tokens_from_text(q), core._norm(q)
+            classic, sparse = self._both(tokens, phrase)
+            self.assertEqual(sparse, classic, q)
+
+    def test_matches_full_scoring_on_partial_words(self):
+        for q in PARTIAL_QUERIES:
+            tokens, phrase = core._topic_tokens_from_text(q), core._norm(q)
+            self.assertEqual(self._both(tokens, phrase), (_full_scores(tokens, phrase),) * 2, q)
+
+    def test_matches_classic_scorer_on_every_token(self):
+        vocab = sorted(core.TITLE_TOKENS)
+        for i, tok in enumerate(vocab):
+            classic, sparse = self._both({tok, vocab[i - 1]}, tok)
+            self.assertEqual(sparse, classic, tok)
+        for feat in list(core.PROGRAM_FEATURES.values())[:10]:
+            classic, sparse = self._both(set(feat.title_tokens), feat.title)
+            self.assertEqual(sparse, classic, feat.title)
+
+    def test_catalog_attaches_matrix_only_when_enabled(self):
+        state = core.build_catalog_state()
+        core._attach_topic_scorers(state)
+        self.assertNotIn("TOPIC_MATRIX", state)
+        with mock.patch.object(core, "TOPIC_SCORER", "sparse"):
+            core._attach_topic_scorers(state)
+        self.assertIsInstance(state["TOPIC_MATRIX"], topic_matrix.TopicMatrix)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -2,8 +2,9 @@ import json
 import re
 import unittest
 
+from app import webhook
 from app.webhook import app
-from app.db import SessionState, User, get_session, init_db
+from app.db import ProcessedMessage, SessionState, User, get_session, init_db
 from app.core import PAGE_SIZE, _topic_tokens_from_text, generar_respuesta
 
 
@@ -31,6 +32,11 @@ class TopicSearchWebhookTest(unittest.TestCase):
     def setUpClass(cls):
         init_db()
         _ensure_test_user()
+        with get_session() as session:  # los ids de prueba se repiten entre corridas
+            session.query(ProcessedMessage).filter(ProcessedMessage.wa_message_id.like("msg-%")).delete(
+                synchronize_session=False
+            )
+        webhook.SEEN_MESSAGES.clear()
         app.testing = True
 
     def setUp(self):
@@ -60,10 +66,14 @@ class TopicSearchWebhookTest(unittest.TestCase):
         return self.client.post("/webhook", json=payload)
 
     def test_topic_queries_do_not_crash(self):
+        failed_before = webhook.WORKERS.failed if webhook.WORKERS else 0
         for query in ["tecnologos", "programas sobre sistemas", "mecánica de motos"]:
             resp = self._post_text(query)
             self.assertEqual(resp.status_code, 200)
             self.assertEqual(resp.get_data(as_text=True), "ok")
+        if webhook.WORKERS is not None:  # procesamiento en segundo plano
+            self.assertTrue(webhook.WORKERS.join())
+            self.assertEqual(webhook.WORKERS.failed, failed_before)
 
     def test_stopwords_keep_sistemas(self):
         tokens = _topic_tokens_from_text("programas sobre sistemas")
@@ -77,6 +87,11 @@ class TopicSearchWebhookTest(unittest.TestCase):
         reply_no_matches = generar_respuesta("astronomía en guapi")
         self.assertIn("No encontré programas en Guapi", reply_no_matches)
 
+    def test_explicit_city_label_keeps_accents(self):
+        self.assertIn("No encontré programas en Popayán", generar_respuesta("astronomía en Popayán"))
+        # Misma llave de caché (texto normalizado), etiqueta según lo que escribió el usuario
+        self.assertIn("No encontré programas en Popayan", generar_respuesta("astronomía en Popayan"))
+
     def test_location_only_query_routes_by_city(self):
         reply = generar_respuesta("programas en popayan")
         self.assertIn("popayan", reply.lower())
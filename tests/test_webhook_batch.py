@@ -0,0 +1,151 @@
+import unittest
+from datetime import datetime, timedelta
+from unittest import mock
+
+from app import db, webhook
+from app.db import ProcessedMessage, SessionState, User, get_session, init_db
+
+
+def _msg(sender: str, text: str, msg_id: str) -> dict:
+    return {"from": sender, "id": f"batch-{msg_id}", "type": "text", "text": {"body": text}}
+
+
+class WebhookBatchTest(unittest.TestCase):
+    NUMBERS = ("batch-1", "batch-2", "batch-3")
+
+    def setUp(self):
+        init_db()
+        with get_session() as session:
+            for user in session.query(User).filter(User.wa_number.in_(self.NUMBERS)):
+                session.delete(user)
+            session.query(ProcessedMessage).filter(ProcessedMessage.wa_message_id.like("batch-%")).delete(
+                synchronize_session=False
+            )
+        webhook.SEEN_MESSAGES.clear()
+        self.sent = []
+        patches = [
+            mock.patch.object(webhook, "WEBHOOK_QUEUE", "sync"),
+            mock.patch.object(webhook, "send_whatsapp_message", lambda to, body: self.sent.append((to, body))),
+        ]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+        webhook.app.testing = True
+        self.client = webhook.app.test_client()
+
+    def _post(self, payload):
+        return self.client.post("/webhook", json=payload)
+
+    def test_processes_every_entry_change_and_message(self):
+        payload = {
+            "entry": [
+                {"changes": [
+                    {"value": {"messages": [_msg("batch-1", "hola", "b1"), _msg("batch-2", "hola", "b2")]}},
+                    {"value": {"statuses": [{"id": "x"}]}},
+                ]},
+                {"changes": [{"value": {"messages": [_msg("batch-3", "hola", "b3"), _msg("batch-1", "acepto", "b4")]}}]},
+            ]
+        }
+        with mock.patch.object(webhook, "get_or_create_users", wraps=db.get_or_create_users) as lookup:
+            resp = self._post(payload)
+        self.assertEqual((resp.status_code, resp.get_data(as_text=True)), (200, "ok"))
+        self.assertEqual(lookup.call_count, 1)  # una búsqueda de usuarios por lote
+        self.assertEqual([to for to, _b in self.sent], ["batch-1", "batch-2", "batch-3", "batch-1"])
+        with get_session() as session:
+            states = {
+                u.wa_number: u.session_state.state
+                for u in session.query(User).filter(User.wa_number.in_(self.NUMBERS))
+            }
+        self.assertEqual(states, {"batch-1": "ASK_DOCUMENT", "batch-2": "TERMS_PENDING", "batch-3": "TERMS_PENDING"})
+
+    def test_failing_message_does_not_block_the_rest(self):
+        real = webhook._handle_onboarding
+
+        def flaky(session, user, state_obj, text, text_norm):
+            if text == "rompe":
+                state_obj.state = "ASK_NAME"  # cambio que debe revertirse
+                raise RuntimeError("boom")
+            return real(session, user, state_obj, text, text_norm)
+
+        payload = {"entry": [{"changes": [{"value": {"messages": [
+            _msg("batch-1", "rompe", "c1"), _msg("batch-2", "hola", "c2"), _msg("batch-1", "acepto", "c3"),
+        ]}}]}]}
+        with mock.patch.object(webhook, "_handle_onboarding", flaky):
+            resp = self._post(payload)
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual([to for to, _b in self.sent], ["batch-2", "batch-1"])
+        with get_session() as session:
+            user = session.query(User).filter_by(wa_number="batch-1").one()
+            self.assertEqual(session.query(SessionState).filter_by(user_id=user.id).one().state, "ASK_DOCUMENT")
+
+    def test_splits_delivery_per_worker_shard(self):
+        pool = mock.Mock()
+        pool.shard_for.side_effect = lambda key: 0 if key == "batch-2" else 1
+        pool.submit_many.return_value = True
+        with mock.patch.object(webhook, "WEBHOOK_QUEUE", "memory"), \
+                mock.patch.object(webhook, "start_webhook_workers", return_value=pool):
+            resp = self._post({"entry": [{"changes": [{"value": {"messages": [
+                _msg("batch-1", "a", "d1"), _msg("batch-2", "b", "d2"), _msg("batch-3", "c", "d3"),
+            ]}}]}]})
+        self.assertEqual(resp.status_code, 200)
+        (items,), _kw = pool.submit_many.call_args
+        batches = [[m["id"] for m in webhook._iter_messages(payload)] for payload, _key in items]
+        self.assertEqual(sorted(batches), [["batch-d1", "batch-d3"], ["batch-d2"]])
+
+    def test_redeliveries_are_dropped_before_parsing(self):
+        payload = {"entry": [{"changes": [{"value": {"messages": [_msg("batch-1", "hola", "e1")]}}]}]}
+        self.assertEqual(self._post(payload).status_code, 200)
+        before = dict(webhook.DUPLICATES)
+        with mock.patch.object(webhook, "_process_message") as process:
+            self.assertEqual(self._post(payload).status_code, 200)  # LRU en memoria
+            webhook.SEEN_MESSAGES.clear()  # p. ej. otro proceso o tras reiniciar
+            self.assertEqual(self._post(payload).status_code, 200)  # índice único en la base
+        process.assert_not_called()
+        self.assertEqual(len(self.sent), 1)
+        self.assertEqual(webhook.DUPLICATES["memory"], before["memory"] + 1)
+        self.assertEqual(webhook.DUPLICATES["db"], before["db"] + 1)
+
+    def test_failed_message_can_be_redelivered(self):
+        payload = {"entry": [{"changes": [{"value": {"messages": [_msg("batch-2", "hola", "f1")]}}]}]}
+        with mock.patch.object(webhook, "_handle_onboarding", side_effect=RuntimeError("boom")):
+            self.assertEqual(self._post(payload).status_code, 200)
+        self.assertEqual(self.sent, [])
+        self.assertEqual(self._post(payload).status_code, 200)
+        self.assertEqual([to for to, _b in self.sent], ["batch-2"])
+
+    def test_message_that_already_replied_is_not_answered_again(self):
+        calls = []
+
+        def fail_first(session, msg_id):
+            calls.append(msg_id)
+            if len(calls) == 1:
+                raise RuntimeError("boom")  # p. ej. falla la confirmación después de enviar
+            db.finish_message(session, msg_id)
+
+        payload = {"entry": [{"changes": [{"value": {"messages": [_msg("batch-3", "hola", "g1")]}}]}]}
+        with mock.patch.object(webhook, "finish_message", fail_first):
+            self.assertEqual(self._post(payload).status_code, 200)
+        self.assertEqual(len(self.sent), 1)
+        webhook.SEEN_MESSAGES.clear()
+        self.assertEqual(self._post(payload).status_code, 200)
+        self.assertEqual(len(self.sent), 1)
+        with get_session() as session:
+            row = session.query(ProcessedMessage).filter_by(wa_message_id="batch-g1").one()
+            self.assertEqual(row.status, "done")
+
+    def test_stale_claim_is_reclaimed(self):
+        with get_session() as session:
+            session.add(ProcessedMessage(
+                wa_message_id="batch-h1", status="processing", claimed_at=datetime.utcnow() - timedelta(hours=1)
+            ))
+            session.add(ProcessedMessage(wa_message_id="batch-h2", status="processing", claimed_at=datetime.utcnow()))
+        payload = {"entry": [{"changes": [{"value": {"messages": [
+            _msg("batch-1", "hola", "h1"), _msg("batch-2", "hola", "h2"),
+        ]}}]}]}
+        self.assertEqual(self._post(payload).status_code, 200)
+        # h1 quedó de un worker caído; h2 lo está procesando otro worker ahora
+        self.assertEqual([to for to, _b in self.sent], ["batch-1"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,145 @@
+import threading
+import time
+import unittest
+from unittest import mock
+
+from app import webhook
+from app.db import WebhookJob, get_session, init_db
+from app.webhook_queue import DBQueue, MemoryQueue, WorkerPool
+
+
+def _delivery(sender: str, text: str) -> dict:
+    msg = {"from": sender, "id": f"msg-{sender}-{text}", "type": "text", "text": {"body": text}}
+    return {"entry": [{"changes": [{"value": {"messages": [msg]}}]}]}
+
+
+class MemoryQueueTest(unittest.TestCase):
+    def test_same_key_keeps_order_in_one_shard(self):
+        q = MemoryQueue(shards=4)
+        for i in range(5):
+            q.put({"n": i}, key="573001112233")
+        self.assertEqual(q.depth(), 5)
+        shard = next(s for s in range(4) if q._queues[s].qsize())
+        self.assertEqual([q.get(shard, 0).payload["n"] for _ in range(5)], list(range(5)))
+        self.assertEqual(q.depth(), 0)
+        self.assertIsNone(q.get(shard, 0))
+
+    def test_maxsize_rejects_when_full(self):
+        q = MemoryQueue(shards=2, maxsize=2)
+        self.assertTrue(q.put({}, "a"))
+        self.assertTrue(q.put({}, "b"))
+        self.assertFalse(q.put({}, "c"))
+        self.assertIsNotNone(q.oldest_enqueued_at())
+
+    def test_put_many_is_all_or_nothing(self):
+        q = MemoryQueue(shards=2, maxsize=3)
+        self.assertTrue(q.put({}, "a"))
+        self.assertFalse(q.put_many([({}, "b"), ({}, "c"), ({}, "d")]))
+        self.assertEqual(q.depth(), 1)
+        self.assertTrue(q.put_many([({}, "b"), ({}, "c")]))
+        self.assertEqual(q.depth(), 3)
+
+
+class DBQueueTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        init_db()
+
+    def setUp(self):
+        with get_session() as session:
+            session.query(WebhookJob).delete()
+        self.q = DBQueue(shards=1, poll_interval=0.01)
+
+    def test_claim_done_and_failed(self):
+        self.q.put({"n": 1}, "a")
+        self.q.put({"n": 2}, "a")
+        self.assertEqual(self.q.depth(), 2)
+        first = self.q.get(0, timeout=0)
+        self.assertEqual(first.payload, {"n": 1})
+        self.assertEqual(self.q.depth(), 1)
+        self.q.done(first)
+        second = self.q.get(0, timeout=0)
+        self.q.failed(second)
+        self.assertIsNone(self.q.get(0, timeout=0))
+        with get_session() as session:
+            self.assertEqual([j.status for j in session.query(WebhookJob)], ["failed"])
+
+    def test_recover_returns_stale_jobs(self):
+        self.q.put({"n": 1}, "a")
+        self.assertIsNotNone(self.q.get(0, timeout=0))
+        self.assertEqual(self.q.depth(), 0)
+        self.assertEqual(self.q.recover(stale_after=-1), 1)
+        self.assertEqual(self.q.get(0, timeout=0).payload, {"n": 1})
+
+
+class WorkerPoolTest(unittest.TestCase):
+    def test_processes_and_counts_failures(self):
+        seen = []
+
+        def handler(payload):
+            if payload.get("boom"):
+                raise ValueError("boom")
+            seen.append(payload["n"])
+
+        pool = WorkerPool(MemoryQueue(shards=2), handler, poll_timeout=0.05).start()
+        self.addCleanup(pool.stop)
+        for i in range(6):
+            pool.submit({"n": i}, key="same-user")
+        pool.submit({"boom": True}, key="other")
+        self.assertTrue(pool.join(timeout=5))
+        self.assertEqual(seen, list(range(6)))  # mismo usuario: en orden
+        stats = pool.stats()
+        self.assertEqual((stats["processed"], stats["failed"], stats["depth"]), (6, 1, 0))
+        self.assertEqual(stats["workers"], 2)
+
+
+class WebhookAckTest(unittest.TestCase):
+    def setUp(self):
+        init_db()
+        webhook.app.testing = True
+        self.client = webhook.app.test_client()
+        self.release = threading.Event()
+        self.handled = []
+
+        def slow_handler(payload):
+            self.release.wait(5)
+            self.handled.append(payload)
+
+        self.pool = WorkerPool(MemoryQueue(shards=1, maxsize=1), slow_handler, poll_timeout=0.05)
+        for p in (mock.patch.object(webhook, "WORKERS", self.pool), mock.patch.object(webhook, "WEBHOOK_QUEUE", "memory")):
+            p.start()
+            self.addCleanup(p.stop)
+        self.addCleanup(self.pool.stop)
+        self.addCleanup(self.release.set)
+
+    def test_acknowledges_before_processing(self):
+        started = time.monotonic()
+        resp = self.client.post("/webhook", json=_delivery("1111", "hola"))
+        self.assertEqual((resp.status_code, resp.get_data(as_text=True)), (200, "ok"))
+        self.assertLess(time.monotonic() - started, 1.0)
+        self.assertEqual(self.handled, [])
+        self.release.set()
+        self.assertTrue(self.pool.join(timeout=5))
+        self.assertEqual(len(self.handled), 1)
+
+    def test_rejects_invalid_and_full(self):
+        self.assertEqual(self.client.post("/webhook", json={"entry": "x"}).status_code, 400)
+        self.assertEqual(self.client.post("/webhook", json={"entry": [{"changes": [{"value": {}}]}]}).status_code, 200)
+        idle = WorkerPool(MemoryQueue(shards=1, maxsize=1), self.handled.append)  # sin workers: se llena
+        with mock.patch.object(webhook, "start_webhook_workers", return_value=idle):
+            self.assertEqual(self.client.post("/webhook", json=_delivery("1111", "a")).status_code, 200)
+            self.assertEqual(self.client.post("/webhook", json=_delivery("1111", "b")).status_code, 503)
+
+    def test_full_queue_enqueues_no_batch_of_the_delivery(self):
+        idle = WorkerPool(MemoryQueue(shards=2, maxsize=1), self.handled.append)
+        payload = {"entry": [{"changes": [{"value": {"messages": [
+            _delivery(sender, "a")["entry"][0]["changes"][0]["value"]["messages"][0] for sender in ("1111", "3333")
+        ]}}]}]}
+        self.assertNotEqual(idle.shard_for("1111"), idle.shard_for("3333"))
+        with mock.patch.object(webhook, "start_webhook_workers", return_value=idle):
+            self.assertEqual(self.client.post("/webhook", json=payload).status_code, 503)
+        self.assertEqual(idle.jobs.depth(), 0)  # la reentrega de Meta no duplica nada
+
+
+if __name__ == "__main__":
+    unittest.main()